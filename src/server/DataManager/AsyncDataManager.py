@@ -0,0 +1,82 @@
+"""数据管理器异步封装
+
+FileManager / MetadataManager 的方法都是同步的磁盘读写、JSON解析和目录扫描，
+直接在 async 路由里调用会阻塞事件循环。这里把它们包装为在有界线程池中执行的协程。
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from server.config import settings
+from .FileManager import FileManager
+from .MetadataManager import MetadataManager
+
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """获取（必要时创建）共享的I/O线程池"""
+    global _io_executor
+    if _io_executor is None:
+        with _io_executor_lock:
+            if _io_executor is None:
+                _io_executor = ThreadPoolExecutor(
+                    max_workers=settings.IO_EXECUTOR_WORKERS,
+                    thread_name_prefix="data-io"
+                )
+    return _io_executor
+
+
+def shutdown_io_executor():
+    """关闭I/O线程池（应用退出时调用）"""
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=True)
+            _io_executor = None
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在I/O线程池中执行同步函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(func, *args, **kwargs))
+
+
+class _AsyncFacade:
+    """将同步管理器的公开方法包装为协程，私有方法和非可调用属性原样返回"""
+
+    def __init__(self, target: Any):
+        self._target = target
+
+    @property
+    def sync(self) -> Any:
+        """底层同步管理器"""
+        return self._target
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def _wrapper(*args, **kwargs):
+            return await run_io(attr, *args, **kwargs)
+
+        return _wrapper
+
+
+class AsyncFileManager(_AsyncFacade):
+    """FileManager 的异步封装"""
+
+    def __init__(self, file_manager: Optional[FileManager] = None):
+        super().__init__(file_manager or FileManager())
+
+
+class AsyncMetadataManager(_AsyncFacade):
+    """MetadataManager 的异步封装"""
+
+    def __init__(self, metadata_manager: Optional[MetadataManager] = None):
+        super().__init__(metadata_manager or MetadataManager())
@@ -0,0 +1,137 @@
+"""内容寻址文件存储"""
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Any, Optional
+from server.config import get_project_path
+from .MetadataLock import metadata_locks
+
+
+class BlobStore:
+    """项目级内容寻址存储
+
+    文件内容按 SHA-256 存放在 files/.blobs/<sha256>，files/{date}/ 下的文件是指向
+    blob 的硬链接，相同内容无论上传到哪天都只占一份磁盘空间。
+    引用计数直接使用 blob 的硬链接数（st_nlink - 1），无需额外的索引文件；
+    不支持硬链接的文件系统回退为普通复制（此时不去重）。
+    """
+
+    BLOB_DIR_NAME = ".blobs"
+    # 锁的 key 对应 files/<key>/ 下的锁文件，不能与 blob 目录同名，否则锁文件会被当成 blob
+    _LOCK_KEY = ".blobs-lock"
+
+    def get_blob_dir(self, project_name: str) -> Path:
+        """获取 blob 目录"""
+        return get_project_path(project_name) / "files" / self.BLOB_DIR_NAME
+
+    def get_blob_path(self, project_name: str, sha256: str) -> Path:
+        """获取 blob 路径"""
+        return self.get_blob_dir(project_name) / sha256
+
+    def has_blob(self, project_name: str, sha256: str) -> bool:
+        """检查内容是否已存在"""
+        return self.get_blob_path(project_name, sha256).exists()
+
+    def ref_count(self, project_name: str, sha256: str) -> int:
+        """获取 blob 的引用数"""
+        try:
+            return self.get_blob_path(project_name, sha256).stat().st_nlink - 1
+        except OSError:
+            return 0
+
+    def store(self, project_name: str, sha256: str, src_path: Path, dest_path: Path) -> bool:
+        """将临时文件 src_path 存入 blob 并在 dest_path 建立引用
+
+        内容已存在时直接丢弃 src_path。返回 True 表示 dest_path 与 blob 共享存储。
+        """
+        blob_path = self.get_blob_path(project_name, sha256)
+        with metadata_locks.lock(project_name, self._LOCK_KEY):
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            if blob_path.exists():
+                src_path.unlink()
+            else:
+                os.replace(src_path, blob_path)
+            return self._link(blob_path, dest_path)
+
+    def adopt(self, project_name: str, sha256: str, path: Path) -> bool:
+        """将已存在的普通文件纳入 blob 存储（用于迁移历史文件）"""
+        blob_path = self.get_blob_path(project_name, sha256)
+        with metadata_locks.lock(project_name, self._LOCK_KEY):
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            if not blob_path.exists():
+                os.link(path, blob_path)
+                return True
+            if os.path.samefile(blob_path, path):
+                return True
+            return self._link(blob_path, path)
+
+    def release(self, project_name: str, sha256: Optional[str]):
+        """引用被删除后调用，没有引用的 blob 会被回收"""
+        if not sha256:
+            return
+        blob_path = self.get_blob_path(project_name, sha256)
+        with metadata_locks.lock(project_name, self._LOCK_KEY):
+            try:
+                if blob_path.stat().st_nlink <= 1:
+                    blob_path.unlink()
+            except OSError:
+                pass
+
+    def collect_garbage(self, project_name: str) -> int:
+        """回收所有没有引用的 blob，返回回收数量"""
+        blob_dir = self.get_blob_dir(project_name)
+        if not blob_dir.exists():
+            return 0
+        removed = 0
+        with metadata_locks.lock(project_name, self._LOCK_KEY):
+            for blob_path in self._iter_blobs(blob_dir):
+                try:
+                    if blob_path.is_file() and blob_path.stat().st_nlink <= 1:
+                        blob_path.unlink()
+                        removed += 1
+                except OSError:
+                    continue
+        return removed
+
+    def get_statistics(self, project_name: str) -> Dict[str, Any]:
+        """获取存储统计信息"""
+        blob_dir = self.get_blob_dir(project_name)
+        stats = {"blob_count": 0, "blob_bytes": 0, "references": 0}
+        if not blob_dir.exists():
+            return stats
+        for blob_path in self._iter_blobs(blob_dir):
+            try:
+                st = blob_path.stat()
+            except OSError:
+                continue
+            stats["blob_count"] += 1
+            stats["blob_bytes"] += st.st_size
+            stats["references"] += st.st_nlink - 1
+        return stats
+
+    def _iter_blobs(self, blob_dir: Path):
+        """遍历 blob 文件（blob 以 sha256 命名，跳过锁文件等点文件）"""
+        for blob_path in blob_dir.iterdir():
+            if not blob_path.name.startswith("."):
+                yield blob_path
+
+    def _link(self, blob_path: Path, dest_path: Path) -> bool:
+        """在 dest_path 建立指向 blob 的硬链接，失败时回退为复制"""
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+        if dest_path.exists():
+            if os.path.samefile(blob_path, dest_path):
+                return True
+            dest_path.unlink()
+        try:
+            os.link(blob_path, dest_path)
+            return True
+        except OSError:
+            shutil.copy2(blob_path, dest_path)
+            # 复制后 blob 没有引用，立即回收
+            if blob_path.stat().st_nlink <= 1:
+                blob_path.unlink()
+            return False
+
+
+# 全局 blob 存储实例
+blob_store = BlobStore()
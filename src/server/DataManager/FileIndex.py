@@ -0,0 +1,219 @@
+"""文件索引（SQLite）
+
+record_meta.json 仍是文件信息的权威来源，file_records 表是它的索引副本，
+供跨日期按文件ID、标签、MIME类型、CRC32 查询时使用，避免遍历文件系统解析JSON。
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from server.config import settings
+from server.database import (
+    SessionLocal, Project, FileRecord, get_project_by_name, get_file_record_by_path,
+    upsert_file_record, find_file_records, delete_project_file_records,
+    get_project_files, encode_file_cursor, decode_file_cursor
+)
+from server.models import FileInfo
+from .MetadataManager import MetadataManager
+
+
+class FileIndex:
+    """维护 file_records 表与 record_meta.json 同步"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.metadata_manager = MetadataManager()
+
+    def sync(self, project_name: str, file_infos: List[FileInfo] = (), retired: List[FileInfo] = ()) -> bool:
+        """record_meta.json 保存后同步索引：写入/更新 file_infos，将 retired 标记为已废弃
+
+        JSON 元数据是权威来源，调用方先保存 JSON 再同步索引。索引同步失败只回滚索引事务并打印警告，
+        不影响调用方（可用 rebuild 修复）。返回索引是否已同步（未启用索引时为 False）。
+        """
+        if not settings.FILE_INDEX_ENABLED:
+            return False
+
+        db = self.session_factory()
+        try:
+            for file_info in retired:
+                self.stage_retire(db, project_name, file_info)
+            self.stage_files(db, project_name, list(file_infos))
+            db.commit()
+            return True
+        except SQLAlchemyError as e:
+            db.rollback()
+            print(f"文件索引同步失败（可运行 rebuild 重建）: {e}")
+            return False
+        finally:
+            db.close()
+
+    def stage_files(self, db: Optional[Session], project_name: str, file_infos: List[FileInfo]):
+        """在事务中写入/更新文件记录"""
+        if db is None:
+            return
+        project_id = self._get_project_id(db, project_name)
+        if project_id is None:
+            return
+        for file_info in file_infos:
+            self._upsert(db, project_id, file_info)
+
+    def stage_retire(self, db: Optional[Session], project_name: str, file_info: FileInfo):
+        """在事务中将文件记录标记为已废弃"""
+        if db is None:
+            return
+        project_id = self._get_project_id(db, project_name)
+        if project_id is None:
+            return
+        file_record = get_file_record_by_path(db, project_id, file_info.stored_path)
+        if file_record:
+            file_record.is_active = False
+            file_record.retired_at = datetime.now()
+            db.flush()
+
+    def find_files(
+        self,
+        project_name: str,
+        file_id: str = None,
+        tag: str = None,
+        mime_type: str = None,
+        crc32: str = None,
+        include_retired: bool = False
+    ) -> List[Dict[str, Any]]:
+        """按文件ID、标签、MIME类型或CRC32查询文件"""
+        with self.session_factory() as db:
+            project = get_project_by_name(db, project_name)
+            if not project:
+                return []
+            records = find_file_records(
+                db, project.id, file_id=file_id, tag=tag, mime_type=mime_type,
+                crc32=crc32, include_retired=include_retired
+            )
+            return [self.record_to_dict(r) for r in records]
+
+    def list_files(
+        self,
+        project_name: str,
+        date: Optional[str] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """分页列出项目某日期记录下的有效文件，返回 (文件列表, 下一页游标)
+
+        date/cursor 格式错误时抛出 ValueError。
+        """
+        decoded_cursor = decode_file_cursor(cursor) if cursor else None
+        with self.session_factory() as db:
+            project = get_project_by_name(db, project_name)
+            if not project:
+                return [], None
+            records = get_project_files(db, project.id, date, limit=limit, cursor=decoded_cursor)
+            next_cursor = encode_file_cursor(records[-1]) if len(records) == limit else None
+            return [self.record_to_dict(r) for r in records], next_cursor
+
+    def rebuild(self, project_name: Optional[str] = None) -> Dict[str, Any]:
+        """根据现有 record_meta.json 重建索引（不指定项目时重建全部项目）"""
+        stats = {"projects": 0, "dates": 0, "files": 0, "errors": []}
+        with self.session_factory() as db:
+            if project_name:
+                project = get_project_by_name(db, project_name)
+                projects = [project] if project else []
+                if not project:
+                    stats["errors"].append(f"项目 '{project_name}' 不存在")
+            else:
+                projects = db.query(Project).filter(Project.is_active == True).all()
+
+            for project in projects:
+                try:
+                    delete_project_file_records(db, project.id)
+                    for date in self.metadata_manager.list_project_dates(project.name):
+                        metadata = self.metadata_manager.load_metadata(project.name, date)
+                        if not metadata:
+                            continue
+                        for file_info in metadata.files:
+                            self._upsert(db, project.id, file_info)
+                            stats["files"] += 1
+                        stats["dates"] += 1
+                    db.commit()
+                    stats["projects"] += 1
+                except SQLAlchemyError as e:
+                    db.rollback()
+                    stats["errors"].append(f"{project.name}: {e}")
+        return stats
+
+    def record_to_dict(self, record: FileRecord) -> Dict[str, Any]:
+        """文件记录转字典"""
+        return {
+            "file_id": record.file_id,
+            "filename": record.filename,
+            "stored_path": record.stored_path,
+            "record_date": record.record_date,
+            "original_name": record.original_name,
+            "crc32": record.crc32,
+            "mime": record.mime_type,
+            "size_bytes": record.size_bytes,
+            "uploaded_at": record.uploaded_at,
+            "source": record.source,
+            "tags": [t.tag for t in record.tag_items],
+            "language": record.language,
+            "status": {"ocr": record.status_ocr, "parsed": record.status_parsed},
+            "notes": record.notes,
+            "is_active": record.is_active,
+            "retired_at": record.retired_at,
+        }
+
+    def _get_project_id(self, db: Session, project_name: str) -> Optional[int]:
+        project = get_project_by_name(db, project_name)
+        return project.id if project else None
+
+    def _upsert(self, db: Session, project_id: int, file_info: FileInfo) -> FileRecord:
+        retired = file_info.status.get("retired") == "true"
+        retired_at = None
+        if retired and file_info.status.get("retired_at"):
+            try:
+                retired_at = datetime.fromisoformat(file_info.status["retired_at"])
+            except ValueError:
+                retired_at = None
+        return upsert_file_record(
+            db,
+            project_id=project_id,
+            file_id=file_info.file_id,
+            filename=file_info.filename,
+            stored_path=file_info.stored_path,
+            original_name=file_info.original_name,
+            crc32=file_info.crc32,
+            mime_type=file_info.mime,
+            size_bytes=file_info.size_bytes,
+            uploaded_at=file_info.uploaded_at,
+            source=file_info.source.value,
+            tags=file_info.tags,
+            language=file_info.language,
+            status_ocr=file_info.status.get("ocr", "pending"),
+            status_parsed=file_info.status.get("parsed", "pending"),
+            notes=file_info.notes,
+            is_active=not retired,
+            retired_at=retired_at
+        )
+
+
+# 全局文件索引实例
+file_index = FileIndex()
+
+
+def main():
+    """命令行入口：python -m server.DataManager.FileIndex rebuild [--project NAME]"""
+    parser = argparse.ArgumentParser(description="文件索引维护工具")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: 根据 record_meta.json 重建索引")
+    parser.add_argument("--project", default=None, help="只重建指定项目")
+    args = parser.parse_args()
+
+    from server.database import init_database
+    init_database()
+    stats = file_index.rebuild(args.project)
+    print(f"重建完成: {stats['projects']} 个项目, {stats['dates']} 个日期, {stats['files']} 个文件")
+    for error in stats["errors"]:
+        print(f"错误: {error}")
+
+
+if __name__ == "__main__":
+    main()
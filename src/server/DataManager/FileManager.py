@@ -1,14 +1,20 @@
 """文件管理器"""
+import io
 import os
 import zlib
+import hashlib
 import shutil
+import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, BinaryIO, List
+from concurrent.futures import ThreadPoolExecutor
 import mimetypes
 from server.config import settings, get_project_files_path
 from server.models import FileInfo, FileSource, FileStatus
 from .MetadataManager import MetadataManager
+from .BlobStore import blob_store
+from .FileIndex import file_index
 
 
 class FileManager:
@@ -29,66 +35,263 @@ class FileManager:
         replace_existing: bool = False
     ) -> Tuple[bool, Optional[str], Optional[FileInfo]]:
         """上传文件"""
+        # 验证文件大小（内存中的内容可以直接判断，无需写临时文件）
+        if len(file_content) > settings.MAX_FILE_SIZE:
+            return False, f"文件大小超过限制: {settings.MAX_FILE_SIZE} bytes", None
+        
+        return self.upload_file_stream(
+            project_name, date, io.BytesIO(file_content), filename,
+            source, tags, notes, replace_existing
+        )
+    
+    def upload_file_stream(
+        self,
+        project_name: str,
+        date: str,
+        file_obj: BinaryIO,
+        filename: str,
+        source: FileSource = FileSource.MANUAL_UPLOAD,
+        tags: list = None,
+        notes: str = None,
+        replace_existing: bool = False
+    ) -> Tuple[bool, Optional[str], Optional[FileInfo]]:
+        """流式上传文件
+        
+        按 UPLOAD_CHUNK_SIZE 分块读取 file_obj，边读边计算CRC32、SHA-256和大小，
+        先写入同目录下的临时文件，校验通过后存入内容寻址的 blob 存储，
+        并在 files/{date}/ 下建立硬链接，单次上传的内存占用与文件大小无关。
+        """
+        return self.upload_files(
+            project_name, date, [(file_obj, filename)],
+            source, tags, notes, replace_existing
+        )[0]
+    
+    def upload_files(
+        self,
+        project_name: str,
+        date: str,
+        files: List[Tuple[BinaryIO, str]],
+        source: FileSource = FileSource.MANUAL_UPLOAD,
+        tags: list = None,
+        notes: str = None,
+        replace_existing: bool = False
+    ) -> List[Tuple[bool, Optional[str], Optional[FileInfo]]]:
+        """批量流式上传文件
+        
+        files 为 (文件对象, 文件名) 列表。各文件并发写入临时文件，
+        随后在记录锁内统一存入 blob 存储并链接到日期目录，只做一次元数据保存。
+        返回与输入顺序一致的 (成功, 消息, 文件信息) 列表。
+        """
+        results: List[Tuple[bool, Optional[str], Optional[FileInfo]]] = [
+            (False, "未处理", None) for _ in files
+        ]
+        staged: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        
         try:
-            # 验证文件类型
-            mime_type = self._get_mime_type(filename)
-            if not self._is_allowed_file_type(mime_type):
-                return False, f"不支持的文件类型: {mime_type}", None
-            
-            # 验证文件大小
-            if len(file_content) > settings.MAX_FILE_SIZE:
-                return False, f"文件大小超过限制: {settings.MAX_FILE_SIZE} bytes", None
+            files_dir = get_project_files_path(project_name, date)
+            files_dir.mkdir(parents=True, exist_ok=True)
             
-            # 生成文件ID和存储路径
-            file_id = self._generate_file_id(filename, file_content)
-            stored_filename = self._generate_stored_filename(filename, file_id)
-            stored_path = get_project_files_path(project_name, date) / stored_filename
+            # 并发分块写入临时文件（超过大小限制时提前终止）
+            def _stage(index: int):
+                file_obj, filename = files[index]
+                try:
+                    ok, msg, item = self._stage_stream(file_obj, filename, files_dir)
+                except Exception as e:
+                    ok, msg, item = False, f"文件上传失败: {str(e)}", None
+                if ok:
+                    staged[index] = item
+                else:
+                    results[index] = (False, msg, None)
             
-            # 检查是否已存在
-            if stored_path.exists() and not replace_existing:
-                return False, "文件已存在，请使用更新接口或设置replace_existing=True", None
+            workers = max(1, min(len(files), settings.UPLOAD_BATCH_WORKERS))
+            if workers == 1:
+                for i in range(len(files)):
+                    _stage(i)
+            else:
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+                    list(pool.map(_stage, range(len(files))))
             
-            # 确保目录存在
-            stored_path.parent.mkdir(parents=True, exist_ok=True)
+            # 存在性检查、落盘和元数据提交在同一把记录锁内完成，避免并发上传互相覆盖
+            with self.metadata_manager.lock(project_name, date):
+                committed: List[Tuple[int, Path, FileInfo]] = []
+                claimed_paths = set()
+                # 替换上传时，同名文件的旧版本（内容不同则存储路径不同）在元数据保存后清理
+                existing_by_name: Dict[str, FileInfo] = {}
+                if replace_existing:
+                    metadata = self.metadata_manager.load_metadata(project_name, date)
+                    for existing_file in (metadata.files if metadata else []):
+                        existing_by_name.setdefault(existing_file.filename, existing_file)
+                replaced: List[FileInfo] = []
+                for i, item in enumerate(staged):
+                    if item is None:
+                        continue
+                    filename = files[i][1]
+                    
+                    # 生成文件ID和存储路径
+                    file_id = self._generate_file_id_from_hash(filename, item["sha256"])
+                    stored_filename = self._generate_stored_filename(filename, file_id)
+                    stored_path = files_dir / stored_filename
+                    
+                    # 检查是否已存在（包括同一批次内的重复文件）
+                    if stored_path in claimed_paths or (stored_path.exists() and not replace_existing):
+                        results[i] = (False, "文件已存在，请使用更新接口或设置replace_existing=True", None)
+                        continue
+                    
+                    # 存入 blob（相同内容只保留一份）并链接到最终位置
+                    blob_store.store(project_name, item["sha256"], item["tmp_path"], stored_path)
+                    staged[i] = None
+                    claimed_paths.add(stored_path)
+                    
+                    file_info = self._build_file_info(
+                        file_id, filename, stored_path, item["crc32"], item["mime"],
+                        item["size"], source, tags, notes, item["sha256"]
+                    )
+                    committed.append((i, stored_path, file_info))
+                    old_info = existing_by_name.pop(filename, None)
+                    if old_info is not None and old_info.stored_path != file_info.stored_path:
+                        replaced.append(old_info)
+                
+                if committed:
+                    file_infos = [info for _, _, info in committed]
+                    success = self.metadata_manager.add_files_to_metadata(
+                        project_name, date, file_infos, replace_existing
+                    )
+                    # JSON 保存成功后再同步索引，索引失败不影响上传结果
+                    if success:
+                        file_index.sync(project_name, file_infos, retired=replaced)
+                    for i, stored_path, file_info in committed:
+                        if success:
+                            results[i] = (True, str(stored_path), file_info)
+                        else:
+                            # 如果元数据更新失败，删除文件
+                            stored_path.unlink()
+                            blob_store.release(project_name, file_info.sha256)
+                            results[i] = (False, "元数据更新失败", None)
+                    if success:
+                        for old_info in replaced:
+                            self._discard_stored_file(project_name, old_info)
             
-            # 保存文件
-            with open(stored_path, 'wb') as f:
-                f.write(file_content)
+            # 后台预提取文本，工作流执行时直接读取结果
+            uploaded = [result[2] for result in results if result[0]]
+            if uploaded:
+                # 延迟导入：IngestPipeline 依赖的提取模块会反向导入 FileManager
+                from .IngestPipeline import ingest_pipeline
+                ingest_pipeline.submit(project_name, date, uploaded)
             
-            # 创建文件信息
-            file_info = FileInfo(
-                file_id=file_id,
-                filename=filename,
-                stored_path=str(stored_path.relative_to(settings.BASE_DIR)),
-                original_name=filename,
-                crc32=self._calculate_crc32(file_content),
-                mime=mime_type,
-                size_bytes=len(file_content),
-                uploaded_at=datetime.now(),
-                source=source,
-                tags=tags or [],
-                language=self._detect_language(filename),
-                status={
-                    "ocr": FileStatus.PENDING,
-                    "parsed": FileStatus.PENDING
-                },
-                notes=notes
-            )
+            return results
             
-            # 更新元数据
-            success = self.metadata_manager.add_file_to_metadata(
-                project_name, date, file_info, replace_existing
-            )
-            
-            if success:
-                return True, str(stored_path), file_info
-            else:
-                # 如果元数据更新失败，删除文件
-                stored_path.unlink()
-                return False, "元数据更新失败", None
-                
         except Exception as e:
-            return False, f"文件上传失败: {str(e)}", None
+            return [
+                result if result[0] else (False, f"文件上传失败: {str(e)}", None)
+                for result in results
+            ]
+        finally:
+            for item in staged:
+                if item is not None:
+                    try:
+                        item["tmp_path"].unlink()
+                    except OSError:
+                        pass
+    
+    def update_file_stream(
+        self,
+        project_name: str,
+        date: str,
+        file_obj: BinaryIO,
+        filename: str,
+        source: FileSource = FileSource.MANUAL_UPLOAD,
+        tags: list = None,
+        notes: str = None
+    ) -> Tuple[bool, Optional[str], Optional[FileInfo]]:
+        """流式更新文件"""
+        return self.upload_file_stream(
+            project_name, date, file_obj, filename,
+            source, tags, notes, replace_existing=True
+        )
+    
+    def _stage_stream(
+        self, file_obj: BinaryIO, filename: str, target_dir: Path
+    ) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
+        """校验文件类型并将文件流写入临时文件，返回 (成功, 错误信息, 暂存信息)"""
+        # 验证文件类型
+        mime_type = self._get_mime_type(filename)
+        if not self._is_allowed_file_type(mime_type):
+            return False, f"不支持的文件类型: {mime_type}", None
+        
+        ok, msg, tmp_path, size, crc32, sha256 = self._write_stream_to_temp(file_obj, target_dir)
+        if not ok:
+            return False, msg, None
+        
+        return True, None, {
+            "tmp_path": tmp_path, "size": size, "crc32": crc32, "sha256": sha256, "mime": mime_type
+        }
+    
+    def _write_stream_to_temp(
+        self, file_obj: BinaryIO, target_dir: Path
+    ) -> Tuple[bool, Optional[str], Optional[Path], int, Optional[str], Optional[str]]:
+        """将文件流分块写入 target_dir 下的临时文件，返回 (成功, 错误信息, 临时路径, 大小, CRC32, SHA-256)"""
+        fd, tmp_name = tempfile.mkstemp(dir=str(target_dir), prefix=".upload_", suffix=".tmp")
+        tmp_path = Path(tmp_name)
+        size = 0
+        crc32_value = 0
+        sha256 = hashlib.sha256()
+        too_large = False
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = file_obj.read(settings.UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > settings.MAX_FILE_SIZE:
+                        too_large = True
+                        break
+                    crc32_value = zlib.crc32(chunk, crc32_value)
+                    sha256.update(chunk)
+                    f.write(chunk)
+        except Exception:
+            tmp_path.unlink()
+            raise
+        
+        if too_large:
+            tmp_path.unlink()
+            return False, f"文件大小超过限制: {settings.MAX_FILE_SIZE} bytes", None, size, None, None
+        
+        return True, None, tmp_path, size, f"{crc32_value & 0xffffffff:08x}", sha256.hexdigest()
+    
+    def _build_file_info(
+        self,
+        file_id: str,
+        filename: str,
+        stored_path: Path,
+        crc32: str,
+        mime_type: str,
+        size_bytes: int,
+        source: FileSource,
+        tags: list,
+        notes: str,
+        sha256: Optional[str] = None
+    ) -> FileInfo:
+        """构造文件信息"""
+        return FileInfo(
+            file_id=file_id,
+            filename=filename,
+            stored_path=str(stored_path.relative_to(settings.BASE_DIR)),
+            original_name=filename,
+            crc32=crc32,
+            sha256=sha256,
+            mime=mime_type,
+            size_bytes=size_bytes,
+            uploaded_at=datetime.now(),
+            source=source,
+            tags=tags or [],
+            language=self._detect_language(filename),
+            status={
+                "ocr": FileStatus.PENDING,
+                "parsed": FileStatus.PENDING
+            },
+            notes=notes
+        )
     
     def update_file(
         self,
@@ -179,16 +382,28 @@ class FileManager:
         )
         
         if success:
-            # 删除物理文件
-            file_path = settings.BASE_DIR / file_info.stored_path
-            if file_path.exists():
-                try:
-                    file_path.unlink()
-                except OSError:
-                    pass  # 忽略删除失败
+            file_index.sync(project_name, retired=[file_info])
+            self._discard_stored_file(project_name, file_info)
         
         return success
     
+    def _discard_stored_file(self, project_name: str, file_info: FileInfo):
+        """删除已从元数据中移除的文件：物理文件、blob 引用和预提取文本"""
+        file_path = settings.BASE_DIR / file_info.stored_path
+        if file_path.exists():
+            try:
+                file_path.unlink()
+            except OSError:
+                pass  # 忽略删除失败
+        # 回收不再被引用的 blob
+        blob_store.release(project_name, file_info.sha256)
+        # 删除预提取的文本
+        from .IngestPipeline import get_extracted_text_path
+        try:
+            get_extracted_text_path(file_path).unlink()
+        except OSError:
+            pass
+    
     def list_files(self, project_name: str, date: str) -> list[FileInfo]:
         """列出文件"""
         metadata = self.metadata_manager.load_metadata(project_name, date)
@@ -217,16 +432,31 @@ class FileManager:
         status: str
     ) -> bool:
         """更新文件处理状态"""
-        file_info = self.get_file_info(project_name, date, file_id)
-        
-        if not file_info:
-            return False
-        
-        file_info.status[status_type] = status
-        
-        return self.metadata_manager.update_file_in_metadata(
-            project_name, date, file_id, file_info
-        )
+        return self.update_file_statuses(project_name, date, file_id, {status_type: status})
+    
+    def update_file_statuses(
+        self, 
+        project_name: str, 
+        date: str, 
+        file_id: str, 
+        statuses: Dict[str, str]
+    ) -> bool:
+        """一次更新文件的多个处理状态（只保存一次元数据）"""
+        with self.metadata_manager.lock(project_name, date):
+            file_info = self.get_file_info(project_name, date, file_id)
+            
+            if not file_info:
+                return False
+            
+            file_info.status.update(statuses)
+            
+            success = self.metadata_manager.update_file_in_metadata(
+                project_name, date, file_id, file_info
+            )
+            if success:
+                file_index.sync(project_name, [file_info])
+            
+            return success
     
     def copy_file_to_output(
         self, 
@@ -257,10 +487,46 @@ class FileManager:
             print(f"复制文件失败: {e}")
             return None
     
+    def deduplicate_project_files(self, project_name: str) -> Dict[str, Any]:
+        """将项目中尚未纳入 blob 存储的历史文件迁移为硬链接（相同内容只保留一份）"""
+        stats = {"files": 0, "adopted": 0, "failed": 0}
+        
+        for date in self.metadata_manager.list_project_dates(project_name):
+            with self.metadata_manager.lock(project_name, date):
+                metadata = self.metadata_manager.load_metadata(project_name, date)
+                if not metadata:
+                    continue
+                
+                changed = False
+                for file_info in metadata.files:
+                    file_path = settings.BASE_DIR / file_info.stored_path
+                    if not file_path.exists():
+                        continue
+                    stats["files"] += 1
+                    try:
+                        sha256 = file_info.sha256 or self._calculate_sha256_file(file_path)
+                        blob_store.adopt(project_name, sha256, file_path)
+                    except OSError as e:
+                        print(f"迁移文件到blob存储失败 {file_path}: {e}")
+                        stats["failed"] += 1
+                        continue
+                    if file_info.sha256 != sha256:
+                        file_info.sha256 = sha256
+                        changed = True
+                    stats["adopted"] += 1
+                
+                if changed:
+                    self.metadata_manager.save_metadata(project_name, date, metadata)
+        
+        return stats
+    
     def _generate_file_id(self, filename: str, content: bytes) -> str:
         """生成文件ID"""
-        # 使用文件名和内容的CRC32生成唯一ID
-        combined = f"{filename}_{len(content)}".encode('utf-8')
+        return self._generate_file_id_from_hash(filename, hashlib.sha256(content).hexdigest())
+    
+    def _generate_file_id_from_hash(self, filename: str, sha256: str) -> str:
+        """根据文件名和内容哈希生成文件ID（同名不同内容的文件不会冲突）"""
+        combined = f"{filename}_{sha256}".encode('utf-8')
         crc32_value = zlib.crc32(combined) & 0xffffffff
         return f"f_{crc32_value:08x}"
     
@@ -274,6 +540,17 @@ class FileManager:
         crc32_value = zlib.crc32(content) & 0xffffffff
         return f"{crc32_value:08x}"
     
+    def _calculate_sha256_file(self, file_path: Path) -> str:
+        """分块计算文件的SHA-256"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
     def _get_mime_type(self, filename: str) -> str:
         """获取MIME类型"""
         mime_type, _ = mimetypes.guess_type(filename)
@@ -308,9 +585,11 @@ class FileManager:
                 "ocr_pending": 0,
                 "ocr_done": 0,
                 "ocr_failed": 0,
+                "ocr_skipped": 0,
                 "parsed_pending": 0,
                 "parsed_done": 0,
-                "parsed_failed": 0
+                "parsed_failed": 0,
+                "parsed_skipped": 0
             }
         }
         
@@ -0,0 +1,232 @@
+"""上传文件的后台文本预提取
+
+文件上传后立即在后台提取文本（PDF 解析、图片 OCR 仍在提取进程池中执行），
+结果保存在文件所在日期目录的 .extracted/ 下，并更新 FileInfo.status 中的 ocr / parsed 状态。
+工作流执行时直接读取预提取的文本：仍在提取中的文件等待其完成，
+没有预提取结果（如服务重启前未完成）的文件再当场提取并补存结果。
+OCR 不可用时图片记为 skipped、提取失败时记为 failed，两种情况都不保存预提取文本。
+"""
+import asyncio
+import functools
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from server.config import settings
+from server.models import FileInfo, FileStatus
+from server.ToolManager.ExtractionPool import OCR_UNAVAILABLE_ERROR, extract_text, get_extraction_tool_name
+from .AsyncDataManager import run_io
+from .FileManager import FileManager
+
+
+# 预提取文本的存放目录名（位于文件所在目录下）
+EXTRACTED_DIR_NAME = ".extracted"
+
+
+def get_extracted_text_path(file_path: Any) -> Path:
+    """文件对应的预提取文本路径"""
+    file_path = Path(file_path)
+    return file_path.parent / EXTRACTED_DIR_NAME / f"{file_path.name}.txt"
+
+
+def read_extracted_text(file_path: Any) -> Optional[str]:
+    """读取预提取文本，不存在或早于源文件（文件已被改写）时返回 None"""
+    if not _is_managed_file(file_path):
+        return None
+    text_path = get_extracted_text_path(file_path)
+    try:
+        if text_path.stat().st_mtime_ns < os.stat(file_path).st_mtime_ns:
+            return None
+        with open(text_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def save_extracted_text(file_path: Any, text: str) -> bool:
+    """保存预提取文本（写临时文件后 os.replace）"""
+    if not _is_managed_file(file_path):
+        return False
+    text_path = get_extracted_text_path(file_path)
+    tmp_path: Optional[str] = None
+    try:
+        text_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=str(text_path.parent), prefix=".text_", suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, text_path)
+        tmp_path = None
+        return True
+    except OSError as e:
+        print(f"保存预提取文本失败 {file_path}: {e}")
+        return False
+    finally:
+        if tmp_path is not None:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+def _is_managed_file(file_path: Any) -> bool:
+    # 只为用户数据目录下的文件保存结果，避免在任意路径旁创建 .extracted 目录
+    try:
+        Path(file_path).resolve().relative_to(Path(settings.USRDATA_DIR).resolve())
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _statuses_for(item: Dict[str, Any]) -> Dict[str, str]:
+    """根据提取结果计算 ocr / parsed 状态"""
+    if item["tool"] is None or item["error"] == OCR_UNAVAILABLE_ERROR:
+        return {"ocr": FileStatus.SKIPPED.value, "parsed": FileStatus.SKIPPED.value}
+    result = FileStatus.FAILED.value if item["error"] else FileStatus.DONE.value
+    ocr = result if item["tool"] == "image_reader" else FileStatus.SKIPPED.value
+    return {"ocr": ocr, "parsed": result}
+
+
+class IngestPipeline:
+    """上传后的后台预提取流水线（独立的常驻事件循环线程）"""
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = max(1, concurrency or settings.INGEST_CONCURRENCY)
+        self.file_manager = FileManager()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        # 文件绝对路径 -> 提取中的 Future（结果为 extract_text 的返回值）
+        self._inflight: Dict[str, Future] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动流水线线程（重复调用无副作用）"""
+        if self.is_running:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="ingest-pipeline", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 10.0):
+        """停止流水线：取消未完成的提取，对应文件保持 pending，执行工作流时再当场提取"""
+        if not self.is_running or self._loop is None:
+            return
+        with self._lock:
+            futures = list(self._inflight.values())
+            self._inflight.clear()
+        for future in futures:
+            future.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, project_name: str, date: str, file_infos: List[FileInfo]) -> int:
+        """提交新上传文件的预提取（线程安全），返回实际排入的文件数"""
+        loop = self._loop
+        if not settings.INGEST_ENABLED or not self.is_running or loop is None:
+            return 0
+        submitted = 0
+        for file_info in file_infos:
+            file_path = str(settings.BASE_DIR / file_info.stored_path)
+            with self._lock:
+                if file_path in self._inflight:
+                    continue
+                future = asyncio.run_coroutine_threadsafe(
+                    self._ingest(project_name, date, file_info.file_id, file_path), loop
+                )
+                self._inflight[file_path] = future
+            future.add_done_callback(functools.partial(self._forget, file_path))
+            submitted += 1
+        return submitted
+
+    async def load_texts(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """读取多个文件的文本，结果与输入顺序一致
+
+        每项为 extract_text 的返回结构，另带 source：
+        precomputed（读取预提取结果）/ ingest（等待后台提取完成）/ extracted（当场提取）。
+        """
+        return list(await asyncio.gather(*(self.load_text(fp) for fp in file_paths)))
+
+    async def load_text(self, file_path: str) -> Dict[str, Any]:
+        """读取单个文件的文本，可在任意事件循环中调用"""
+        file_path = str(file_path)
+        started = time.perf_counter()
+
+        with self._lock:
+            future = self._inflight.get(file_path)
+        if future is not None:
+            waiter = asyncio.wrap_future(future)
+            await asyncio.wait([waiter])
+            if not waiter.cancelled() and waiter.exception() is None:
+                item = dict(waiter.result())
+                item["elapsed"] = round(time.perf_counter() - started, 3)
+                item["source"] = "ingest"
+                return item
+
+        text = await run_io(read_extracted_text, file_path)
+        # 图片的空预提取文本可能是 OCR 不可用时保存的，重新提取（提取缓存中的有效结果可直接复用）
+        if text == "" and get_extraction_tool_name(file_path) == "image_reader":
+            text = None
+        if text is not None:
+            return {
+                "file": Path(file_path).name,
+                "tool": get_extraction_tool_name(file_path),
+                "text": text,
+                "elapsed": round(time.perf_counter() - started, 3),
+                "error": None,
+                "source": "precomputed",
+            }
+
+        item = await extract_text(file_path)
+        if item["error"] is None:
+            await run_io(save_extracted_text, file_path, item["text"])
+        item["source"] = "extracted"
+        return item
+
+    def _forget(self, file_path: str, future: Future):
+        with self._lock:
+            if self._inflight.get(file_path) is future:
+                del self._inflight[file_path]
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+            self._loop = None
+
+    async def _ingest(self, project_name: str, date: str, file_id: str, file_path: str) -> Dict[str, Any]:
+        async with self._semaphore:
+            item = await extract_text(file_path)
+        if item["error"] is None and not await run_io(save_extracted_text, file_path, item["text"]):
+            item["error"] = "保存预提取文本失败"
+
+        statuses = _statuses_for(item)
+        try:
+            await run_io(self.file_manager.update_file_statuses, project_name, date, file_id, statuses)
+        except Exception as e:
+            print(f"更新文件处理状态失败 {file_path}: {e}")
+        if item["error"] and item["tool"] is not None:
+            print(f"预提取文件文本失败 {file_path}: {item['error']}")
+        return item
+
+
+# 全局预提取流水线（在应用启动/关闭时 start/stop）
+ingest_pipeline = IngestPipeline()
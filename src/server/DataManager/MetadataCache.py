@@ -0,0 +1,99 @@
+"""元数据缓存"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+from server.config import settings
+from server.models import RecordMetadata
+
+
+class MetadataCache:
+    """record_meta.json 解析结果的 LRU 缓存
+
+    以 (project, date) 为键缓存已校验的 RecordMetadata，读取时用文件的 mtime/size
+    判断是否仍然新鲜，避免每次请求都做 JSON 解析和 pydantic 校验。
+    对外总是返回深拷贝，调用方修改返回值不会污染缓存。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else settings.METADATA_CACHE_SIZE
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, int, RecordMetadata]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, project_name: str, date: str, metadata_path: Path) -> Optional[RecordMetadata]:
+        """获取缓存的元数据，文件不存在或已变更时返回 None"""
+        key = (project_name, date)
+        try:
+            stat = metadata_path.stat()
+        except OSError:
+            self.invalidate(project_name, date)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metadata = entry[2]
+
+        return metadata.model_copy(deep=True)
+
+    def put(
+        self,
+        project_name: str,
+        date: str,
+        metadata_path: Path,
+        metadata: RecordMetadata,
+        stat: Optional[os.stat_result] = None
+    ):
+        """写入缓存
+
+        stat 为读取文件前获取的状态；不传时在此处 stat（应在文件落盘之后调用）。
+        """
+        if self.max_entries <= 0:
+            return
+        if stat is None:
+            try:
+                stat = metadata_path.stat()
+            except OSError:
+                self.invalidate(project_name, date)
+                return
+
+        key = (project_name, date)
+        entry = (stat.st_mtime_ns, stat.st_size, metadata.model_copy(deep=True))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, project_name: str, date: str):
+        """移除指定记录的缓存"""
+        with self._lock:
+            self._entries.pop((project_name, date), None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+# 全局元数据缓存实例（所有 MetadataManager 共享）
+metadata_cache = MetadataCache()
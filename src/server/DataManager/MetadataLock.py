@@ -0,0 +1,112 @@
+"""元数据锁管理器"""
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+from server.config import settings, get_project_files_path
+
+if os.name == 'nt':
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
+    msvcrt = None
+
+
+class _FileLock:
+    """基于 flock / msvcrt.locking 的跨进程排他锁"""
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = lock_path
+        self._fd = None
+
+    def acquire(self):
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.lock_path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            else:
+                # msvcrt.LK_LOCK 最多重试10秒，这里循环直到拿到锁
+                while True:
+                    try:
+                        msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except Exception:
+            os.close(self._fd)
+            self._fd = None
+            raise
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class MetadataLockManager:
+    """按 (project, date) 粒度串行化 record_meta.json 的读-改-写
+
+    进程内使用可重入线程锁（元数据操作都在I/O线程池中同步执行）；
+    多 worker 部署（API_WORKERS > 1）或显式开启 METADATA_FILE_LOCK 时，
+    最外层加锁还会持有 files/{date}/.record_meta.lock 上的文件锁。
+    """
+
+    def __init__(self):
+        self._locks: Dict[Tuple[str, str], threading.RLock] = {}
+        self._guard = threading.Lock()
+        self._local = threading.local()
+
+    def _get_lock(self, key: Tuple[str, str]) -> threading.RLock:
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = threading.RLock()
+                self._locks[key] = lock
+            return lock
+
+    def _use_file_lock(self) -> bool:
+        return settings.METADATA_FILE_LOCK or settings.API_WORKERS > 1
+
+    def get_lock_path(self, project_name: str, date: str) -> Path:
+        """获取文件锁路径"""
+        return get_project_files_path(project_name, date) / ".record_meta.lock"
+
+    @contextmanager
+    def lock(self, project_name: str, date: str) -> Iterator[None]:
+        """获取指定记录的锁（同一线程可重入）"""
+        key = (project_name, date)
+        depths = getattr(self._local, "depths", None)
+        if depths is None:
+            depths = self._local.depths = {}
+
+        with self._get_lock(key):
+            depth = depths.get(key, 0)
+            depths[key] = depth + 1
+            file_lock = None
+            try:
+                if depth == 0 and self._use_file_lock():
+                    file_lock = _FileLock(self.get_lock_path(project_name, date))
+                    file_lock.acquire()
+                yield
+            finally:
+                if file_lock is not None:
+                    file_lock.release()
+                if depth == 0:
+                    depths.pop(key, None)
+                else:
+                    depths[key] = depth
+
+
+# 全局元数据锁管理器（所有 MetadataManager 共享）
+metadata_locks = MetadataLockManager()
@@ -1,11 +1,15 @@
 """元数据管理器"""
 import json
 import os
+import tempfile
+from contextlib import AbstractContextManager
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from server.config import get_project_files_path, get_project_data_path, settings
 from server.models import RecordMetadata, FileInfo, AuthorInfo, SummaryInfo, WorkflowInfo, GitInfo, Permissions
+from .MetadataCache import metadata_cache
+from .MetadataLock import metadata_locks
 
 
 class MetadataManager:
@@ -18,6 +22,10 @@ class MetadataManager:
         """获取元数据文件路径"""
         return get_project_files_path(project_name, date) / "record_meta.json"
     
+    def lock(self, project_name: str, date: str) -> AbstractContextManager:
+        """获取记录级锁，用于包裹 load → 修改 → save 的完整过程"""
+        return metadata_locks.lock(project_name, date)
+    
     def load_metadata(self, project_name: str, date: str) -> Optional[RecordMetadata]:
         """加载元数据"""
         metadata_path = self.get_metadata_path(project_name, date)
@@ -25,32 +33,61 @@ class MetadataManager:
         if not metadata_path.exists():
             return None
         
+        # 文件未变更时直接使用缓存，跳过JSON解析和模型校验
+        cached = metadata_cache.get(project_name, date, metadata_path)
+        if cached is not None:
+            return cached
+        
         try:
+            # 先取文件状态再读取，避免读取期间被改写时缓存到旧内容
+            stat = metadata_path.stat()
             with open(metadata_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                return RecordMetadata(**data)
+            metadata = RecordMetadata(**data)
+            metadata_cache.put(project_name, date, metadata_path, metadata, stat)
+            return metadata
         except (json.JSONDecodeError, IOError, ValueError) as e:
             print(f"加载元数据失败: {e}")
             return None
     
     def save_metadata(self, project_name: str, date: str, metadata: RecordMetadata) -> bool:
-        """保存元数据"""
+        """保存元数据（写临时文件后 os.replace，避免中途崩溃截断JSON）"""
         metadata_path = self.get_metadata_path(project_name, date)
+        tmp_path: Optional[Path] = None
         
         try:
-            # 确保目录存在
-            metadata_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 更新修改时间
-            metadata.updated_at = datetime.now()
-            
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata.dict(), f, ensure_ascii=False, indent=2, default=str)
+            with self.lock(project_name, date):
+                # 确保目录存在
+                metadata_path.parent.mkdir(parents=True, exist_ok=True)
+                
+                # 更新修改时间
+                metadata.updated_at = datetime.now()
+                
+                fd, tmp_name = tempfile.mkstemp(
+                    dir=str(metadata_path.parent), prefix=".record_meta_", suffix=".tmp"
+                )
+                tmp_path = Path(tmp_name)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(metadata.dict(), f, ensure_ascii=False, indent=2, default=str)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, metadata_path)
+                tmp_path = None
+                
+                # 写入后原地更新缓存
+                metadata_cache.put(project_name, date, metadata_path, metadata)
             
             return True
-        except (IOError, json.JSONEncodeError) as e:
+        except (IOError, TypeError, ValueError) as e:
+            metadata_cache.invalidate(project_name, date)
             print(f"保存元数据失败: {e}")
             return False
+        finally:
+            if tmp_path is not None:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
     
     def create_metadata(
         self, 
@@ -87,26 +124,38 @@ class MetadataManager:
         replace_existing: bool = False
     ) -> bool:
         """添加文件到元数据"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            # 创建新的元数据
-            author = AuthorInfo(user_id="system", display_name="System")
-            metadata = self.create_metadata(project_name, date, author)
-        
-        if replace_existing:
-            # 标记同名文件为已废弃
-            for i, existing_file in enumerate(metadata.files):
-                if existing_file.filename == file_info.filename:
-                    metadata.files[i] = file_info
-                    break
-            else:
-                metadata.files.append(file_info)
-        else:
-            # 添加新文件
-            metadata.files.append(file_info)
-        
-        return self.save_metadata(project_name, date, metadata)
+        return self.add_files_to_metadata(project_name, date, [file_info], replace_existing)
+    
+    def add_files_to_metadata(
+        self, 
+        project_name: str, 
+        date: str, 
+        file_infos: List[FileInfo],
+        replace_existing: bool = False
+    ) -> bool:
+        """批量添加文件到元数据（只保存一次）"""
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                # 创建新的元数据
+                author = AuthorInfo(user_id="system", display_name="System")
+                metadata = self.create_metadata(project_name, date, author)
+            
+            for file_info in file_infos:
+                if replace_existing:
+                    # 标记同名文件为已废弃
+                    for i, existing_file in enumerate(metadata.files):
+                        if existing_file.filename == file_info.filename:
+                            metadata.files[i] = file_info
+                            break
+                    else:
+                        metadata.files.append(file_info)
+                else:
+                    # 添加新文件
+                    metadata.files.append(file_info)
+            
+            return self.save_metadata(project_name, date, metadata)
     
     def update_file_in_metadata(
         self, 
@@ -116,19 +165,20 @@ class MetadataManager:
         file_info: FileInfo
     ) -> bool:
         """更新元数据中的文件信息"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            return False
-        
-        for i, existing_file in enumerate(metadata.files):
-            if existing_file.file_id == file_id:
-                metadata.files[i] = file_info
-                break
-        else:
-            return False
-        
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                return False
+            
+            for i, existing_file in enumerate(metadata.files):
+                if existing_file.file_id == file_id:
+                    metadata.files[i] = file_info
+                    break
+            else:
+                return False
+            
+            return self.save_metadata(project_name, date, metadata)
     
     def remove_file_from_metadata(
         self, 
@@ -138,23 +188,24 @@ class MetadataManager:
         retire: bool = True
     ) -> bool:
         """从元数据中移除文件"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            return False
-        
-        if retire:
-            # 标记为已废弃
-            for file_info in metadata.files:
-                if file_info.file_id == file_id:
-                    file_info.status["retired"] = "true"
-                    file_info.status["retired_at"] = datetime.now().isoformat()
-                    break
-        else:
-            # 完全移除
-            metadata.files = [f for f in metadata.files if f.file_id != file_id]
-        
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                return False
+            
+            if retire:
+                # 标记为已废弃
+                for file_info in metadata.files:
+                    if file_info.file_id == file_id:
+                        file_info.status["retired"] = "true"
+                        file_info.status["retired_at"] = datetime.now().isoformat()
+                        break
+            else:
+                # 完全移除
+                metadata.files = [f for f in metadata.files if f.file_id != file_id]
+            
+            return self.save_metadata(project_name, date, metadata)
     
     def add_workflow_to_metadata(
         self, 
@@ -163,14 +214,15 @@ class MetadataManager:
         workflow_info: WorkflowInfo
     ) -> bool:
         """添加工作流到元数据"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            author = AuthorInfo(user_id="system", display_name="System")
-            metadata = self.create_metadata(project_name, date, author)
-        
-        metadata.workflows.append(workflow_info)
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                author = AuthorInfo(user_id="system", display_name="System")
+                metadata = self.create_metadata(project_name, date, author)
+            
+            metadata.workflows.append(workflow_info)
+            return self.save_metadata(project_name, date, metadata)
     
     def update_workflow_in_metadata(
         self, 
@@ -180,19 +232,20 @@ class MetadataManager:
         workflow_info: WorkflowInfo
     ) -> bool:
         """更新元数据中的工作流信息"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            return False
-        
-        for i, existing_workflow in enumerate(metadata.workflows):
-            if existing_workflow.wf_id == wf_id:
-                metadata.workflows[i] = workflow_info
-                break
-        else:
-            return False
-        
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                return False
+            
+            for i, existing_workflow in enumerate(metadata.workflows):
+                if existing_workflow.wf_id == wf_id:
+                    metadata.workflows[i] = workflow_info
+                    break
+            else:
+                return False
+            
+            return self.save_metadata(project_name, date, metadata)
     
     def update_summary_in_metadata(
         self, 
@@ -201,13 +254,14 @@ class MetadataManager:
         summary: SummaryInfo
     ) -> bool:
         """更新元数据中的总结信息"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            return False
-        
-        metadata.summary = summary
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                return False
+            
+            metadata.summary = summary
+            return self.save_metadata(project_name, date, metadata)
     
     def add_tags_to_metadata(
         self, 
@@ -216,16 +270,17 @@ class MetadataManager:
         tags: List[str]
     ) -> bool:
         """添加标签到元数据"""
-        metadata = self.load_metadata(project_name, date)
-        
-        if not metadata:
-            return False
-        
-        for tag in tags:
-            if tag not in metadata.tags:
-                metadata.tags.append(tag)
-        
-        return self.save_metadata(project_name, date, metadata)
+        with self.lock(project_name, date):
+            metadata = self.load_metadata(project_name, date)
+            
+            if not metadata:
+                return False
+            
+            for tag in tags:
+                if tag not in metadata.tags:
+                    metadata.tags.append(tag)
+            
+            return self.save_metadata(project_name, date, metadata)
     
     def get_files_by_tags(
         self, 
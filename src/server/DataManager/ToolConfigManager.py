@@ -300,6 +300,14 @@ class ToolConfigManager:
                         "default": 10000,
                         "help": "单段文本的最大长度，超过会被截断或分段。",
                     },
+                    {
+                        "name": "truncate",
+                        "label": "超长截断",
+                        "type": "boolean",
+                        "required": False,
+                        "default": True,
+                        "help": "超过最大文本长度时截断；关闭后保留全文，配合 LLM 节点的 map_reduce / refine 模式分块总结。",
+                    },
                 ],
             },
             "excel_reader": {
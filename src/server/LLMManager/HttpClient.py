@@ -0,0 +1,57 @@
+"""LLM 接口共享 HTTP 客户端
+
+httpx.AsyncClient 的连接池绑定在创建它的事件循环上，而 API、工作流执行器、后台预提取
+各自运行在独立的事件循环中。这里为每个事件循环维护一个长期存在的客户端（keep-alive 连接池），
+同一事件循环内的所有请求复用它，事件循环结束前调用 close_http_client 关闭。
+"""
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict
+from server.config import settings
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """获取当前事件循环共享的 AsyncClient（须在事件循环中调用）"""
+    if not HTTPX_AVAILABLE:
+        raise RuntimeError("httpx 未安装")
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                timeout=settings.LLM_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+                ),
+            )
+            _clients[loop] = client
+        return client
+
+
+async def close_http_client():
+    """关闭当前事件循环的共享客户端"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    with _lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def get_http_client_stats() -> Dict[str, int]:
+    with _lock:
+        return {"clients": sum(1 for c in _clients.values() if not c.is_closed)}
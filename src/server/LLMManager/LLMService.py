@@ -1,11 +1,20 @@
 """LLM服务"""
 import asyncio
 import json
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Callable, Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from server.config import settings
 from .PromptManager import prompt_manager
+from .TokenCounter import token_counter
+from .ResponseCache import response_cache
+from .RateLimiter import rate_limiter
+from .RetryPolicy import retry_policy
+from .HttpClient import get_http_client, get_http_client_stats
+from server.DataManager.AsyncDataManager import run_io
 
 try:
     from langchain_openai import ChatOpenAI
@@ -17,12 +26,61 @@ except ImportError:
     print("LangChain未安装，LLM功能将不可用")
 
 
+SUMMARY_SYSTEM_PROMPT = "你是一个专业的研究助手，擅长分析和总结各种文档内容。"
+
+# 长文本总结方式
+SUMMARY_MODES = ("stuff", "map_reduce", "refine")
+
+MAP_PROMPT = """以下是一份较长内容的第 {index}/{total} 部分，请提取这一部分的关键信息、主要观点和重要结论，保留具体的数据和名称：
+
+{content}
+
+要点："""
+
+REDUCE_PROMPT = """以下是同一批内容各部分的要点，请合并为一份要点，去除重复，保留关键信息、数据和结论：
+
+{content}
+
+合并后的要点："""
+
+# 增量总结：上次的总结与新增内容（或其分块摘要）一起交给模板
+INCREMENTAL_CONTENT_TEMPLATE = """以下是此前文件已生成的总结，以及之后新增的文件内容。请在已有总结的基础上合并新增内容，输出完整的更新后总结。
+
+已有总结：
+{previous_summary}
+
+新增文件内容：
+{content}"""
+
+REFINE_PROMPT = """已有总结（基于前面各部分内容）：
+{summary}
+
+以下是第 {index}/{total} 部分内容：
+{content}
+
+请结合这部分内容完善已有总结，保持原有结构，输出完整的更新后总结："""
+
+
 class LLMService:
-    """LLM服务"""
+    """LLM服务
+
+    模型不在构造时初始化：首次调用（或应用启动后的后台预热）时通过共享的 AsyncClient
+    请求 /v1/models 发现可用模型，发现结果缓存 LLM_MODELS_CACHE_TTL_SECONDS 秒。
+    available_models 记录全部可用模型，ChatOpenAI 实例在某个模型首次使用时才创建，
+    按 (模型名, 事件循环) 缓存在 llm_models 中（最多 LLM_MODEL_INSTANCES 个，按最近使用淘汰），
+    同一事件循环中的所有实例共用该循环的 HTTP 连接池。
+    """
     
     def __init__(self):
-        self.llm_models = {}
-        self._initialize_models()
+        self.available_models: List[str] = []
+        self.llm_models: "OrderedDict[Tuple[str, asyncio.AbstractEventLoop], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._models_initialized = False
+        # 模型发现失败后，此时间（monotonic）之前不再自动重试
+        self._init_retry_at = 0.0
+        self._init_tasks: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        # 模型发现缓存：(base_url, api_key) -> (获取时间, 模型列表)
+        self._discovery_cache: Dict[Tuple[str, Optional[str]], Tuple[float, List[Dict[str, Any]]]] = {}
     
     def _load_llm_config(self) -> Dict[str, Any]:
         """从配置文件加载LLM配置"""
@@ -35,6 +93,8 @@ class LLMService:
                         "base_url": data.get("base_url") or settings.OPENAI_BASE_URL,
                         "api_key": data.get("api_key") or settings.OPENAI_API_KEY,
                         "default_model": data.get("default_model") or settings.DEFAULT_LLM_MODEL,
+                        "rate_limits": data.get("rate_limits"),
+                        "max_in_flight": data.get("max_in_flight"),
                     }
             except (IOError, json.JSONDecodeError):
                 pass
@@ -43,120 +103,188 @@ class LLMService:
             "base_url": settings.OPENAI_BASE_URL,
             "api_key": settings.OPENAI_API_KEY,
             "default_model": settings.DEFAULT_LLM_MODEL,
+            "rate_limits": None,
+            "max_in_flight": None,
         }
     
-    def _get_available_models_from_api(self, base_url: str, api_key: Optional[str] = None) -> List[str]:
+    async def discover_models(self, force: bool = False) -> List[Dict[str, Any]]:
+        """请求 /v1/models 获取可用模型（id、owned_by、object）
+
+        结果按 (base_url, api_key) 缓存 LLM_MODELS_CACHE_TTL_SECONDS 秒，force=True 时重新请求。
+        未配置 base_url 或请求失败时抛出异常（失败结果不缓存）。
+        """
+        config = await run_io(self._load_llm_config)
+        base_url = config.get("base_url")
+        api_key = config.get("api_key")
+        if not base_url:
+            raise ValueError("尚未配置 LLM base_url")
+        
+        cache_key = (base_url, api_key)
+        cached = self._discovery_cache.get(cache_key)
+        if cached and not force and time.monotonic() - cached[0] < settings.LLM_MODELS_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        base = base_url.rstrip("/")
+        # 兼容用户已经在 Base URL 里写了 /v1 的情况
+        if base.endswith("/v1"):
+            url = base + "/models"
+        else:
+            url = base + "/v1/models"
+        
+        headers = {}
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        
+        resp = await get_http_client().get(url, headers=headers)
+        resp.raise_for_status()
+        models = [
+            {"id": m.get("id"), "owned_by": m.get("owned_by"), "object": m.get("object")}
+            for m in resp.json().get("data", [])
+            if m.get("id")
+        ]
+        # 配置变化后旧条目不再使用，只保留当前配置的结果
+        self._discovery_cache = {cache_key: (time.monotonic(), models)}
+        return models
+    
+    async def _get_available_models_from_api(self) -> List[str]:
         """从API获取可用模型列表"""
         try:
-            import httpx
-        except ImportError:
+            return [m["id"] for m in await self.discover_models()]
+        except Exception as e:
+            print(f"从API获取模型列表失败: {e}")
             return []
+    
+    async def ensure_models(self):
+        """首次使用时初始化模型
+
+        发现成功后不再自动初始化（之后通过 reinitialize_models 重新初始化）；
+        发现失败（未配置、接口不可达等）时间隔 LLM_MODELS_RETRY_SECONDS 秒后再次尝试，期间使用回退的默认模型。
+        同一事件循环中的并发调用等待同一次初始化。
+        """
+        if self._models_initialized or time.monotonic() < self._init_retry_at:
+            return
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._init_tasks.get(loop)
+            if task is None:
+                task = self._init_tasks[loop] = loop.create_task(self._initialize_models())
+        try:
+            await asyncio.shield(task)
+        finally:
+            with self._lock:
+                if self._init_tasks.get(loop) is task and task.done():
+                    del self._init_tasks[loop]
+    
+    async def _get_llm(self, model_name: str) -> Any:
+        """获取模型实例，首次使用时创建；模型不可用时返回 None"""
+        await self.ensure_models()
+        key = (model_name, asyncio.get_running_loop())
+        with self._lock:
+            llm = self.llm_models.get(key)
+            if llm is not None:
+                self.llm_models.move_to_end(key)
+                return llm
+        
+        if model_name not in self.available_models:
+            # 可能是上次发现之后新增的模型（发现结果过期后会重新请求）
+            if model_name not in await self._get_available_models_from_api():
+                return None
+            with self._lock:
+                if model_name not in self.available_models:
+                    self.available_models = self.available_models + [model_name]
         
+        config = await run_io(self._load_llm_config)
         try:
-            base = base_url.rstrip("/")
-            # 兼容用户已经在 Base URL 里写了 /v1 的情况
-            if base.endswith("/v1"):
-                url = base + "/models"
-            else:
-                url = base + "/v1/models"
-            
-            headers = {}
-            if api_key:
-                headers["Authorization"] = f"Bearer {api_key}"
-            
-            with httpx.Client(timeout=10.0) as client:
-                resp = client.get(url, headers=headers)
-                resp.raise_for_status()
-                data = resp.json()
-            
-            raw_models = data.get("data", [])
-            return [m.get("id") for m in raw_models if m.get("id")]
+            llm = self._create_llm(model_name, config)
         except Exception as e:
-            print(f"从API获取模型列表失败: {e}")
-            return []
+            print(f"初始化模型 '{model_name}' 失败: {e}")
+            return None
+        with self._lock:
+            llm = self.llm_models.setdefault(key, llm)
+            self.llm_models.move_to_end(key)
+            while len(self.llm_models) > max(1, settings.LLM_MODEL_INSTANCES):
+                self.llm_models.popitem(last=False)
+        return llm
     
-    def _initialize_models(self):
-        """初始化LLM模型（从配置动态加载）"""
+    def _create_llm(self, model_name: str, config: Dict[str, Any]) -> Any:
+        """创建 ChatOpenAI 实例（须在使用它的事件循环中调用）"""
+        # 输出预留按模型上下文窗口计算
+        max_tokens = token_counter.max_output_tokens(model_name)
+        return ChatOpenAI(
+            model=model_name,
+            api_key=config.get("api_key"),
+            base_url=config.get("base_url"),
+            temperature=0.7,
+            max_tokens=max_tokens,
+            # 重试由 retry_policy 统一处理，关闭 SDK 内置重试避免叠加
+            max_retries=0,
+            # 共享客户端的超时只适合模型发现等短请求，对话请求按 LLM_REQUEST_TIMEOUT 逐请求覆盖
+            timeout=settings.LLM_REQUEST_TIMEOUT,
+            http_async_client=get_http_client()
+        )
+    
+    async def _initialize_models(self) -> bool:
+        """发现可用模型（从配置动态加载），实例在首次使用时创建
+
+        返回是否从接口发现了模型；失败时记录下次自动重试的时间。
+        """
+        discovered = False
+        try:
+            discovered = await self._discover_and_register()
+            return discovered
+        finally:
+            self._models_initialized = discovered
+            if not discovered:
+                self._init_retry_at = time.monotonic() + settings.LLM_MODELS_RETRY_SECONDS
+    
+    async def _discover_and_register(self) -> bool:
         if not LANGCHAIN_AVAILABLE:
             print("LangChain不可用，跳过模型初始化")
-            return
-        
-        # 清空现有模型
-        self.llm_models = {}
+            return False
         
         # 加载配置
-        config = self._load_llm_config()
+        config = await run_io(self._load_llm_config)
         base_url = config.get("base_url")
         api_key = config.get("api_key")
         default_model = config.get("default_model")
+        rate_limiter.configure(config.get("rate_limits"), config.get("max_in_flight"))
         
+        available_models: List[str] = []
+        discovered = False
         if not base_url:
             print("未配置 LLM Base URL，跳过模型初始化")
-            return
-        
-        if not api_key:
+        elif not api_key:
             print("未配置 API Key，跳过模型初始化")
-            return
-        
-        try:
+        else:
             # 尝试从API获取可用模型列表
-            available_models = self._get_available_models_from_api(base_url, api_key)
-            
-            # 确定要初始化的模型列表
-            models_to_init = []
-            if default_model:
-                # 优先初始化默认模型
-                if default_model in available_models:
-                    models_to_init.append(default_model)
-                elif available_models:
-                    # 如果默认模型不在列表中，使用第一个可用模型
-                    print(f"警告: 默认模型 '{default_model}' 不在可用模型列表中，将使用 '{available_models[0]}'")
-                    models_to_init.append(available_models[0])
-                else:
-                    # 如果无法获取模型列表，尝试直接初始化默认模型
-                    models_to_init.append(default_model)
-            elif available_models:
-                # 如果没有默认模型，初始化第一个可用模型
-                models_to_init.append(available_models[0])
-            
-            # 初始化模型
-            for model_name in models_to_init:
-                try:
-                    # 根据模型名称推断合适的 max_tokens
-                    max_tokens = 2000
-                    if "gpt-4" in model_name.lower() or "turbo" in model_name.lower():
-                        max_tokens = 4000
-                    elif "32k" in model_name.lower() or "128k" in model_name.lower():
-                        max_tokens = 8000
-                    
-                    self.llm_models[model_name] = ChatOpenAI(
-                        model=model_name,
-                        api_key=api_key,
-                        base_url=base_url,
-                        temperature=0.7,
-                        max_tokens=max_tokens
-                    )
-                    print(f"成功初始化模型: {model_name}")
-                except Exception as e:
-                    print(f"初始化模型 '{model_name}' 失败: {e}")
-            
-            if self.llm_models:
-                print(f"成功初始化 {len(self.llm_models)} 个LLM模型: {list(self.llm_models.keys())}")
-            else:
-                print("警告: 未能初始化任何LLM模型")
-            
-        except Exception as e:
-            print(f"初始化LLM模型失败: {e}")
+            available_models = await self._get_available_models_from_api()
+            discovered = bool(available_models)
+            if not available_models:
+                # 如果无法获取模型列表，只允许使用默认模型
+                available_models = [default_model] if default_model else []
+            elif default_model and default_model not in available_models:
+                print(f"警告: 默认模型 '{default_model}' 不在可用模型列表中")
+        
+        # 整体替换，配置变化后旧实例不再使用
+        with self._lock:
+            self.available_models = available_models
+            self.llm_models.clear()
+        if available_models:
+            print(f"发现 {len(available_models)} 个可用LLM模型")
+        else:
+            print("警告: 没有可用的LLM模型")
+        return discovered
     
-    def reinitialize_models(self) -> Dict[str, Any]:
-        """重新初始化模型（供外部调用）"""
+    async def reinitialize_models(self) -> Dict[str, Any]:
+        """重新初始化模型（供外部调用，会重新获取模型列表）"""
         try:
-            self._initialize_models()
+            self._discovery_cache = {}
+            await self._initialize_models()
             return {
                 "success": True,
-                "message": f"成功初始化 {len(self.llm_models)} 个模型",
-                "models": list(self.llm_models.keys()),
-                "count": len(self.llm_models)
+                "message": f"发现 {len(self.available_models)} 个可用模型",
+                "models": list(self.available_models),
+                "count": len(self.available_models)
             }
         except Exception as e:
             return {
@@ -172,35 +300,79 @@ class LLMService:
         template_name: str = "default",
         model_name: str = None,
         custom_prompt: str = None,
+        mode: str = None,
+        chunk_tokens: int = None,
+        max_concurrency: int = None,
+        use_cache: bool = True,
+        on_token: Callable[[str], None] = None,
+        previous_summary: str = None,
         **kwargs
     ) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
-        """生成总结"""
+        """生成总结
+
+        mode 指定超长内容的处理方式（默认 LLM_SUMMARY_MODE）：
+        - stuff：整段内容放入一个提示；超出模型输入预算时自动改用 map_reduce
+        - map_reduce：按 chunk_tokens 分块，分块摘要并发生成（最多 max_concurrency 个同时请求），
+          再逐层合并，最后用模板生成总结
+        - refine：按顺序逐块完善总结
+        内容不超过一个分块时总是按 stuff 处理。元数据中包含估算与实际的 token 用量。
+        use_cache=False 时跳过响应缓存，强制重新生成。
+        传入 on_token 时以流式方式生成最终总结，每收到一段文本就回调一次（中间的分块摘要不推送）。
+        传入 previous_summary 时为增量总结：content 只含新增内容，分块只切分 content，
+        上次的总结在生成最终总结（refine 为第一次）时与新增内容一起交给模板。
+        """
         try:
             # 选择模型
             model_name = model_name or settings.DEFAULT_LLM_MODEL
-            llm = self.llm_models.get(model_name)
+            llm = await self._get_llm(model_name)
             
             if not llm:
                 return False, f"模型 '{model_name}' 不可用", None
             
+            mode = mode or settings.LLM_SUMMARY_MODE
+            if mode not in SUMMARY_MODES:
+                return False, f"不支持的总结模式: {mode}", None
+            budget = self._input_budget(llm, model_name)
+            # 最终提示中还要放入上次的总结，分块时预留出来
+            reserved = token_counter.count(previous_summary, model_name) if previous_summary else 0
+            chunk_tokens = min(max(1, chunk_tokens or settings.LLM_CHUNK_TOKENS), max(1, budget - reserved))
+            
             # 准备提示
             if custom_prompt:
                 prompt = custom_prompt
             else:
                 success, prompt = prompt_manager.format_template(
-                    template_name, content=content, **kwargs
+                    template_name, content=self._with_previous(content, previous_summary), **kwargs
                 )
                 if not success:
                     return False, prompt, None
             
-            # 生成总结
-            messages = [
-                SystemMessage(content="你是一个专业的研究助手，擅长分析和总结各种文档内容。"),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = await llm.ainvoke(messages)
-            summary = response.content
+            estimated = token_counter.count_messages([SUMMARY_SYSTEM_PROMPT, prompt], model_name)
+            auto_split = False
+            if estimated > budget:
+                if custom_prompt:
+                    return False, f"提示约 {estimated} tokens，超出模型 '{model_name}' 的输入预算 {budget} tokens", None
+                if mode == "stuff":
+                    mode, auto_split = "map_reduce", True
+            
+            chunks = [content]
+            if mode != "stuff" and not custom_prompt:
+                chunks = token_counter.split(content, chunk_tokens, model_name)
+            
+            stats = self._new_usage_stats()
+            if len(chunks) <= 1:
+                mode = "stuff"
+                summary = await self._invoke(llm, SUMMARY_SYSTEM_PROMPT, prompt, stats, model_name, use_cache, on_token)
+            elif mode == "map_reduce":
+                summary, prompt = await self._map_reduce_summary(
+                    llm, model_name, chunks, template_name, chunk_tokens,
+                    max(1, max_concurrency or settings.LLM_MAP_CONCURRENCY), stats, use_cache, on_token,
+                    previous_summary, **kwargs
+                )
+            else:
+                summary, prompt = await self._refine_summary(
+                    llm, model_name, chunks, template_name, stats, use_cache, on_token, previous_summary, **kwargs
+                )
             
             # 生成元数据
             metadata = {
@@ -209,7 +381,12 @@ class LLMService:
                 "prompt_length": len(prompt),
                 "response_length": len(summary),
                 "generated_at": datetime.now().isoformat(),
-                "custom_prompt": custom_prompt is not None
+                "custom_prompt": custom_prompt is not None,
+                "mode": mode,
+                "auto_split": auto_split,
+                "chunk_count": len(chunks),
+                "input_budget_tokens": budget,
+                **stats
             }
             
             return True, summary, metadata
@@ -217,16 +394,191 @@ class LLMService:
         except Exception as e:
             return False, f"生成总结失败: {str(e)}", None
     
+    def _with_previous(self, content: str, previous_summary: Optional[str]) -> str:
+        """增量总结时把上次的总结与新增内容合成模板的 content"""
+        if not previous_summary:
+            return content
+        return INCREMENTAL_CONTENT_TEMPLATE.format(previous_summary=previous_summary, content=content or "")
+    
+    def _new_usage_stats(self) -> Dict[str, Any]:
+        return {
+            "llm_calls": 0, "cache_hits": 0, "retries": 0, "hedged": 0, "reduce_levels": 0, "queue_wait_seconds": 0.0,
+            "estimated_prompt_tokens": 0, "usage": None
+        }
+    
+    def _input_budget(self, llm: Any, model_name: str) -> int:
+        """单次请求输入可用的 token 数（扣除模型配置的输出上限）"""
+        return token_counter.input_budget(model_name, getattr(llm, "max_tokens", None))
+    
+    async def _invoke(
+        self,
+        llm: Any,
+        system_prompt: str,
+        prompt: str,
+        stats: Dict[str, Any] = None,
+        model_name: str = None,
+        use_cache: bool = True,
+        on_token: Callable[[str], None] = None
+    ) -> str:
+        """发送一次对话请求并返回文本
+
+        use_cache 为 True 时先查询响应缓存，命中则不请求模型。
+        传入 on_token 时使用 astream 流式请求，逐段回调生成的文本（缓存命中时整段回调一次）。
+        实际请求前经过限流器（按模型的 rpm/tpm 令牌桶与全局并发上限），排队时间累计在 stats["queue_wait_seconds"]。
+        临时错误按重试策略重试，非流式请求在延迟过长时发出对冲请求（stats 中累计 retries、hedged）；
+        流式请求已推送部分输出后不再重试。
+        stats 中累计请求次数、缓存命中次数、估算与实际 token 用量（缓存命中不计入实际用量）。
+        """
+        cache_key = None
+        if use_cache and response_cache.enabled:
+            cache_key = response_cache.make_key(
+                model_name, getattr(llm, "temperature", None), getattr(llm, "max_tokens", None), system_prompt, prompt
+            )
+            cached = await run_io(response_cache.get, cache_key)
+            if cached is not None:
+                if stats is not None:
+                    stats["cache_hits"] += 1
+                if on_token is not None:
+                    on_token(cached["content"])
+                return cached["content"]
+        
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=prompt)
+        ]
+        estimated = token_counter.count_messages([system_prompt, prompt], model_name)
+        emitted = False
+        
+        async def attempt(mark_sent: Callable[[], None]) -> Tuple[Any, Any]:
+            nonlocal emitted
+            # tpm 按输入估算加输出上限预留，完成后按实际用量退还
+            async with rate_limiter.acquire(model_name, estimated + (getattr(llm, "max_tokens", None) or 0)) as permit:
+                mark_sent()
+                if on_token is None:
+                    return await llm.ainvoke(messages), permit
+                # 流式分片相加得到完整消息（含接口返回的用量）
+                response = None
+                async for chunk in llm.astream(messages):
+                    response = chunk if response is None else response + chunk
+                    if chunk.content and isinstance(chunk.content, str):
+                        emitted = True
+                        on_token(chunk.content)
+                if response is None:
+                    raise RuntimeError("模型未返回任何内容")
+                return response, permit
+        
+        response, permit = await retry_policy.run(
+            model_name, attempt, hedge=on_token is None, can_retry=lambda: not emitted, stats=stats
+        )
+        usage = token_counter.usage_from_response(response)
+        rate_limiter.settle(permit, usage["total_tokens"] if usage else None)
+        if stats is not None:
+            stats["llm_calls"] += 1
+            stats["queue_wait_seconds"] = round(stats.get("queue_wait_seconds", 0.0) + permit.waited, 3)
+            stats["estimated_prompt_tokens"] += estimated
+            if usage:
+                total = stats["usage"] or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                stats["usage"] = {k: total[k] + usage.get(k, 0) for k in total}
+        if cache_key is not None and isinstance(response.content, str):
+            await run_io(response_cache.put, cache_key, model_name, response.content, usage)
+        return response.content
+    
+    async def _condense(
+        self,
+        llm: Any,
+        model_name: str,
+        chunks: List[str],
+        chunk_tokens: int,
+        max_concurrency: int,
+        stats: Dict[str, Any],
+        use_cache: bool = True
+    ) -> List[str]:
+        """分块并发摘要，并逐层合并直到摘要合计不超过一个分块，返回各部分摘要"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def run(prompt: str) -> str:
+            async with semaphore:
+                return await self._invoke(llm, SUMMARY_SYSTEM_PROMPT, prompt, stats, model_name, use_cache)
+        
+        # map：各分块独立摘要
+        partials = await asyncio.gather(*(
+            run(MAP_PROMPT.format(index=i + 1, total=len(chunks), content=chunk))
+            for i, chunk in enumerate(chunks)
+        ))
+        
+        # reduce：摘要合计超出一个分块时，按预算分组合并，直到能放进一个提示
+        while len(partials) > 1 and token_counter.count("\n\n".join(partials), model_name) > chunk_tokens:
+            groups = token_counter.group(partials, chunk_tokens, model_name)
+            if len(groups) == len(partials):
+                # 单个摘要已超出预算，无法继续合并
+                break
+            stats["reduce_levels"] += 1
+            partials = await asyncio.gather(*(
+                run(REDUCE_PROMPT.format(content="\n\n".join(group))) for group in groups
+            ))
+        return list(partials)
+    
+    async def _map_reduce_summary(
+        self,
+        llm: Any,
+        model_name: str,
+        chunks: List[str],
+        template_name: str,
+        chunk_tokens: int,
+        max_concurrency: int,
+        stats: Dict[str, Any],
+        use_cache: bool = True,
+        on_token: Callable[[str], None] = None,
+        previous_summary: str = None,
+        **kwargs
+    ) -> Tuple[str, str]:
+        """分块并发摘要后逐层合并，返回 (总结, 最终提示)"""
+        partials = await self._condense(llm, model_name, chunks, chunk_tokens, max_concurrency, stats, use_cache)
+        success, prompt = prompt_manager.format_template(
+            template_name, content=self._with_previous("\n\n".join(partials), previous_summary), **kwargs
+        )
+        if not success:
+            raise ValueError(prompt)
+        return await self._invoke(llm, SUMMARY_SYSTEM_PROMPT, prompt, stats, model_name, use_cache, on_token), prompt
+    
+    async def _refine_summary(
+        self,
+        llm: Any,
+        model_name: str,
+        chunks: List[str],
+        template_name: str,
+        stats: Dict[str, Any],
+        use_cache: bool = True,
+        on_token: Callable[[str], None] = None,
+        previous_summary: str = None,
+        **kwargs
+    ) -> Tuple[str, str]:
+        """按顺序逐块完善总结，返回 (总结, 最后一次提示)；只有最后一次完善会流式回调"""
+        success, prompt = prompt_manager.format_template(
+            template_name, content=self._with_previous(chunks[0], previous_summary), **kwargs
+        )
+        if not success:
+            raise ValueError(prompt)
+        summary = await self._invoke(llm, SUMMARY_SYSTEM_PROMPT, prompt, stats, model_name, use_cache)
+        for i, chunk in enumerate(chunks[1:], start=2):
+            prompt = REFINE_PROMPT.format(index=i, total=len(chunks), summary=summary, content=chunk)
+            summary = await self._invoke(
+                llm, SUMMARY_SYSTEM_PROMPT, prompt, stats, model_name, use_cache,
+                on_token if i == len(chunks) else None
+            )
+        return summary, prompt
+    
     async def analyze_content(
         self, 
         content: str, 
         analysis_type: str = "general",
-        model_name: str = None
+        model_name: str = None,
+        use_cache: bool = True
     ) -> Tuple[bool, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
         """分析内容"""
         try:
             model_name = model_name or settings.DEFAULT_LLM_MODEL
-            llm = self.llm_models.get(model_name)
+            llm = await self._get_llm(model_name)
             
             if not llm:
                 return False, None, {"error": f"模型 '{model_name}' 不可用"}
@@ -241,14 +593,21 @@ class LLMService:
             }
             
             prompt = prompts.get(analysis_type, prompts["general"])
+            system_prompt = "你是一个专业的内容分析师。"
+            
+            # 超出输入预算时先分块摘要压缩，再对摘要进行分析
+            stats = self._new_usage_stats()
+            budget = self._input_budget(llm, model_name)
+            analyzed = content
+            if token_counter.count_messages([system_prompt, f"{prompt}\n\n{content}"], model_name) > budget:
+                chunk_tokens = min(settings.LLM_CHUNK_TOKENS, budget)
+                partials = await self._condense(
+                    llm, model_name, token_counter.split(content, chunk_tokens, model_name),
+                    chunk_tokens, settings.LLM_MAP_CONCURRENCY, stats, use_cache
+                )
+                analyzed = "\n\n".join(partials)
             
-            messages = [
-                SystemMessage(content="你是一个专业的内容分析师。"),
-                HumanMessage(content=f"{prompt}\n\n{content}")
-            ]
-            
-            response = await llm.ainvoke(messages)
-            analysis_result = response.content
+            analysis_result = await self._invoke(llm, system_prompt, f"{prompt}\n\n{analyzed}", stats, model_name, use_cache)
             
             # 解析分析结果
             parsed_result = self._parse_analysis_result(analysis_result, analysis_type)
@@ -258,7 +617,9 @@ class LLMService:
                 "model_used": model_name,
                 "content_length": len(content),
                 "analysis_length": len(analysis_result),
-                "generated_at": datetime.now().isoformat()
+                "generated_at": datetime.now().isoformat(),
+                "condensed": analyzed is not content,
+                **stats
             }
             
             return True, parsed_result, metadata
@@ -271,12 +632,13 @@ class LLMService:
         content: str, 
         question_count: int = 5,
         question_type: str = "comprehensive",
-        model_name: str = None
+        model_name: str = None,
+        use_cache: bool = True
     ) -> Tuple[bool, Optional[List[str]], Optional[Dict[str, Any]]]:
         """生成问题"""
         try:
             model_name = model_name or settings.DEFAULT_LLM_MODEL
-            llm = self.llm_models.get(model_name)
+            llm = await self._get_llm(model_name)
             
             if not llm:
                 return False, None, {"error": f"模型 '{model_name}' 不可用"}
@@ -304,13 +666,10 @@ class LLMService:
 
 问题："""
             
-            messages = [
-                SystemMessage(content="你是一个专业的问题生成专家。"),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = await llm.ainvoke(messages)
-            questions_text = response.content
+            stats = self._new_usage_stats()
+            questions_text = await self._invoke(
+                llm, "你是一个专业的问题生成专家。", prompt, stats, model_name, use_cache
+            )
             
             # 解析问题
             questions = self._parse_questions(questions_text)
@@ -320,7 +679,8 @@ class LLMService:
                 "question_type": question_type,
                 "model_used": model_name,
                 "content_length": len(content),
-                "generated_at": datetime.now().isoformat()
+                "generated_at": datetime.now().isoformat(),
+                **stats
             }
             
             return True, questions, metadata
@@ -332,36 +692,45 @@ class LLMService:
         self, 
         content: str, 
         target_language: str = "中文",
-        model_name: str = None
+        model_name: str = None,
+        use_cache: bool = True
     ) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
         """翻译内容"""
         try:
             model_name = model_name or settings.DEFAULT_LLM_MODEL
-            llm = self.llm_models.get(model_name)
+            llm = await self._get_llm(model_name)
             
             if not llm:
                 return False, None, {"error": f"模型 '{model_name}' 不可用"}
             
-            prompt = f"""请将以下内容翻译成{target_language}，保持原文的格式和结构：
+            system_prompt = "你是一个专业的翻译专家，能够准确翻译各种语言的内容。"
+            
+            # 译文长度与原文相当：分块同时受输入预算和输出上限约束，各块并发翻译后按顺序拼接
+            output_limit = getattr(llm, "max_tokens", None) or token_counter.max_output_tokens(model_name)
+            chunk_tokens = max(1, min(self._input_budget(llm, model_name), output_limit * 4 // 5))
+            chunks = token_counter.split(content, chunk_tokens, model_name)
+            stats = self._new_usage_stats()
+            semaphore = asyncio.Semaphore(settings.LLM_MAP_CONCURRENCY)
+            
+            async def translate(chunk: str) -> str:
+                prompt = f"""请将以下内容翻译成{target_language}，保持原文的格式和结构：
 
-{content}
+{chunk}
 
 翻译："""
+                async with semaphore:
+                    return await self._invoke(llm, system_prompt, prompt, stats, model_name, use_cache)
             
-            messages = [
-                SystemMessage(content="你是一个专业的翻译专家，能够准确翻译各种语言的内容。"),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = await llm.ainvoke(messages)
-            translation = response.content
+            translation = "\n".join(await asyncio.gather(*(translate(chunk) for chunk in chunks)))
             
             metadata = {
                 "target_language": target_language,
                 "model_used": model_name,
                 "original_length": len(content),
                 "translation_length": len(translation),
-                "generated_at": datetime.now().isoformat()
+                "generated_at": datetime.now().isoformat(),
+                "chunk_count": len(chunks),
+                **stats
             }
             
             return True, translation, metadata
@@ -418,35 +787,45 @@ class LLMService:
     
     def get_available_models(self) -> List[str]:
         """获取可用模型列表"""
-        return list(self.llm_models.keys())
+        return list(self.available_models)
     
     def is_model_available(self, model_name: str) -> bool:
         """检查模型是否可用"""
-        return model_name in self.llm_models
+        return model_name in self.available_models
     
     def get_model_info(self, model_name: str) -> Optional[Dict[str, Any]]:
         """获取模型信息"""
-        if model_name not in self.llm_models:
+        if model_name not in self.available_models:
             return None
         
-        model = self.llm_models[model_name]
+        with self._lock:
+            model = next((llm for (name, _), llm in self.llm_models.items() if name == model_name), None)
         
         return {
             "name": model_name,
             "type": "openai",
-            "max_tokens": getattr(model, 'max_tokens', 2000),
+            "max_tokens": getattr(model, 'max_tokens', None) or token_counter.max_output_tokens(model_name),
             "temperature": getattr(model, 'temperature', 0.7),
-            "available": True
+            "available": True,
+            "instantiated": model is not None
         }
     
     def get_service_status(self) -> Dict[str, Any]:
         """获取服务状态"""
+        with self._lock:
+            instantiated = sorted({name for name, _ in self.llm_models})
         return {
             "langchain_available": LANGCHAIN_AVAILABLE,
             "openai_configured": bool(settings.OPENAI_API_KEY),
-            "available_models": len(self.llm_models),
-            "models": list(self.llm_models.keys()),
-            "default_model": settings.DEFAULT_LLM_MODEL
+            "models_initialized": self._models_initialized,
+            "available_models": len(self.available_models),
+            "models": list(self.available_models),
+            "instantiated_models": instantiated,
+            "default_model": settings.DEFAULT_LLM_MODEL,
+            "response_cache": response_cache.get_stats(),
+            "rate_limiter": rate_limiter.get_stats(),
+            "retry_policy": retry_policy.get_stats(),
+            "http_clients": get_http_client_stats()
         }
 
 
@@ -0,0 +1,210 @@
+"""LLM 请求限流
+
+并发的工作流会同时向同一个模型发请求，突发流量容易触发服务商的 429。这里在客户端限流：
+- 每个模型两个令牌桶：每分钟请求数（rpm）和每分钟 token 数（tpm），按预估 token 预留，
+  请求完成后按实际用量退还多预留的部分
+- 所有模型共享一个最大并发数（max_in_flight）
+
+限流配置写在 llm_config.json 中，未配置时使用 LLM_RATE_LIMIT_* 设置：
+    {
+      "max_in_flight": 8,
+      "rate_limits": {
+        "default": {"rpm": 60, "tpm": 90000},
+        "gpt-4o": {"rpm": 500, "tpm": 30000}
+      }
+    }
+未列出的模型使用 default 中的限额（每个模型各自计数），值为空表示不限制。
+调用方所在的事件循环可能不同（API、工作流执行器），所以状态用线程锁保护，等待在调用方的事件循环中进行。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+from server.config import settings
+
+
+class _TokenBucket:
+    """令牌桶：容量为每分钟限额，按秒匀速补充；允许透支，透支部分换算为等待时间"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def charge(self, cost: float) -> float:
+        """实际扣除的令牌数：单次请求超过容量时按容量计，避免永远等不到"""
+        return min(cost, self.capacity)
+
+    def reserve(self, cost: float) -> float:
+        """预留 cost 个令牌（按 charge 扣除），返回需要等待的秒数（调用方持有锁）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= self.charge(cost)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _InFlightGate:
+    """可跨事件循环使用的信号量，按先来先得放行"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+            # 名额已转交（_grant 已设置结果）但等待者在恢复前被取消：归还名额。
+            # 尚未执行 _grant 时 future 随任务一起被取消，由 _grant 转交给下一个等待者
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+            # 名额直接转交给下一个等待者，active 不变
+            loop, future = self._waiters.popleft()
+        try:
+            loop.call_soon_threadsafe(self._grant, future)
+        except RuntimeError:
+            # 等待者的事件循环已关闭
+            self.release()
+
+    def _grant(self, future: asyncio.Future):
+        if future.done():
+            self.release()
+        else:
+            future.set_result(None)
+
+
+class RateLimitPermit:
+    """一次请求的限流许可；reserved_tokens 为从 tpm 令牌桶中实际扣除的 token 数（未限制 tpm 时为预估值）"""
+
+    def __init__(self, model_name: str, reserved_tokens: float):
+        self.model_name = model_name
+        self.reserved_tokens = reserved_tokens
+        self.waited = 0.0
+
+
+class RateLimiter:
+    """按模型的令牌桶 + 全局并发上限"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limits: Dict[str, Dict[str, Any]] = {}
+        self._buckets: Dict[str, Tuple[Optional[_TokenBucket], Optional[_TokenBucket]]] = {}
+        self._gate = _InFlightGate(settings.LLM_MAX_IN_FLIGHT)
+        self._stats = {"requests": 0, "throttled": 0, "wait_seconds": 0.0}
+
+    def configure(self, rate_limits: Optional[Dict[str, Any]] = None, max_in_flight: Optional[int] = None):
+        """应用 llm_config.json 中的限流配置（限额不变时保留令牌桶状态，已在执行的请求不受影响）"""
+        with self._lock:
+            if (rate_limits or {}) != self._limits:
+                self._limits = dict(rate_limits or {})
+                self._buckets = {}
+            limit = max_in_flight or settings.LLM_MAX_IN_FLIGHT
+            if limit != self._gate.limit:
+                self._gate = _InFlightGate(limit)
+
+    @asynccontextmanager
+    async def acquire(self, model_name: str, estimated_tokens: int) -> AsyncIterator[RateLimitPermit]:
+        """等待限额和并发名额，退出时释放名额；permit.waited 为排队等待的秒数"""
+        started = time.monotonic()
+        with self._lock:
+            rpm_bucket, tpm_bucket = self._get_buckets(model_name)
+            delay = max(
+                rpm_bucket.reserve(1) if rpm_bucket else 0.0,
+                tpm_bucket.reserve(estimated_tokens) if tpm_bucket else 0.0,
+            )
+            permit = RateLimitPermit(model_name, tpm_bucket.charge(estimated_tokens) if tpm_bucket else estimated_tokens)
+            gate = self._gate
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await gate.acquire()
+        except asyncio.CancelledError:
+            self._refund(model_name, 1, permit.reserved_tokens)
+            raise
+
+        permit.waited = time.monotonic() - started
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["wait_seconds"] += permit.waited
+            if permit.waited >= 0.01:
+                self._stats["throttled"] += 1
+        try:
+            yield permit
+        finally:
+            gate.release()
+
+    def settle(self, permit: RateLimitPermit, actual_tokens: Optional[int]):
+        """请求完成后按实际用量退还多预留的 token（最多退还实际扣除的部分）"""
+        if actual_tokens is not None and actual_tokens < permit.reserved_tokens:
+            self._refund(permit.model_name, 0, permit.reserved_tokens - actual_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_in_flight": self._gate.limit,
+                "in_flight": self._gate.active,
+                "waiting": self._gate.waiting,
+                "limits": {name: self._resolve_limits(name) for name in self._buckets},
+                **self._stats,
+            }
+
+    def _refund(self, model_name: str, requests: int, tokens: int):
+        with self._lock:
+            rpm_bucket, tpm_bucket = self._buckets.get(model_name, (None, None))
+            if rpm_bucket and requests:
+                rpm_bucket.refund(requests)
+            if tpm_bucket and tokens:
+                tpm_bucket.refund(tokens)
+
+    def _resolve_limits(self, model_name: str) -> Dict[str, Optional[int]]:
+        default = self._limits.get("default") or {}
+        limits = self._limits.get(model_name) or {}
+        return {
+            "rpm": limits.get("rpm", default.get("rpm", settings.LLM_RATE_LIMIT_RPM)),
+            "tpm": limits.get("tpm", default.get("tpm", settings.LLM_RATE_LIMIT_TPM)),
+        }
+
+    def _get_buckets(self, model_name: str) -> Tuple[Optional[_TokenBucket], Optional[_TokenBucket]]:
+        buckets = self._buckets.get(model_name)
+        if buckets is None:
+            limits = self._resolve_limits(model_name)
+            buckets = (
+                _TokenBucket(limits["rpm"]) if limits["rpm"] else None,
+                _TokenBucket(limits["tpm"]) if limits["tpm"] else None,
+            )
+            self._buckets[model_name] = buckets
+        return buckets
+
+
+# 全局 LLM 限流器
+rate_limiter = RateLimiter()
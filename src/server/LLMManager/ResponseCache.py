@@ -0,0 +1,186 @@
+"""LLM 响应缓存
+
+对未变化的文件重复执行工作流时，会发出完全相同的 LLM 请求。这里按
+(模型名, temperature, max_tokens, 系统消息, 完整提示) 的哈希把响应缓存在独立的 SQLite 文件中，
+条目超过 LLM_CACHE_TTL_SECONDS 后失效，总大小超过 LLM_CACHE_MAX_BYTES 时按最近使用时间淘汰。
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+from server.config import settings
+
+
+# 键结构变化时递增，使旧缓存失效
+CACHE_KEY_VERSION = 1
+
+
+class ResponseCache:
+    """SQLite 响应缓存"""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        self._initialized_path: Optional[Path] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @property
+    def db_path(self) -> Path:
+        return self._db_path or settings.LLM_CACHE_PATH or settings.USRDATA_DIR / ".llm_cache.sqlite3"
+
+    @property
+    def enabled(self) -> bool:
+        return settings.LLM_CACHE_ENABLED and settings.LLM_CACHE_MAX_BYTES > 0
+
+    def make_key(self, model_name: str, temperature: Any, max_tokens: Any, system_prompt: str, prompt: str) -> str:
+        """缓存键：模型与参数、系统消息和完整提示的 SHA-256"""
+        raw = json.dumps(
+            {
+                "v": CACHE_KEY_VERSION,
+                "model": model_name,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "system": system_prompt,
+                "prompt": prompt,
+            },
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存的响应 {"content", "usage"}，未命中或已过期返回 None"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT content, usage, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[2] <= settings.LLM_CACHE_TTL_SECONDS:
+                    conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                else:
+                    if row:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    row = None
+        except sqlite3.Error as e:
+            print(f"读取LLM响应缓存失败: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {"content": row[0], "usage": json.loads(row[1]) if row[1] else None}
+
+    def put(self, key: str, model_name: str, content: str, usage: Optional[Dict[str, Any]] = None):
+        """写入响应"""
+        usage_json = json.dumps(usage) if usage else None
+        size = len(content.encode("utf-8")) + len(key) + len(usage_json or "")
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, content, usage, size, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, model_name, content, usage_json, size, now, now)
+                )
+                evicted = self._evict_if_needed(conn, now)
+        except sqlite3.Error as e:
+            print(f"写入LLM响应缓存失败: {e}")
+            return
+        with self._lock:
+            self.writes += 1
+            self.evictions += evicted
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        try:
+            with self._connect() as conn:
+                return conn.execute("DELETE FROM llm_cache").rowcount
+        except sqlite3.Error as e:
+            print(f"清空LLM响应缓存失败: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        entries, total_bytes = 0, 0
+        if self.enabled or self.db_path.exists():
+            try:
+                with self._connect() as conn:
+                    entries, total_bytes = conn.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+                    ).fetchone()
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "path": str(self.db_path),
+                "entries": entries,
+                "total_bytes": total_bytes,
+                "max_bytes": settings.LLM_CACHE_MAX_BYTES,
+                "ttl_seconds": settings.LLM_CACHE_TTL_SECONDS,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """打开连接（每次操作使用独立连接，可在任意线程调用），正常退出时提交"""
+        db_path = self.db_path
+        if self._initialized_path != db_path:
+            with self._lock:
+                if self._initialized_path != db_path:
+                    db_path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(db_path), timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+                    try:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute(
+                            "CREATE TABLE IF NOT EXISTS llm_cache ("
+                            "key TEXT PRIMARY KEY, model TEXT, content TEXT NOT NULL, usage TEXT, "
+                            "size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                        )
+                        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+                        conn.commit()
+                    finally:
+                        conn.close()
+                    self._initialized_path = db_path
+        conn = sqlite3.connect(str(db_path), timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict_if_needed(self, conn: sqlite3.Connection, now: float) -> int:
+        evicted = conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - settings.LLM_CACHE_TTL_SECONDS,)
+        ).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= settings.LLM_CACHE_MAX_BYTES:
+            return evicted
+
+        # 淘汰到上限的 90%，避免每次写入都触发
+        target = int(settings.LLM_CACHE_MAX_BYTES * 0.9)
+        for key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        return evicted
+
+
+# 全局 LLM 响应缓存
+response_cache = ResponseCache()
@@ -0,0 +1,211 @@
+"""LLM 请求重试与对冲
+
+- 重试：只重试临时性错误（429、408、409、5xx、超时、连接错误），退避时间为带完全抖动的指数退避
+  （0 ~ min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2^(n-1)) 之间随机），
+  服务端返回 Retry-After 时至少等待该时长；所有尝试共享 LLM_RETRY_DEADLINE_SECONDS 的总时限
+- 对冲（LLM_HEDGE_ENABLED）：请求发出后超过该模型近期延迟的 LLM_HEDGE_PERCENTILE 分位数仍未返回时，
+  再发一个相同的请求，取先成功的结果并取消另一个。样本不足 LLM_HEDGE_MIN_SAMPLES 时不对冲
+
+请求函数接收一个 mark_sent 回调，在真正发出请求（通过限流排队）时调用，对冲计时和延迟统计
+从此刻开始，避免因限流排队而触发无意义的对冲。
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from server.config import settings
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    import openai
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 每个模型保留的延迟样本数
+LATENCY_WINDOW = 200
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断错误是否为可重试的临时错误"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if OPENAI_AVAILABLE and isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if HTTPX_AVAILABLE and isinstance(exc, httpx.TransportError):
+        return True
+    return False
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """重试与对冲策略"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._stats = {"retries": 0, "gave_up": 0, "hedged": 0, "hedge_wins": 0}
+
+    async def run(
+        self,
+        model_name: str,
+        call: Callable[[Callable[[], None]], Awaitable[Any]],
+        hedge: bool = True,
+        can_retry: Callable[[], bool] = None,
+        stats: Dict[str, Any] = None
+    ) -> Any:
+        """执行请求，失败时按策略重试
+
+        hedge=False 时不发对冲请求（如流式请求）；can_retry 返回 False 时不再重试（如已推送部分输出）。
+        stats 中累计 retries 与 hedged 次数。
+        """
+        deadline = time.monotonic() + settings.LLM_RETRY_DEADLINE_SECONDS
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                try:
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    return await asyncio.wait_for(self._attempt(model_name, call, hedge, stats), remaining)
+                except asyncio.TimeoutError as e:
+                    if time.monotonic() >= deadline:
+                        raise asyncio.TimeoutError(f"LLM 请求超过总时限 {settings.LLM_RETRY_DEADLINE_SECONDS} 秒") from e
+                    raise
+            except Exception as e:
+                delay = self._backoff(attempt, e)
+                if (
+                    not is_retryable(e)
+                    or attempt >= settings.LLM_RETRY_MAX_ATTEMPTS
+                    or (can_retry is not None and not can_retry())
+                    or time.monotonic() + delay >= deadline
+                ):
+                    if is_retryable(e):
+                        with self._lock:
+                            self._stats["gave_up"] += 1
+                    raise
+                print(f"LLM 请求失败（第 {attempt} 次，{delay:.1f} 秒后重试）: {e}")
+                with self._lock:
+                    self._stats["retries"] += 1
+                if stats is not None:
+                    stats["retries"] = stats.get("retries", 0) + 1
+                await asyncio.sleep(delay)
+
+    def hedge_threshold(self, model_name: str) -> Optional[float]:
+        """对冲阈值：该模型近期延迟的分位数，样本不足或未开启时为 None"""
+        if not settings.LLM_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(model_name, ()))
+        if len(samples) < max(1, settings.LLM_HEDGE_MIN_SAMPLES):
+            return None
+        index = min(len(samples) - 1, int(len(samples) * settings.LLM_HEDGE_PERCENTILE / 100))
+        return max(settings.LLM_HEDGE_MIN_DELAY_SECONDS, samples[index])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = list(self._latencies)
+            stats = dict(self._stats)
+        return {
+            "max_attempts": settings.LLM_RETRY_MAX_ATTEMPTS,
+            "deadline_seconds": settings.LLM_RETRY_DEADLINE_SECONDS,
+            "hedge_enabled": settings.LLM_HEDGE_ENABLED,
+            "hedge_thresholds": {m: self.hedge_threshold(m) for m in models},
+            **stats,
+        }
+
+    async def _attempt(
+        self, model_name: str, call: Callable[[Callable[[], None]], Awaitable[Any]], hedge: bool, stats: Optional[Dict[str, Any]]
+    ) -> Any:
+        threshold = self.hedge_threshold(model_name) if hedge else None
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._timed(model_name, call, sent))
+        if threshold is None:
+            return await primary
+
+        # 等待请求真正发出后再开始对冲计时
+        waiter = asyncio.ensure_future(sent.wait())
+        try:
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=threshold)
+            if primary.done():
+                return primary.result()
+        except BaseException:
+            waiter.cancel()
+            primary.cancel()
+            raise
+
+        with self._lock:
+            self._stats["hedged"] += 1
+        if stats is not None:
+            stats["hedged"] = stats.get("hedged", 0) + 1
+        backup = asyncio.ensure_future(self._timed(model_name, call, asyncio.Event()))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            # 取先成功的结果；一个失败时继续等待另一个
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            with self._lock:
+                                self._stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _timed(self, model_name: str, call: Callable[[Callable[[], None]], Awaitable[Any]], sent: asyncio.Event) -> Any:
+        """执行一次请求，成功时记录从发出到返回的延迟"""
+        sent_at = time.monotonic()
+
+        def mark_sent():
+            nonlocal sent_at
+            sent_at = time.monotonic()
+            sent.set()
+
+        result = await call(mark_sent)
+        latency = time.monotonic() - sent_at
+        with self._lock:
+            self._latencies.setdefault(model_name, deque(maxlen=LATENCY_WINDOW)).append(latency)
+        return result
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        delay = random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * (2 ** (attempt - 1))))
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, settings.LLM_RETRY_MAX_SECONDS))
+        return delay
+
+
+# 全局 LLM 重试策略
+retry_policy = RetryPolicy()
@@ -0,0 +1,177 @@
+"""Token 估算与分块
+
+优先使用 tiktoken（langchain-openai 的依赖）按模型编码计数；tiktoken 不可用或编码加载失败
+（如离线环境无法下载词表）时回退到启发式估算：中日韩字符约 1 个/token，其余约 4 个字符/token。
+同时提供模型上下文窗口查询，供调用前检查输入是否超出预算。
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional
+from server.config import settings
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+# 在句末标点或换行之后切分（保留标点）
+SENTENCE_BOUNDARY = re.compile(r"(?<=[\n。！？!?；;])|(?<=\. )")
+
+# 模型名包含的关键字 -> 上下文窗口（按顺序匹配，更具体的放前面）
+MODEL_CONTEXT_WINDOWS = [
+    ("gpt-4o", 128000),
+    ("gpt-4.1", 1000000),
+    ("gpt-4-turbo", 128000),
+    ("gpt-4-32k", 32768),
+    ("gpt-4", 8192),
+    ("gpt-3.5-turbo", 16385),
+    ("o1", 128000),
+    ("o3", 200000),
+    ("claude", 200000),
+    ("deepseek", 64000),
+    ("qwen", 32768),
+    ("glm-4", 128000),
+    ("moonshot-v1-128k", 128000),
+    ("moonshot-v1-32k", 32768),
+    ("moonshot-v1-8k", 8192),
+    ("128k", 128000),
+    ("32k", 32768),
+    ("16k", 16384),
+    ("8k", 8192),
+]
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class TokenCounter:
+    """Token 计数器"""
+
+    def __init__(self):
+        self._encodings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def count(self, text: str, model_name: Optional[str] = None) -> int:
+        """计算文本的 token 数"""
+        if not text:
+            return 0
+        encoding = self._get_encoding(model_name)
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        return self.estimate(text)
+
+    def estimate(self, text: str) -> int:
+        """启发式估算 token 数"""
+        cjk = len(CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count_messages(self, messages: List[str], model_name: Optional[str] = None) -> int:
+        """计算一组消息内容的 token 数（含每条消息的格式开销）"""
+        return sum(self.count(m, model_name) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+    def split(self, text: str, max_tokens: int, model_name: Optional[str] = None) -> List[str]:
+        """按句子/段落边界将文本切分为不超过 max_tokens 的分块"""
+        if self.count(text, model_name) <= max_tokens:
+            return [text]
+
+        chunks: List[str] = []
+        current = ""
+        current_tokens = 0
+        for piece in SENTENCE_BOUNDARY.split(text):
+            if not piece:
+                continue
+            tokens = self.count(piece, model_name)
+            if tokens > max_tokens:
+                # 单句超长：按 token 密度换算成字符数硬切
+                if current:
+                    chunks.append(current)
+                    current, current_tokens = "", 0
+                step = max(1, len(piece) * max_tokens // tokens)
+                chunks.extend(piece[i:i + step] for i in range(0, len(piece), step))
+                continue
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(current)
+                current, current_tokens = "", 0
+            current += piece
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return [c for c in chunks if c.strip()]
+
+    def group(self, texts: List[str], max_tokens: int, model_name: Optional[str] = None) -> List[List[str]]:
+        """将多段文本按 token 预算分组（每组至少一段）"""
+        groups: List[List[str]] = []
+        used = 0
+        for text in texts:
+            tokens = self.count(text, model_name)
+            if groups and used + tokens <= max_tokens:
+                groups[-1].append(text)
+                used += tokens
+            else:
+                groups.append([text])
+                used = tokens
+        return groups
+
+    def context_window(self, model_name: Optional[str] = None) -> int:
+        """模型的上下文窗口大小（LLM_CONTEXT_TOKENS 优先，其次按模型名匹配）"""
+        if settings.LLM_CONTEXT_TOKENS:
+            return settings.LLM_CONTEXT_TOKENS
+        lower = (model_name or "").lower()
+        for keyword, window in MODEL_CONTEXT_WINDOWS:
+            if keyword in lower:
+                return window
+        return settings.LLM_DEFAULT_CONTEXT_TOKENS
+
+    def max_output_tokens(self, model_name: Optional[str] = None) -> int:
+        """为模型预留的输出 token 数（上下文窗口的 1/4，限制在 1000~8000）"""
+        return max(1000, min(8000, self.context_window(model_name) // 4))
+
+    def input_budget(self, model_name: Optional[str] = None, max_output_tokens: Optional[int] = None) -> int:
+        """单次请求输入可用的 token 数：上下文窗口扣除输出预留"""
+        reserved = max_output_tokens or self.max_output_tokens(model_name)
+        return max(1, self.context_window(model_name) - reserved)
+
+    def usage_from_response(self, response: Any) -> Optional[Dict[str, int]]:
+        """从 LangChain 的响应消息中读取实际 token 用量，接口未返回时为 None"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage:
+            return {
+                "prompt_tokens": usage.get("input_tokens", 0),
+                "completion_tokens": usage.get("output_tokens", 0),
+                "total_tokens": usage.get("total_tokens", 0),
+            }
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+        if token_usage:
+            return {
+                "prompt_tokens": token_usage.get("prompt_tokens", 0),
+                "completion_tokens": token_usage.get("completion_tokens", 0),
+                "total_tokens": token_usage.get("total_tokens", 0),
+            }
+        return None
+
+    def _get_encoding(self, model_name: Optional[str]) -> Any:
+        if not TIKTOKEN_AVAILABLE or not settings.LLM_USE_TIKTOKEN:
+            return None
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model_name) if model_name else "cl100k_base"
+        except KeyError:
+            # 非 OpenAI 模型没有对应编码，使用 cl100k_base 近似
+            encoding_name = "cl100k_base"
+        if encoding_name in self._encodings:
+            return self._encodings[encoding_name]
+        with self._lock:
+            if encoding_name not in self._encodings:
+                try:
+                    # 首次使用时可能需要下载词表
+                    self._encodings[encoding_name] = tiktoken.get_encoding(encoding_name)
+                except Exception as e:
+                    print(f"加载 tiktoken 编码 {encoding_name} 失败，使用启发式估算 token: {e}")
+                    self._encodings[encoding_name] = None
+            return self._encodings[encoding_name]
+
+
+# 全局 token 计数器
+token_counter = TokenCounter()
@@ -4,9 +4,14 @@ import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from server.config import settings, get_project_path, get_project_settings_path
-from server.database import get_project_by_name, create_project, Project
+from server.database import (
+    get_project_by_name, create_project, Project,
+    get_project_by_name_async, create_project_async, list_active_projects_async
+)
+from server.DataManager.AsyncDataManager import run_io
 from server.models import ProjectInfo, ProjectSettings
 
 
@@ -64,6 +69,46 @@ class ProjectManager:
         except Exception as e:
             return False, f"创建项目失败: {str(e)}", None
     
+    async def create_project_async(
+        self,
+        db: AsyncSession,
+        name: str,
+        display_name: str,
+        description: str = None,
+        default_prompt: str = "请分析以下文件内容并生成研究总结",
+        required_tools: Dict[str, Any] = None
+    ) -> Tuple[bool, Optional[str], Optional[Project]]:
+        """创建新项目（异步，目录和设置文件在I/O线程池中创建）"""
+        try:
+            existing_project = await get_project_by_name_async(db, name)
+            if existing_project:
+                return False, f"项目 '{name}' 已存在", None
+            
+            if not self._is_valid_project_name(name):
+                return False, "项目名只能包含字母、数字、下划线和连字符", None
+            
+            project = await create_project_async(db, name, display_name, description)
+            
+            success = await run_io(self._create_project_directories, name)
+            if not success:
+                await db.delete(project)
+                await db.commit()
+                return False, "项目目录创建失败", None
+            
+            settings_success = await run_io(
+                self._create_default_settings, name, default_prompt, required_tools
+            )
+            if not settings_success:
+                await db.delete(project)
+                await db.commit()
+                await run_io(shutil.rmtree, get_project_path(name), ignore_errors=True)
+                return False, "项目设置文件创建失败", None
+            
+            return True, "项目创建成功", project
+            
+        except Exception as e:
+            return False, f"创建项目失败: {str(e)}", None
+    
     def get_project(self, db: Session, name: str) -> Optional[Project]:
         """获取项目"""
         return get_project_by_name(db, name)
@@ -71,6 +116,14 @@ class ProjectManager:
     def list_projects(self, db: Session) -> List[Project]:
         """列出所有项目"""
         return db.query(Project).filter(Project.is_active == True).all()
+
+    async def get_project_async(self, db: AsyncSession, name: str) -> Optional[Project]:
+        """获取项目（异步）"""
+        return await get_project_by_name_async(db, name)
+    
+    async def list_projects_async(self, db: AsyncSession) -> List[Project]:
+        """列出所有项目（异步）"""
+        return await list_active_projects_async(db)
     
     def update_project(
         self, 
@@ -136,6 +189,27 @@ class ProjectManager:
         except Exception as e:
             return False, f"硬删除项目失败: {str(e)}"
     
+    async def hard_delete_project_async(self, db: AsyncSession, name: str) -> Tuple[bool, Optional[str]]:
+        """硬删除项目（异步）"""
+        try:
+            project = await get_project_by_name_async(db, name)
+            if not project:
+                return False, f"项目 '{name}' 不存在"
+            
+            # 删除时需要加载关联的工作流，放到 run_sync 中以允许隐式加载
+            await db.run_sync(lambda sync_db: sync_db.delete(project))
+            await db.commit()
+            
+            project_path = get_project_path(name)
+            if project_path.exists():
+                await run_io(shutil.rmtree, project_path)
+            
+            return True, "项目完全删除成功"
+            
+        except Exception as e:
+            await db.rollback()
+            return False, f"硬删除项目失败: {str(e)}"
+    
     def get_project_info(self, db: Session, name: str) -> Optional[ProjectInfo]:
         """获取项目信息"""
         project = get_project_by_name(db, name)
@@ -174,7 +248,7 @@ class ProjectManager:
         # 统计文件和日期
         files_dir = project_path / "files"
         if files_dir.exists():
-            dates = [d for d in files_dir.iterdir() if d.is_dir()]
+            dates = [d for d in files_dir.iterdir() if d.is_dir() and not d.name.startswith(".")]
             stats["total_dates"] = len(dates)
             
             for date_dir in dates:
@@ -322,7 +396,8 @@ class ProjectManager:
         
         dates = []
         for date_dir in files_dir.iterdir():
-            if date_dir.is_dir():
+            # 跳过 .blobs 等内部目录
+            if date_dir.is_dir() and not date_dir.name.startswith("."):
                 dates.append(date_dir.name)
         
         return sorted(dates, reverse=True)  # 最新的在前
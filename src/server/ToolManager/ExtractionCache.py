@@ -0,0 +1,250 @@
+"""文件提取结果缓存
+
+PDF 解析、图片 OCR、Excel 读取的结果按 (文件内容 SHA-256, 工具名, 工具配置哈希) 缓存在磁盘上，
+文件内容与工具配置都未变化时直接复用，避免每次执行工作流都重新解析/识别整天的文件。
+缓存总大小超过 EXTRACTION_CACHE_MAX_BYTES 时按最近使用时间淘汰。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from server.config import settings
+
+
+# 结构变化时递增，使旧缓存失效
+# v2：不再缓存 OCR 不可用时的空结果，旧版本可能已缓存了这类结果
+CACHE_FORMAT_VERSION = 2
+
+# 支持缓存的工具（结果只依赖文件内容和工具配置）
+CACHEABLE_TOOLS = {"pdf_parser", "image_reader", "excel_reader"}
+
+
+def to_cacheable(value: Any) -> Any:
+    """将工具结果转换为可 JSON 序列化的结构（丢弃二进制数据，其他对象转为字符串）"""
+    if isinstance(value, dict):
+        return {str(k): to_cacheable(v) for k, v in value.items() if not isinstance(v, (bytes, bytearray))}
+    if isinstance(value, (list, tuple)):
+        return [to_cacheable(v) for v in value if not isinstance(v, (bytes, bytearray))]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def is_complete_result(result: Any) -> bool:
+    """判断工具结果能否缓存：OCR 引擎不可用时的空结果只反映当前环境，不能按文件内容复用"""
+    if not isinstance(result, dict):
+        return False
+    processing_info = result.get("processing_info")
+    if isinstance(processing_info, dict) and processing_info.get("ocr_enabled") is False:
+        return False
+    return True
+
+
+def hash_config(config: Dict[str, Any]) -> str:
+    """工具配置哈希"""
+    raw = json.dumps(config or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ExtractionCache:
+    """磁盘提取结果缓存"""
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self._cache_dir = cache_dir
+        self.max_bytes = max_bytes if max_bytes is not None else settings.EXTRACTION_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        # (路径, mtime_ns, size) -> sha256，避免重复计算未变化文件的哈希
+        self._hash_memo: Dict[Tuple[str, int, int], str] = {}
+        self._total_bytes: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir or settings.EXTRACTION_CACHE_DIR or settings.USRDATA_DIR / ".extraction_cache"
+
+    @property
+    def enabled(self) -> bool:
+        return settings.EXTRACTION_CACHE_ENABLED and self.max_bytes > 0
+
+    def is_cacheable(self, tool_name: str, input_data: Any) -> bool:
+        """判断该工具调用能否使用缓存"""
+        return self.enabled and tool_name in CACHEABLE_TOOLS and isinstance(input_data, (str, bytes))
+
+    def content_hash(self, input_data: Any) -> str:
+        """计算输入（文件路径或字节内容）的 SHA-256"""
+        if isinstance(input_data, bytes):
+            return hashlib.sha256(input_data).hexdigest()
+
+        path = str(input_data)
+        st = os.stat(path)
+        memo_key = (path, st.st_mtime_ns, st.st_size)
+        sha256 = self._hash_memo.get(memo_key)
+        if sha256 is None:
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+            sha256 = hasher.hexdigest()
+            with self._lock:
+                if len(self._hash_memo) > 10000:
+                    self._hash_memo.clear()
+                self._hash_memo[memo_key] = sha256
+        return sha256
+
+    def make_key(self, sha256: str, tool_name: str, config: Dict[str, Any]) -> str:
+        """缓存键：内容哈希 + 工具名 + 配置哈希"""
+        return f"{sha256}_{tool_name}_{hash_config(config)}_v{CACHE_FORMAT_VERSION}"
+
+    def get_entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, tool_name: str, config: Dict[str, Any], input_data: Any) -> Optional[Dict[str, Any]]:
+        """读取缓存的工具结果，未命中返回 None"""
+        try:
+            key = self.make_key(self.content_hash(input_data), tool_name, config)
+        except OSError:
+            return None
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 更新访问时间，用于 LRU 淘汰
+            os.utime(entry_path, None)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        result = entry.get("result") or {}
+        result["cached"] = True
+        return result
+
+    def put(self, tool_name: str, config: Dict[str, Any], input_data: Any, result: Any):
+        """写入工具结果（不完整的结果不写入，见 is_complete_result）"""
+        if not is_complete_result(result):
+            return
+        try:
+            sha256 = self.content_hash(input_data)
+        except OSError:
+            return
+        key = self.make_key(sha256, tool_name, config)
+        entry = {
+            "tool": tool_name,
+            "sha256": sha256,
+            "config_hash": hash_config(config),
+            "created_at": datetime.now().isoformat(),
+            "result": to_cacheable(result),
+        }
+        entry_path = self.get_entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=entry_path.parent, prefix=".entry_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            old_size = entry_path.stat().st_size if entry_path.exists() else 0
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"写入提取缓存失败: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self.writes += 1
+            if self._total_bytes is not None:
+                self._total_bytes += new_size - old_size
+        self._evict_if_needed()
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        removed = 0
+        with self._lock:
+            for entry_path in self._iter_entries():
+                try:
+                    entry_path.unlink()
+                    removed += 1
+                except OSError:
+                    continue
+            self._total_bytes = 0
+            self._hash_memo.clear()
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries = sum(1 for _ in self._iter_entries())
+            total_bytes = self._scan_total_bytes()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "cache_dir": str(self.cache_dir),
+                "entries": entries,
+                "total_bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+    def _iter_entries(self):
+        if not self.cache_dir.exists():
+            return
+        yield from self.cache_dir.glob("*/*.json")
+
+    def _scan_total_bytes(self) -> int:
+        total = 0
+        for entry_path in self._iter_entries():
+            try:
+                total += entry_path.stat().st_size
+            except OSError:
+                continue
+        self._total_bytes = total
+        return total
+
+    def _evict_if_needed(self):
+        with self._lock:
+            total = self._total_bytes if self._total_bytes is not None else self._scan_total_bytes()
+            if total <= self.max_bytes:
+                return
+
+            entries = []
+            for entry_path in self._iter_entries():
+                try:
+                    st = entry_path.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry_path))
+            entries.sort()
+
+            # 淘汰到上限的 90%，避免每次写入都触发扫描
+            target = int(self.max_bytes * 0.9)
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry_path in entries:
+                if total <= target:
+                    break
+                try:
+                    entry_path.unlink()
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._total_bytes = total
+
+
+# 全局提取缓存实例
+extraction_cache = ExtractionCache()
@@ -0,0 +1,184 @@
+"""文件文本提取进程池
+
+PDF 解析和图片 OCR 是 CPU 密集型操作，工具的 process 虽然是 async def，
+实际执行时会阻塞事件循环。这里把多个文件的提取分发到进程池并发执行，
+结果按输入顺序返回，并记录每个文件的耗时。
+"""
+import asyncio
+import importlib
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from server.config import settings
+from server.DataManager.AsyncDataManager import run_io
+from .ToolRegistry import BaseTool, tool_registry
+from .ExtractionCache import extraction_cache, to_cacheable
+
+
+TEXT_EXTENSIONS = (".txt", ".md")
+PDF_EXTENSIONS = (".pdf",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp")
+
+# 可以在子进程中按 (模块, 类名, 配置) 重新构造的提取工具（与 get_extraction_tool_name 的返回值对应）
+POOLED_TOOLS = {"pdf_parser", "image_reader"}
+
+# OCR 引擎不可用时图片提取的错误信息（没有识别，不等于图片中没有文字）
+OCR_UNAVAILABLE_ERROR = "OCR 不可用（PaddleOCR 未安装或初始化失败）"
+
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_lock = threading.Lock()
+
+# 子进程内的工具实例与事件循环（每个 worker 进程各自初始化一次）
+_worker_tools: Dict[Tuple[str, str, str], BaseTool] = {}
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """获取（必要时创建）提取进程池，EXTRACTION_WORKERS 为 0 时返回 None"""
+    global _extraction_pool
+    if settings.EXTRACTION_WORKERS <= 0:
+        return None
+    if _extraction_pool is None:
+        with _extraction_pool_lock:
+            if _extraction_pool is None:
+                # spawn：子进程不继承父进程的线程和锁，各平台行为一致
+                _extraction_pool = ProcessPoolExecutor(
+                    max_workers=settings.EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    """关闭提取进程池（应用退出时调用）"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown(wait=True, cancel_futures=True)
+            _extraction_pool = None
+
+
+def _reset_broken_pool(pool: ProcessPoolExecutor):
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _get_worker_tool(module_name: str, class_name: str, config_json: str) -> BaseTool:
+    key = (module_name, class_name, config_json)
+    tool = _worker_tools.get(key)
+    if tool is None:
+        tool_cls = getattr(importlib.import_module(module_name), class_name)
+        tool = tool_cls(json.loads(config_json))
+        _worker_tools[key] = tool
+    return tool
+
+
+def _extract_in_worker(module_name: str, class_name: str, config_json: str, file_path: str) -> Tuple[Dict[str, Any], float]:
+    """子进程入口：用指定工具处理文件，返回 (可序列化的结果, 耗时秒)"""
+    global _worker_loop
+    started = time.perf_counter()
+    tool = _get_worker_tool(module_name, class_name, config_json)
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    result = _worker_loop.run_until_complete(tool.process(file_path))
+    # 图片等二进制数据不回传主进程
+    return to_cacheable(result), time.perf_counter() - started
+
+
+def _read_text_file(file_path: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+    return text, time.perf_counter() - started
+
+
+def get_extraction_tool_name(file_path: str) -> Optional[str]:
+    """根据扩展名选择提取工具，纯文本返回 "text"，不支持的类型返回 None"""
+    lower = str(file_path).lower()
+    if lower.endswith(TEXT_EXTENSIONS):
+        return "text"
+    if lower.endswith(PDF_EXTENSIONS):
+        return "pdf_parser"
+    if lower.endswith(IMAGE_EXTENSIONS):
+        return "image_reader"
+    return None
+
+
+async def extract_text(file_path: str, tool_name: Optional[str] = None) -> Dict[str, Any]:
+    """提取单个文件的文本
+
+    返回 {"file", "tool", "text", "elapsed", "error"}；失败不抛异常，error 中记录原因。
+    """
+    file_path = str(file_path)
+    tool_name = tool_name or get_extraction_tool_name(file_path)
+    item = {"file": Path(file_path).name, "tool": tool_name, "text": "", "elapsed": 0.0, "error": None}
+    started = time.perf_counter()
+    try:
+        if tool_name is None:
+            item["error"] = "unsupported file type"
+        elif tool_name == "text":
+            item["text"], _ = await run_io(_read_text_file, file_path)
+        else:
+            result = await _run_tool(tool_name, file_path)
+            if _ocr_unavailable(result):
+                item["error"] = OCR_UNAVAILABLE_ERROR
+            else:
+                item["text"] = _text_of(result)
+    except Exception as e:
+        item["error"] = str(e)
+    item["elapsed"] = round(time.perf_counter() - started, 3)
+    return item
+
+
+async def extract_texts(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """并发提取多个文件的文本，结果与输入顺序一致"""
+    return list(await asyncio.gather(*(extract_text(fp) for fp in file_paths)))
+
+
+async def _run_tool(tool_name: str, file_path: str) -> Any:
+    tool = tool_registry.get_tool(tool_name)
+    if not tool or not tool.enabled:
+        raise ValueError(f"工具不可用: {tool_name}")
+
+    pool = get_extraction_pool() if tool_name in POOLED_TOOLS else None
+    if pool is not None:
+        if extraction_cache.is_cacheable(tool_name, file_path):
+            cached = await run_io(extraction_cache.get, tool_name, tool.config, file_path)
+            if cached is not None:
+                return cached
+
+        tool_cls = type(tool)
+        config_json = json.dumps(tool.config, sort_keys=True, default=str)
+        loop = asyncio.get_running_loop()
+        try:
+            result, _ = await loop.run_in_executor(
+                pool, _extract_in_worker, tool_cls.__module__, tool_cls.__name__, config_json, file_path
+            )
+            if extraction_cache.is_cacheable(tool_name, file_path):
+                await run_io(extraction_cache.put, tool_name, tool.config, file_path, result)
+            return result
+        except BrokenProcessPool:
+            # worker 异常退出（如 OCR 库崩溃）：丢弃进程池，本次回退到进程内执行
+            print("提取进程池已损坏，重新创建并回退到进程内提取")
+            _reset_broken_pool(pool)
+
+    # process_with_tool 内部同样会查询/写入提取缓存
+    return await tool_registry.process_with_tool(tool_name, file_path)
+
+
+def _ocr_unavailable(result: Any) -> bool:
+    processing_info = result.get("processing_info") if isinstance(result, dict) else None
+    return isinstance(processing_info, dict) and processing_info.get("ocr_enabled") is False
+
+
+def _text_of(result: Any) -> str:
+    return (result.get("text_content", "") if isinstance(result, dict) else "") or ""
@@ -163,8 +163,8 @@ class ImageReaderTool(BaseTool):
             return processed_results
             
         except Exception as e:
-            print(f"OCR识别失败: {e}")
-            return []
+            # 识别失败不能当作"图片中没有文字"，否则空结果会被缓存和保存
+            raise RuntimeError(f"OCR识别失败: {e}") from e
     
     def _extract_text_from_ocr(self, ocr_results: List[Dict[str, Any]]) -> str:
         """从OCR结果中提取文本"""
@@ -1,6 +1,6 @@
 """文本处理工具"""
 import re
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from .ToolRegistry import BaseTool
 
 
@@ -18,6 +18,8 @@ class TextProcessorTool(BaseTool):
         self.remove_special_chars = self.config.get("remove_special_chars", False)
         self.min_text_length = self.config.get("min_text_length", 10)
         self.max_text_length = self.config.get("max_text_length", 10000)
+        # 关闭后不截断，交给 LLM 节点的 map_reduce / refine 模式分块处理
+        self.truncate = self.config.get("truncate", True)
     
     async def process(self, input_data: Any) -> Dict[str, Any]:
         """处理文本数据"""
@@ -36,7 +38,9 @@ class TextProcessorTool(BaseTool):
         
         try:
             # 文本清理
-            cleaned_text = self._clean_text(text)
+            cleaned_text, truncated_chars = self._clean_text(text)
+            if truncated_chars:
+                print(f"文本超过 max_text_length（{self.max_text_length}），已截断 {truncated_chars} 个字符")
             
             # 文本分析
             analysis = self._analyze_text(cleaned_text)
@@ -53,6 +57,8 @@ class TextProcessorTool(BaseTool):
                     "original_length": len(text),
                     "cleaned_length": len(cleaned_text),
                     "segment_count": len(segments),
+                    "truncated": truncated_chars > 0,
+                    "truncated_chars": truncated_chars,
                     "processing_applied": {
                         "remove_extra_spaces": self.remove_extra_spaces,
                         "remove_special_chars": self.remove_special_chars
@@ -65,8 +71,8 @@ class TextProcessorTool(BaseTool):
         except Exception as e:
             raise RuntimeError(f"文本处理失败: {str(e)}")
     
-    def _clean_text(self, text: str) -> str:
-        """清理文本"""
+    def _clean_text(self, text: str) -> Tuple[str, int]:
+        """清理文本，返回 (清理后的文本, 被截断的字符数)"""
         cleaned = text
         
         # 移除多余空格
@@ -79,10 +85,12 @@ class TextProcessorTool(BaseTool):
             cleaned = re.sub(r'[^\w\s\u4e00-\u9fff]', '', cleaned)
         
         # 长度限制
-        if len(cleaned) > self.max_text_length:
+        truncated_chars = 0
+        if self.truncate and len(cleaned) > self.max_text_length:
+            truncated_chars = len(cleaned) - self.max_text_length
             cleaned = cleaned[:self.max_text_length] + "..."
         
-        return cleaned
+        return cleaned, truncated_chars
     
     def _analyze_text(self, text: str) -> Dict[str, Any]:
         """分析文本"""
@@ -190,6 +198,9 @@ class TextProcessorTool(BaseTool):
             if not isinstance(self.max_text_length, int) or self.max_text_length <= 0:
                 return False
             
+            if not isinstance(self.truncate, bool):
+                return False
+            
             if self.min_text_length >= self.max_text_length:
                 return False
             
@@ -208,5 +219,6 @@ class TextProcessorTool(BaseTool):
             "sentiment_analysis": True,
             "min_text_length": self.min_text_length,
             "max_text_length": self.max_text_length,
+            "truncate": self.truncate,
             "supported_languages": ["zh", "en", "ja", "ko", "mixed"]
         }
@@ -2,6 +2,8 @@
 from typing import Dict, List, Any, Optional
 from abc import ABC, abstractmethod
 from server.DataManager.ToolConfigManager import ToolConfigManager
+from server.DataManager.AsyncDataManager import run_io
+from .ExtractionCache import extraction_cache
 
 
 class BaseTool(ABC):
@@ -98,7 +100,16 @@ class ToolRegistry:
         if not tool or not tool.enabled:
             raise ValueError(f"工具不可用: {tool_name}")
         
-        return await tool.process(input_data)
+        if not extraction_cache.is_cacheable(tool_name, input_data):
+            return await tool.process(input_data)
+        
+        # 文件内容和工具配置都未变化时直接复用提取结果
+        cached = await run_io(extraction_cache.get, tool_name, tool.config, input_data)
+        if cached is not None:
+            return cached
+        result = await tool.process(input_data)
+        await run_io(extraction_cache.put, tool_name, tool.config, input_data, result)
+        return result
     
     def get_tools_by_type(self, tool_type: str) -> List[BaseTool]:
         """根据类型获取工具"""
@@ -1,17 +1,38 @@
 """工作流引擎（动态图）"""
 import asyncio
+import hashlib
+import json
+import time
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from server.config import settings
-from server.database import update_workflow_status, get_workflow_by_wf_id
-from server.models import WorkflowStatus, WorkflowGraphConfig, WorkflowNode
+from server.database import SessionLocal, update_workflow_status, get_workflow_by_wf_id, get_workflow_by_wf_id_async, Workflow
+from server.models import WorkflowStatus, WorkflowGraphConfig, WorkflowNode, WorkflowEdge
 from .WorkflowStorage import WorkflowStorage
+from .WorkflowStream import workflow_stream
 from server.ToolManager.ToolRegistry import tool_registry
 from server.DataManager.MetadataManager import MetadataManager
+from server.DataManager.IngestPipeline import ingest_pipeline
+from server.DataManager.AsyncDataManager import run_io
 from server.LLMManager.LLMService import llm_service
 
 
+def is_retryable_error(exc: BaseException) -> bool:
+    """执行失败是否值得重试
+
+    配置缺失、未知 wf_id、图结构或参数校验失败（均为 ValueError，含 pydantic 的校验错误）
+    每次执行结果相同，直接判定失败；LLM 调用、工具执行等其他错误可能是临时的，允许重试。
+    """
+    return not isinstance(exc, ValueError)
+
+
+# WorkflowNode.output_key 的默认值：保留默认值的节点结果以节点 id 为键写入 context
+DEFAULT_OUTPUT_KEY = "result"
+
+
 class WorkflowEngine:
     """根据 workflow_{timestamp}.json 动态执行工作流"""
 
@@ -21,16 +42,23 @@ class WorkflowEngine:
 
     async def execute_workflow(
         self,
-        db: Session,
         project_name: str,
         date: str,
         wf_id: str,
         files: List[str] = None,
         custom_prompt: str = None
     ) -> Tuple[bool, Optional[str], Optional[Dict[str, Any]]]:
+        """执行工作流并保存输出
+
+        执行器的事件循环上同时运行多个工作流，数据库状态更新和输出保存都放到 I/O 线程池中，
+        避免一次慢写入阻塞其他工作流。
+        失败时第三项为 {"error", "retryable"}，retryable 见 is_retryable_error。
+        """
         context: Dict[str, Any] = {}
+        if settings.WORKFLOW_STREAM_ENABLED:
+            workflow_stream.begin(wf_id)
         try:
-            update_workflow_status(db, wf_id, WorkflowStatus.RUNNING.value)
+            await run_io(self._update_status, wf_id, WorkflowStatus.RUNNING.value)
 
             # 加载工作流配置
             graph_cfg_dict = self.workflow_storage.load_workflow_config(project_name, date, wf_id)
@@ -48,11 +76,24 @@ class WorkflowEngine:
                 "aggregated_text": ""
             }
 
-            # 预处理：如果有文件，尽量拼接文本（由工具节点进一步处理）
-            context["aggregated_text"] = await self._aggregate_text_from_files(context["files"]) or ""
+            # 增量模式：只处理上次总结之后新增的文件，并把上次的总结交给 LLM 节点合并
+            plan = self._plan_incremental(project_name, date, graph_cfg, context)
+            previous = plan["previous"] if plan else None
+            if previous and not plan["new_files"]:
+                # 没有新增文件：直接沿用上次的总结
+                context["summary"] = previous["summary"]
+                result = {"summary": context["summary"], **context}
+            else:
+                text_files = context["files"]
+                if previous:
+                    context["previous_summary"] = previous["summary"]
+                    text_files = plan["new_files"]
 
-            # 执行图
-            result = await self._run_graph(graph_cfg, context)
+                # 预处理：如果有文件，尽量拼接文本（由工具节点进一步处理）
+                context["aggregated_text"] = await self._aggregate_text_from_files(text_files, context) or ""
+
+                # 执行图
+                result = await self._run_graph(graph_cfg, context)
 
             # 保存输出
             output_data = {
@@ -60,12 +101,24 @@ class WorkflowEngine:
                 "context": {k: v for k, v in result.items() if k != "summary"},
                 "execution_time": datetime.now().isoformat()
             }
-            ok, output_path = self.workflow_storage.save_workflow_output(project_name, date, wf_id, output_data)
+            if plan:
+                output_data["coverage"] = {
+                    "files": plan["files"],
+                    "incremental_from": previous["wf_id"] if previous else None,
+                    "new_files": len(plan["new_files"]),
+                }
+            ok, output_path = await run_io(self.workflow_storage.save_workflow_output, project_name, date, wf_id, output_data)
             if not ok:
-                update_workflow_status(db, wf_id, WorkflowStatus.FAILED.value, "输出保存失败")
+                await run_io(self._update_status, wf_id, WorkflowStatus.FAILED.value, "输出保存失败")
                 return False, "输出保存失败", None
+            if plan and output_data["summary"]:
+                await run_io(
+                    self.workflow_storage.save_summary_coverage,
+                    project_name, date, plan["scope"], wf_id, output_data["summary"], plan["files"]
+                )
 
-            update_workflow_status(db, wf_id, WorkflowStatus.SUCCESS.value)
+            await run_io(self._update_status, wf_id, WorkflowStatus.SUCCESS.value)
+            workflow_stream.finish(wf_id, {"event": "done", "summary": output_data["summary"]})
             return True, "工作流执行成功", output_data
         except Exception as e:
             # 尝试在失败时也保存当前上下文，方便调试
@@ -76,77 +129,102 @@ class WorkflowEngine:
                     "execution_time": datetime.now().isoformat(),
                     "error": str(e),
                 }
-                self.workflow_storage.save_workflow_output(project_name, date, wf_id, debug_output)
+                await run_io(self.workflow_storage.save_workflow_output, project_name, date, wf_id, debug_output)
             except Exception:
                 # 即使保存调试输出失败，也不要影响状态更新
                 pass
 
-            update_workflow_status(db, wf_id, WorkflowStatus.FAILED.value, str(e))
-            return False, f"工作流执行失败: {str(e)}", None
+            await run_io(self._update_status, wf_id, WorkflowStatus.FAILED.value, str(e))
+            # 是否重试由执行器决定，这里不关闭输出流
+            workflow_stream.publish(wf_id, {"event": "error", "message": str(e)})
+            return False, f"工作流执行失败: {str(e)}", {"error": str(e), "retryable": is_retryable_error(e)}
+
+    def _update_status(self, wf_id: str, status: str, error_message: str = None):
+        """更新工作流状态（同步，在 I/O 线程池中调用）"""
+        with SessionLocal() as db:
+            update_workflow_status(db, wf_id, status, error_message)
 
     async def _run_graph(self, graph: WorkflowGraphConfig, context: Dict[str, Any]) -> Dict[str, Any]:
+        """按 DAG 调度执行工作流
+        
+        每个节点等待所有入边都确定（走过或被跳过）后才会执行，所以 merge 节点会等待全部前驱；
+        入边全部被跳过的节点同样被跳过，并继续向后传播。所有就绪节点并发执行，
+        同时运行的节点数受 graph.max_concurrency（默认 WORKFLOW_NODE_CONCURRENCY）限制。
+        出边选择：节点有条件边时只走一条（第一条满足条件的边，否则回退到无条件边）；
+        没有条件边时走全部出边（扇出）。
+        并发的节点共享 context，所以每个节点只写自己的输出键（见 _output_key），
+        工作流的 summary 取自直接通向 end 的 LLM 节点（见 _final_llm_nodes）。
+        """
         node_map: Dict[str, WorkflowNode] = {n.id: n for n in graph.nodes}
-        edges = graph.edges
+        outgoing: Dict[str, List[WorkflowEdge]] = {n.id: [] for n in graph.nodes}
+        remaining: Dict[str, int] = {n.id: 0 for n in graph.nodes}
+        for e in graph.edges:
+            outgoing[e.source].append(e)
+            remaining[e.target] += 1
+        self._check_acyclic(graph)
 
         # 找到start节点
         start_ids = [n.id for n in graph.nodes if n.type == "start"]
         if not start_ids:
             raise ValueError("工作流缺少start节点")
-        current_id = start_ids[0]
 
-        visited_guard = 0
-        while True:
-            visited_guard += 1
-            if visited_guard > 1000:
-                raise RuntimeError("工作流可能存在循环导致超过最大步数")
+        activated = {start_ids[0]}
+        ready: List[str] = []
+        semaphore = asyncio.Semaphore(max(1, graph.max_concurrency or settings.WORKFLOW_NODE_CONCURRENCY))
+        timings = context.setdefault("node_timings", {})
 
-            node = node_map[current_id]
-            next_id = None
+        def resolve_edge(edge: WorkflowEdge, taken: bool):
+            if taken:
+                activated.add(edge.target)
+            remaining[edge.target] -= 1
+            if remaining[edge.target] == 0:
+                settle(edge.target)
 
-            if node.type == "end":
-                break
-            elif node.type == "tool":
-                await self._exec_tool_node(node, context)
-            elif node.type == "llm":
-                await self._exec_llm_node(node, graph, context)
-            elif node.type == "branch":
-                # 分支节点不做处理，仅基于条件选择边
-                pass
-            elif node.type == "merge":
-                # 合并节点不做特殊处理
-                pass
-            elif node.type == "start":
-                # 起始节点
-                pass
+        def settle(node_id: str):
+            # 所有入边都已确定：有任一入边被走过则就绪，否则跳过并向后传播
+            if node_id in activated:
+                ready.append(node_id)
             else:
-                raise ValueError(f"未知节点类型: {node.type}")
+                for e in outgoing[node_id]:
+                    resolve_edge(e, False)
 
-            # 选择下一条边
-            outgoing = [e for e in edges if e.source == current_id]
-            if not outgoing:
-                # 没有后继，则结束
-                break
-            if len(outgoing) == 1 and not outgoing[0].condition:
-                next_id = outgoing[0].target
-            else:
-                # 有条件的边，按条件匹配第一条为准
-                chosen = None
-                for e in outgoing:
-                    if not e.condition:
-                        continue
-                    if self._eval_condition(e.condition, context):
-                        chosen = e
-                        break
-                if chosen is None:
-                    # 回退到无条件边
-                    fallback = next((e for e in outgoing if not e.condition), None)
-                    if not fallback:
-                        raise ValueError(f"分支节点 {current_id} 未匹配到任何条件边")
-                    next_id = fallback.target
-                else:
-                    next_id = chosen.target
+        for node_id, count in remaining.items():
+            if count == 0:
+                settle(node_id)
+
+        async def run_node(node_id: str) -> str:
+            async with semaphore:
+                started = time.perf_counter()
+                await self._exec_node(node_map[node_id], graph, context)
+                timings[node_id] = round(time.perf_counter() - started, 3)
+            return node_id
 
-            current_id = next_id
+        executed: set = set()
+        running: Dict[asyncio.Task, str] = {}
+        try:
+            while ready or running:
+                while ready:
+                    node_id = ready.pop(0)
+                    running[asyncio.ensure_future(run_node(node_id))] = node_id
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = running.pop(task)
+                    task.result()  # 节点失败时抛出异常，终止整个工作流
+                    executed.add(node_id)
+                    taken = self._select_edges(node_id, outgoing[node_id], context)
+                    for e in outgoing[node_id]:
+                        resolve_edge(e, e in taken)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running.keys(), return_exceptions=True)
+
+        # 分支上可能有多个通向 end 的 LLM 节点，按节点顺序取第一个执行过的
+        for node_id in self._final_llm_nodes(graph):
+            if node_id in executed:
+                context["summary"] = context.get(self._output_key(node_map[node_id]), "")
+                break
 
         # 结果
         result = {
@@ -155,6 +233,77 @@ class WorkflowEngine:
         }
         return result
 
+    async def _exec_node(self, node: WorkflowNode, graph: WorkflowGraphConfig, context: Dict[str, Any]):
+        if node.type == "tool":
+            await self._exec_tool_node(node, context)
+        elif node.type == "llm":
+            await self._exec_llm_node(node, graph, context)
+        elif node.type in ("start", "end", "branch", "merge"):
+            # 起止、分支与合并节点不做处理：分支由出边条件决定，合并由入边等待实现
+            pass
+        else:
+            raise ValueError(f"未知节点类型: {node.type}")
+
+    def _select_edges(self, node_id: str, outgoing: List[WorkflowEdge], context: Dict[str, Any]) -> List[WorkflowEdge]:
+        """选择节点执行后要走的出边"""
+        if not any(e.condition for e in outgoing):
+            return list(outgoing)
+        # 有条件的边，按条件匹配第一条为准
+        for e in outgoing:
+            if e.condition and self._eval_condition(e.condition, context):
+                return [e]
+        # 回退到无条件边
+        fallback = next((e for e in outgoing if not e.condition), None)
+        if not fallback:
+            raise ValueError(f"分支节点 {node_id} 未匹配到任何条件边")
+        return [fallback]
+
+    def _output_key(self, node: WorkflowNode) -> str:
+        """节点结果写入 context 的键：未指定 output_key（默认 "result"）时使用节点 id，避免并发节点互相覆盖"""
+        if node.output_key and node.output_key != DEFAULT_OUTPUT_KEY:
+            return node.output_key
+        return node.id
+
+    def _final_llm_nodes(self, graph: WorkflowGraphConfig) -> List[str]:
+        """直接通向 end 的 LLM 节点（中间只经过非 LLM 节点），按节点定义顺序返回"""
+        incoming: Dict[str, List[str]] = {n.id: [] for n in graph.nodes}
+        for e in graph.edges:
+            incoming[e.target].append(e.source)
+        node_types = {n.id: n.type for n in graph.nodes}
+        final = set()
+        visited = set()
+        stack = [n.id for n in graph.nodes if n.type == "end"]
+        while stack:
+            node_id = stack.pop()
+            for source in incoming[node_id]:
+                if source in visited:
+                    continue
+                visited.add(source)
+                if node_types[source] == "llm":
+                    final.add(source)
+                else:
+                    stack.append(source)
+        return [n.id for n in graph.nodes if n.id in final]
+
+    def _check_acyclic(self, graph: WorkflowGraphConfig):
+        """检查工作流是否为有向无环图"""
+        indegree = {n.id: 0 for n in graph.nodes}
+        for e in graph.edges:
+            indegree[e.target] += 1
+        queue = [node_id for node_id, d in indegree.items() if d == 0]
+        visited = 0
+        while queue:
+            node_id = queue.pop()
+            visited += 1
+            for e in graph.edges:
+                if e.source == node_id:
+                    indegree[e.target] -= 1
+                    if indegree[e.target] == 0:
+                        queue.append(e.target)
+        if visited != len(indegree):
+            cyclic = [node_id for node_id, d in indegree.items() if d > 0]
+            raise ValueError(f"工作流存在循环，涉及节点: {', '.join(cyclic)}")
+
     async def _exec_tool_node(self, node: WorkflowNode, context: Dict[str, Any]):
         tool_name = node.tool_name or node.params.get("tool_name")
         if not tool_name:
@@ -163,22 +312,51 @@ class WorkflowEngine:
         payload = {}
         for k, v in (node.input_map or {}).items():
             payload[k] = self._resolve_from_context(v, context)
-        # 若无映射则传递上下文
+        # 若无映射则传递上下文快照（其他节点可能同时在写 context）
         if not payload:
-            payload = context
+            payload = dict(context)
         result = await tool_registry.process_with_tool(tool_name, payload)
-        context[node.output_key or "result"] = result
+        context[self._output_key(node)] = result
 
     async def _exec_llm_node(self, node: WorkflowNode, graph: WorkflowGraphConfig, context: Dict[str, Any]):
         template_name = node.params.get("template") or graph.prompt_template or "default"
         model_name = graph.llm_model
         content_key = node.input_map.get("content") if node.input_map else None
         content = self._resolve_from_context(content_key, context) if content_key else context.get("aggregated_text", "")
-        ok, summary_or_msg, meta = await llm_service.generate_summary(content=content, template_name=template_name, model_name=model_name, custom_prompt=context.get("custom_prompt"))
+        # 增量总结：上次的总结只交给生成最终总结的节点，其余节点只处理新增文件的内容
+        previous_summary = context.get("previous_summary") if node.id in self._final_llm_nodes(graph) else None
+        # 生成的文本通过输出流实时推送给订阅者（params.stream=false 时关闭）
+        on_token = None
+        wf_id = context.get("wf_id")
+        if settings.WORKFLOW_STREAM_ENABLED and wf_id and node.params.get("stream", True):
+            workflow_stream.publish(wf_id, {"event": "node", "node": node.id})
+            on_token = lambda text: workflow_stream.publish(wf_id, {"event": "token", "node": node.id, "text": text})
+        # params.mode 选择长文本总结方式（stuff / map_reduce / refine），chunk_tokens 与 max_concurrency 控制分块，
+        # use_cache=false 时跳过 LLM 响应缓存
+        ok, summary_or_msg, meta = await llm_service.generate_summary(
+            content=content, template_name=template_name, model_name=model_name, custom_prompt=context.get("custom_prompt"),
+            mode=node.params.get("mode"), chunk_tokens=node.params.get("chunk_tokens"), max_concurrency=node.params.get("max_concurrency"),
+            use_cache=node.params.get("use_cache", True), on_token=on_token, previous_summary=previous_summary
+        )
         if ok:
-            context[node.output_key or "summary"] = summary_or_msg
-            context["summary"] = summary_or_msg
+            # 工作流的 summary 由 _run_graph 在结束时从最终的 LLM 节点取得
+            context[self._output_key(node)] = summary_or_msg
             context.setdefault("llm_meta", []).append(meta)
+            # 累计整个工作流的估算与实际 token 用量（接口未返回用量时 actual 为 None）
+            usage = context.setdefault("token_usage", {
+                "llm_calls": 0, "cache_hits": 0, "retries": 0, "hedged": 0, "queue_wait_seconds": 0.0,
+                "estimated_prompt_tokens": 0, "actual": None
+            })
+            usage["llm_calls"] += meta.get("llm_calls", 0)
+            usage["cache_hits"] += meta.get("cache_hits", 0)
+            usage["retries"] += meta.get("retries", 0)
+            usage["hedged"] += meta.get("hedged", 0)
+            # 限流排队时间（各请求累加，并发请求的排队时间会重叠）
+            usage["queue_wait_seconds"] = round(usage["queue_wait_seconds"] + meta.get("queue_wait_seconds", 0.0), 3)
+            usage["estimated_prompt_tokens"] += meta.get("estimated_prompt_tokens", 0)
+            if meta.get("usage"):
+                actual = usage["actual"] or {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                usage["actual"] = {k: actual[k] + meta["usage"].get(k, 0) for k in actual}
         else:
             raise RuntimeError(f"LLM生成失败: {summary_or_msg}")
 
@@ -202,38 +380,72 @@ class WorkflowEngine:
                 return None
         return cur
 
-    async def _aggregate_text_from_files(self, files: List[str]) -> str:
+    async def _aggregate_text_from_files(self, files: List[str], context: Dict[str, Any] = None) -> str:
+        """读取文件文本并按文件顺序拼接
+
+        优先使用上传时预提取的文本，仍在提取中的文件等待其完成，其余文件并发当场提取。
+        传入 context 时，每个文件的提取工具、来源、耗时和错误记录在 context["file_timings"]。
+        """
         if not files:
             return ""
-        texts: List[str] = []
-        for fp in files:
-            path_str = str(fp)
-            lower = path_str.lower()
-            try:
-                # 纯文本文件，直接读取
-                if lower.endswith(('.txt', '.md')):
-                    with open(path_str, 'r', encoding='utf-8', errors='ignore') as f:
-                        texts.append(f.read())
-                # PDF，通过 pdf_parser 提取文本（包括内置OCR能力）
-                elif lower.endswith('.pdf'):
-                    try:
-                        pdf_result = await tool_registry.process_with_tool("pdf_parser", path_str)
-                        if isinstance(pdf_result, dict) and pdf_result.get("text_content"):
-                            texts.append(pdf_result["text_content"])
-                    except Exception:
-                        # 单个文件失败不影响整体流程
-                        continue
-                # 图片，通过 image_reader 进行 OCR
-                elif lower.endswith(('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp')):
-                    try:
-                        img_result = await tool_registry.process_with_tool("image_reader", path_str)
-                        if isinstance(img_result, dict) and img_result.get("text_content"):
-                            texts.append(img_result["text_content"])
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-        return "\n\n".join(texts)
+        results = await ingest_pipeline.load_texts([str(fp) for fp in files])
+        if context is not None:
+            context["file_timings"] = [
+                {k: v for k, v in item.items() if k != "text"} | {"chars": len(item["text"])}
+                for item in results
+            ]
+        # 单个文件失败不影响整体流程
+        return "\n\n".join(item["text"] for item in results if item["text"])
+
+    def _plan_incremental(
+        self, project_name: str, date: str, graph: WorkflowGraphConfig, context: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """计算增量总结计划
+
+        以 file_id + CRC32 标识文件内容，与同一日期、同一范围上次总结覆盖的文件比较：
+        上次覆盖的文件都还在且未改变时，只处理新增文件；否则（有文件被删除或改写）全量重新总结。
+        返回 {"scope", "files", "new_files", "previous"}；未开启增量、使用自定义提示词
+        或存在不在元数据中的文件时返回 None，按全量执行且不记录覆盖信息。
+        """
+        enabled = graph.incremental if graph.incremental is not None else settings.WORKFLOW_INCREMENTAL_SUMMARY
+        if not enabled or context.get("custom_prompt"):
+            return None
+        metadata = self.metadata_manager.load_metadata(project_name, date)
+        if not metadata:
+            return None
+
+        by_path = {str((settings.BASE_DIR / f.stored_path).resolve()): f for f in metadata.files}
+        entries = []
+        for fp in context["files"]:
+            file_info = by_path.get(str(Path(fp).resolve()))
+            if file_info is None:
+                return None
+            entries.append((str(fp), (file_info.file_id, file_info.crc32)))
+
+        scope = self._summary_scope(graph)
+        previous = self.workflow_storage.load_summary_coverage(project_name, date, scope)
+        new_files = [fp for fp, _ in entries]
+        if previous:
+            covered = {(f.get("file_id"), f.get("crc32")) for f in previous.get("files", [])}
+            if previous.get("summary") and covered <= {key for _, key in entries}:
+                new_files = [fp for fp, key in entries if key not in covered]
+            else:
+                previous = None
+
+        return {
+            "scope": scope,
+            "files": [{"file_id": file_id, "crc32": crc32} for _, (file_id, crc32) in entries],
+            "new_files": new_files,
+            "previous": previous,
+        }
+
+    def _summary_scope(self, graph: WorkflowGraphConfig) -> str:
+        """增量总结的范围：工作流图结构、模型和模板都相同的总结才能相互衔接"""
+        raw = json.dumps(
+            graph.dict(exclude={"name", "max_concurrency", "incremental"}),
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
 
     async def _get_project_files(self, project_name: str, date: str) -> List[str]:
         try:
@@ -254,7 +466,16 @@ class WorkflowEngine:
         workflow = get_workflow_by_wf_id(db, wf_id)
         if not workflow:
             return None
-        
+        return self._workflow_status_dict(workflow)
+
+    async def get_workflow_status_async(self, db: AsyncSession, wf_id: str) -> Optional[Dict[str, Any]]:
+        """获取工作流状态信息（异步）"""
+        workflow = await get_workflow_by_wf_id_async(db, wf_id)
+        if not workflow:
+            return None
+        return self._workflow_status_dict(workflow)
+
+    def _workflow_status_dict(self, workflow: Workflow) -> Dict[str, Any]:
         return {
             "wf_id": workflow.wf_id,
             "name": workflow.name,
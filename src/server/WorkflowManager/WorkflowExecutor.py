@@ -0,0 +1,373 @@
+"""工作流执行器
+
+所有工作流在同一个常驻事件循环线程中执行，替代在线程池里为每个工作流 asyncio.run
+一个新事件循环的做法：
+- 待执行的工作流持久化在 workflow_jobs 表中，服务重启不会丢失
+- 调度器领取到期的 pending 任务并加租约，执行期间定时心跳续租；
+  租约过期（worker 崩溃、进程被杀）的任务会被回收并按退避时间重试
+- 确定性错误（配置缺失、校验失败等，见 is_retryable_error）不重试，直接标记失败
+- 每次领取使用独立的租约标识，续租失败（租约已被回收）时中止本次执行，
+  结束任务时只更新仍由本次租约持有的任务，避免与接手的执行互相覆盖
+- 同时运行的工作流数量受 WORKFLOW_MAX_CONCURRENCY 限制，避免耗尽线程和 LLM 配额
+- 排队数量受 WORKFLOW_QUEUE_SIZE 限制，队列满时 submit 直接拒绝，由接口返回 429
+- 事件循环长期存在，HTTP 客户端等资源可以在工作流之间复用
+"""
+import asyncio
+import itertools
+import json
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
+from server.config import settings
+from server.database import (
+    SessionLocal, WorkflowJobRecord, update_workflow_status, enqueue_workflow_job,
+    get_active_workflow_job, count_workflow_jobs, claim_workflow_job, heartbeat_workflow_job,
+    finish_workflow_job, get_expired_workflow_jobs, get_orphaned_running_workflows
+)
+from server.models import WorkflowStatus
+from server.DataManager.AsyncDataManager import run_io
+from server.LLMManager.HttpClient import close_http_client
+from .WorkflowEngine import workflow_engine
+from .WorkflowStream import workflow_stream
+
+
+class WorkflowJob(BaseModel):
+    """待执行的工作流"""
+    project_name: str
+    date: str
+    wf_id: str
+    files: List[str] = []
+    custom_prompt: Optional[str] = None
+    job_id: Optional[int] = None
+    attempts: int = 0
+    max_attempts: int = 1
+    lease_owner: Optional[str] = None
+
+    @classmethod
+    def from_record(cls, record: WorkflowJobRecord) -> "WorkflowJob":
+        payload = json.loads(record.payload) if record.payload else {}
+        return cls(
+            project_name=record.project_name,
+            date=record.date,
+            wf_id=record.wf_id,
+            files=payload.get("files") or [],
+            custom_prompt=payload.get("custom_prompt"),
+            job_id=record.id,
+            attempts=record.attempts,
+            max_attempts=record.max_attempts,
+            lease_owner=record.lease_owner,
+        )
+
+
+class WorkflowExecutor:
+    """常驻事件循环 + 持久化任务队列的工作流执行器"""
+
+    # submit 的拒绝原因
+    REJECT_NOT_RUNNING = "not_running"
+    REJECT_QUEUE_FULL = "queue_full"
+    REJECT_DUPLICATE = "duplicate"
+
+    def __init__(self, max_concurrency: Optional[int] = None, queue_size: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency or settings.WORKFLOW_MAX_CONCURRENCY)
+        self.queue_size = max(1, queue_size or settings.WORKFLOW_QUEUE_SIZE)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduler_task: Optional[asyncio.Task] = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._claims = itertools.count(1)
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {"completed": 0, "failed": 0, "retried": 0, "rejected": 0, "reclaimed": 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动执行器线程（重复调用无副作用）"""
+        if self.is_running:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="workflow-executor", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 10.0):
+        """停止执行器：中断运行中的工作流并将其任务放回队列"""
+        if not self.is_running or self._loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"停止工作流执行器超时或失败: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    async def submit(self, job: WorkflowJob) -> Tuple[bool, Optional[str]]:
+        """提交工作流，返回 (是否接受, 拒绝原因)"""
+        if not self.is_running:
+            reason = self.REJECT_NOT_RUNNING
+        else:
+            reason = await run_io(self._enqueue, job)
+        if reason:
+            with self._lock:
+                self._stats["rejected"] += 1
+            return False, reason
+        self._wake()
+        return True, None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取执行器状态（包含任务表中各状态的数量）"""
+        with SessionLocal() as db:
+            counts = count_workflow_jobs(db)
+        with self._lock:
+            return {
+                "worker_id": self.worker_id,
+                "running": len(self._tasks),
+                "queued": counts.get("pending", 0),
+                "max_concurrency": self.max_concurrency,
+                "queue_size": self.queue_size,
+                "jobs": counts,
+                "streams": workflow_stream.get_stats(),
+                **self._stats,
+            }
+
+    def has_active_job(self, wf_id: str) -> bool:
+        """工作流是否还有排队中或执行中的任务"""
+        with SessionLocal() as db:
+            return get_active_workflow_job(db, wf_id) is not None
+
+    def _enqueue(self, job: WorkflowJob) -> Optional[str]:
+        with SessionLocal() as db:
+            if get_active_workflow_job(db, job.wf_id):
+                return self.REJECT_DUPLICATE
+            if count_workflow_jobs(db).get("pending", 0) >= self.queue_size:
+                return self.REJECT_QUEUE_FULL
+            try:
+                enqueue_workflow_job(
+                    db, job.wf_id, job.project_name, job.date,
+                    payload={"files": job.files, "custom_prompt": job.custom_prompt},
+                    max_attempts=settings.WORKFLOW_JOB_MAX_ATTEMPTS
+                )
+            except IntegrityError:
+                # 并发提交同一工作流：上面的检查之后另一个请求已入队
+                return self.REJECT_DUPLICATE
+        return None
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._scheduler_task = self._loop.create_task(self._scheduler())
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _scheduler(self):
+        try:
+            await run_io(self._recover_orphaned_workflows)
+        except Exception as e:
+            print(f"恢复中断的工作流失败: {e}")
+
+        while True:
+            try:
+                # 本执行器正在运行的任务由心跳负责续租，不参与回收
+                await run_io(self._reclaim_expired_jobs, set(self._tasks))
+                while len(self._tasks) < self.max_concurrency:
+                    job = await run_io(self._claim_next)
+                    if job is None:
+                        break
+                    previous = self._tasks.get(job.job_id)
+                    if previous is not None:
+                        # 任务被其他进程回收后又由本执行器领取：旧的执行已失去租约
+                        previous.cancel()
+                    self._tasks[job.job_id] = self._loop.create_task(self._run_job(job))
+            except Exception as e:
+                print(f"工作流调度失败: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.WORKFLOW_SCHEDULER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim_next(self) -> Optional[WorkflowJob]:
+        with SessionLocal() as db:
+            lease_owner = f"{self.worker_id}#{next(self._claims)}"
+            record = claim_workflow_job(db, lease_owner, settings.WORKFLOW_JOB_LEASE_SECONDS)
+            return WorkflowJob.from_record(record) if record else None
+
+    async def _run_job(self, job: WorkflowJob):
+        execution = self._loop.create_task(self._execute(job))
+        lease_lost = asyncio.Event()
+        heartbeat = self._loop.create_task(self._heartbeat(job, execution, lease_lost))
+        try:
+            try:
+                ok, error, retryable = await execution
+            except asyncio.CancelledError:
+                if lease_lost.is_set():
+                    # 租约已被回收，任务由回收方重试或接手，这里不再更新任务状态
+                    print(f"工作流 {job.wf_id} 的任务租约已失效，停止本次执行")
+                    return
+                # 执行器关闭：不计入失败次数，放回队列等待下次启动
+                await run_io(self._requeue, job)
+                raise
+            except Exception as e:
+                ok, error, retryable = False, str(e), True
+            finally:
+                heartbeat.cancel()
+            await run_io(self._finish, job, ok, error, retryable)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"工作流 {job.wf_id} 结束处理失败: {e}")
+        finally:
+            if self._tasks.get(job.job_id) is asyncio.current_task():
+                del self._tasks[job.job_id]
+            self._wake()
+
+    async def _execute(self, job: WorkflowJob) -> Tuple[bool, Optional[str], bool]:
+        """执行工作流，返回 (是否成功, 错误信息, 失败时是否可重试)"""
+        ok, msg, data = await workflow_engine.execute_workflow(
+            job.project_name, job.date, job.wf_id, job.files, job.custom_prompt
+        )
+        if ok:
+            return True, None, False
+        return False, msg, (data or {}).get("retryable", True)
+
+    async def _heartbeat(self, job: WorkflowJob, execution: asyncio.Task, lease_lost: asyncio.Event):
+        """定时续租；租约已不属于本次执行时中止执行"""
+        while True:
+            await asyncio.sleep(settings.WORKFLOW_JOB_HEARTBEAT_SECONDS)
+            try:
+                renewed = await run_io(self._renew_lease, job)
+            except Exception as e:
+                print(f"工作流 {job.wf_id} 续租失败: {e}")
+                continue
+            if not renewed:
+                lease_lost.set()
+                execution.cancel()
+                return
+
+    def _renew_lease(self, job: WorkflowJob) -> bool:
+        with SessionLocal() as db:
+            return heartbeat_workflow_job(db, job.job_id, job.lease_owner, settings.WORKFLOW_JOB_LEASE_SECONDS)
+
+    def _finish(self, job: WorkflowJob, ok: bool, error: Optional[str], retryable: bool = True):
+        with SessionLocal() as db:
+            if ok:
+                finished = finish_workflow_job(db, job.job_id, "success", lease_owner=job.lease_owner)
+                status_key = "completed"
+            elif retryable and job.attempts < job.max_attempts:
+                delay = self._retry_delay(job.attempts)
+                finished = finish_workflow_job(
+                    db, job.job_id, "pending", error,
+                    next_run_at=datetime.now() + timedelta(seconds=delay),
+                    lease_owner=job.lease_owner
+                )
+                if finished is not None:
+                    update_workflow_status(
+                        db, job.wf_id, WorkflowStatus.PENDING.value,
+                        f"第 {job.attempts} 次执行失败，{delay} 秒后重试: {error}"
+                    )
+                status_key = "retried"
+            else:
+                finished = finish_workflow_job(db, job.job_id, "failed", error, lease_owner=job.lease_owner)
+                status_key = "failed"
+                if finished is not None:
+                    workflow_stream.finish(job.wf_id, {"event": "failed", "message": error})
+        if finished is None:
+            print(f"工作流 {job.wf_id} 的任务租约已失效，不再更新任务状态")
+            return
+        with self._lock:
+            self._stats[status_key] += 1
+
+    def _requeue(self, job: WorkflowJob):
+        with SessionLocal() as db:
+            # 只放回仍由本次租约持有的任务，并退还本次领取计入的执行次数
+            requeued = db.query(WorkflowJobRecord).filter(
+                WorkflowJobRecord.id == job.job_id,
+                WorkflowJobRecord.status == "running",
+                WorkflowJobRecord.lease_owner == job.lease_owner
+            ).update({
+                WorkflowJobRecord.status: "pending",
+                WorkflowJobRecord.attempts: WorkflowJobRecord.attempts - 1,
+                WorkflowJobRecord.lease_owner: None,
+                WorkflowJobRecord.lease_expires_at: None,
+                WorkflowJobRecord.next_run_at: datetime.now()
+            }, synchronize_session=False)
+            db.commit()
+            if requeued:
+                update_workflow_status(db, job.wf_id, WorkflowStatus.PENDING.value)
+
+    def _reclaim_expired_jobs(self, running_job_ids: Set[int] = frozenset()):
+        """回收租约过期的任务：未达最大次数则按退避重试，否则标记失败
+
+        running_job_ids 为本执行器正在运行的任务，跳过不回收。
+        """
+        with SessionLocal() as db:
+            for record in get_expired_workflow_jobs(db):
+                if record.id in running_job_ids:
+                    continue
+                error = f"执行中断（租约过期，worker: {record.lease_owner}）"
+                if record.attempts < record.max_attempts:
+                    delay = self._retry_delay(record.attempts)
+                    reclaimed = finish_workflow_job(
+                        db, record.id, "pending", error,
+                        next_run_at=datetime.now() + timedelta(seconds=delay),
+                        lease_owner=record.lease_owner
+                    )
+                    status = WorkflowStatus.PENDING.value
+                else:
+                    reclaimed = finish_workflow_job(db, record.id, "failed", error, lease_owner=record.lease_owner)
+                    status = WorkflowStatus.FAILED.value
+                if reclaimed is None:
+                    # 期间已被续租、结束或由其他进程回收
+                    continue
+                update_workflow_status(db, record.wf_id, status, error)
+                with self._lock:
+                    self._stats["reclaimed"] += 1
+
+    def _recover_orphaned_workflows(self):
+        """启动时处理没有任务记录、却停留在 running 的工作流（旧版本遗留或任务已丢失）"""
+        with SessionLocal() as db:
+            for workflow in get_orphaned_running_workflows(db):
+                update_workflow_status(
+                    db, workflow.wf_id, WorkflowStatus.FAILED.value, "服务重启导致执行中断"
+                )
+
+    def _retry_delay(self, attempts: int) -> int:
+        delay = settings.WORKFLOW_JOB_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+        return min(delay, settings.WORKFLOW_JOB_RETRY_MAX_SECONDS)
+
+    async def _shutdown(self):
+        if self._scheduler_task is not None:
+            self._scheduler_task.cancel()
+            await asyncio.gather(self._scheduler_task, return_exceptions=True)
+            self._scheduler_task = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        await close_http_client()
+
+
+# 全局工作流执行器（在应用启动/关闭时 start/stop）
+workflow_executor = WorkflowExecutor()
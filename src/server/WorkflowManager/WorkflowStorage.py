@@ -1,12 +1,18 @@
 """工作流存储管理器"""
 import json
 import os
+import tempfile
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from server.config import get_project_data_path, settings
-from server.database import get_workflow_by_wf_id, create_workflow, update_workflow_status, Workflow
+from server.DataManager.MetadataLock import metadata_locks
+from server.database import (
+    get_workflow_by_wf_id, create_workflow, update_workflow_status, Workflow,
+    get_workflow_by_wf_id_async, create_workflow_async, list_project_workflows_async
+)
 from server.models import WorkflowInfo, WorkflowStatus, WorkflowGraphConfig
 
 
@@ -108,6 +114,17 @@ class WorkflowStorage:
         except Exception as e:
             return False, f"创建工作流执行记录失败: {str(e)}", None
 
+    async def create_workflow_execution_async(self, db: AsyncSession, project_id: int, wf_id: str, name: str, llm_model: str = None, prompt_template: str = None) -> Tuple[bool, Optional[str], Optional[Workflow]]:
+        try:
+            existing_workflow = await get_workflow_by_wf_id_async(db, wf_id)
+            if existing_workflow:
+                return False, f"工作流 '{wf_id}' 已存在", None
+            workflow = await create_workflow_async(db, project_id, wf_id, name, llm_model, prompt_template)
+            return True, "工作流执行记录创建成功", workflow
+        except Exception as e:
+            await db.rollback()
+            return False, f"创建工作流执行记录失败: {str(e)}", None
+
     def update_workflow_execution_status(self, db: Session, wf_id: str, status: WorkflowStatus, error_message: str = None) -> Tuple[bool, Optional[str]]:
         try:
             workflow = update_workflow_status(db, wf_id, status.value, error_message)
@@ -124,6 +141,9 @@ class WorkflowStorage:
     def list_workflow_executions(self, db: Session, project_id: int) -> List[Workflow]:
         return db.query(Workflow).filter(Workflow.project_id == project_id).all()
 
+    async def list_workflow_executions_async(self, db: AsyncSession, project_id: int) -> List[Workflow]:
+        return await list_project_workflows_async(db, project_id)
+
     def get_workflow_execution_info(self, db: Session, wf_id: str) -> Optional[WorkflowInfo]:
         """获取工作流执行信息"""
         workflow = get_workflow_by_wf_id(db, wf_id)
@@ -182,6 +202,58 @@ class WorkflowStorage:
         outputs.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return outputs
 
+    def get_summary_coverage_path(self, project_name: str, date: str) -> Path:
+        return get_project_data_path(project_name, date) / "outputs" / "summary_coverage.json"
+
+    def load_summary_coverage(self, project_name: str, date: str, scope: str) -> Optional[Dict[str, Any]]:
+        """读取该日期在指定范围（工作流图 + 模型 + 模板）下最近一次总结覆盖的文件
+
+        返回 {"wf_id", "summary", "files": [{"file_id", "crc32"}], "updated_at"}，没有记录时返回 None。
+        """
+        coverage_path = self.get_summary_coverage_path(project_name, date)
+        if not coverage_path.exists():
+            return None
+        try:
+            with open(coverage_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get(scope)
+        except (IOError, json.JSONDecodeError):
+            return None
+
+    def save_summary_coverage(self, project_name: str, date: str, scope: str, wf_id: str, summary: str, files: List[Dict[str, Any]]) -> bool:
+        """记录本次总结覆盖的文件（file_id + CRC32），供下次增量总结使用
+
+        同一记录的不同 scope 写在同一个文件里，读改写在记录锁内进行，避免并发的工作流互相覆盖。
+        """
+        coverage_path = self.get_summary_coverage_path(project_name, date)
+        tmp_path: Optional[Path] = None
+        try:
+            with metadata_locks.lock(project_name, date):
+                coverage_path.parent.mkdir(parents=True, exist_ok=True)
+                data: Dict[str, Any] = {}
+                if coverage_path.exists():
+                    try:
+                        with open(coverage_path, 'r', encoding='utf-8') as f:
+                            data = json.load(f)
+                    except json.JSONDecodeError:
+                        data = {}
+                data[scope] = {"wf_id": wf_id, "summary": summary, "files": files, "updated_at": datetime.now().isoformat()}
+                fd, tmp_name = tempfile.mkstemp(dir=str(coverage_path.parent), prefix=".coverage_", suffix=".tmp")
+                tmp_path = Path(tmp_name)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, coverage_path)
+                tmp_path = None
+            return True
+        except (IOError, OSError) as e:
+            print(f"保存总结覆盖记录失败: {e}")
+            return False
+        finally:
+            if tmp_path is not None:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+
     def get_workflow_output_by_wf_id(self, project_name: str, wf_id: str) -> Optional[Dict[str, Any]]:
         """
         根据 wf_id 查找对应的输出结果。
@@ -0,0 +1,104 @@
+"""工作流输出流
+
+工作流在执行器线程的事件循环中运行，SSE 接口在 API 事件循环中等待。这里按 wf_id 维护频道：
+执行引擎发布事件（LLM 节点的 token、完成、失败），订阅者各自持有一个 asyncio.Queue，
+事件通过 call_soon_threadsafe 投递到订阅者所在的事件循环。
+频道缓存本次执行已发布的事件，执行中途连接的订阅者先收到已生成的部分。
+
+事件格式 {"event": ..., ...}：
+- running：开始（或重试）执行，之前收到的 token 作废
+- node：LLM 节点开始生成 {"node"}
+- token：生成的文本片段 {"node", "text"}
+- error：本次执行失败 {"message"}，执行器可能稍后重试
+- done：执行成功，输出已保存 {"summary"}（终止事件）
+- failed：不再重试 {"message"}（终止事件）
+"""
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple
+
+# 订阅者收到这些事件后结束
+TERMINAL_EVENTS = ("done", "failed")
+
+
+class _Channel:
+    def __init__(self):
+        self.active = False
+        self.events: List[Dict[str, Any]] = []
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+
+class WorkflowStreamHub:
+    """按 wf_id 分发工作流事件（线程安全）"""
+
+    def __init__(self):
+        self._channels: Dict[str, _Channel] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, wf_id: str):
+        """工作流开始执行：清空上一次执行的事件"""
+        with self._lock:
+            channel = self._channels.setdefault(wf_id, _Channel())
+            channel.active = True
+            channel.events = []
+        self.publish(wf_id, {"event": "running"})
+
+    def publish(self, wf_id: str, event: Dict[str, Any]):
+        """发布事件（频道不存在时忽略）"""
+        with self._lock:
+            channel = self._channels.get(wf_id)
+            if channel is None:
+                return
+            channel.events.append(event)
+            subscribers = list(channel.subscribers)
+        self._deliver(subscribers, event)
+
+    def finish(self, wf_id: str, event: Dict[str, Any]):
+        """发布终止事件并关闭频道"""
+        with self._lock:
+            channel = self._channels.pop(wf_id, None)
+            if channel is None:
+                return
+            subscribers = list(channel.subscribers)
+        self._deliver(subscribers, event)
+
+    def subscribe(self, wf_id: str) -> asyncio.Queue:
+        """订阅工作流事件（须在事件循环中调用），队列中先放入本次执行已发布的事件"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            channel = self._channels.setdefault(wf_id, _Channel())
+            for event in channel.events:
+                queue.put_nowait(event)
+            channel.subscribers.append((loop, queue))
+        return queue
+
+    def unsubscribe(self, wf_id: str, queue: asyncio.Queue):
+        with self._lock:
+            channel = self._channels.get(wf_id)
+            if channel is None:
+                return
+            channel.subscribers = [(lp, q) for lp, q in channel.subscribers if q is not queue]
+            # 仅由订阅者创建、尚未开始执行的频道随最后一个订阅者移除
+            if not channel.active and not channel.subscribers:
+                self._channels.pop(wf_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "active": sum(1 for c in self._channels.values() if c.active),
+                "subscribers": sum(len(c.subscribers) for c in self._channels.values()),
+            }
+
+    def _deliver(self, subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]], event: Dict[str, Any]):
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # 订阅者的事件循环已关闭
+                pass
+
+
+# 全局工作流输出流
+workflow_stream = WorkflowStreamHub()
@@ -18,6 +18,20 @@ class Settings(BaseSettings):
     
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./lib/server/database.db"
+    DB_POOL_SIZE: int = 10  # 连接池常驻连接数
+    DB_MAX_OVERFLOW: int = 20  # 连接池允许的额外连接数
+    DB_POOL_TIMEOUT: int = 30  # 等待空闲连接的超时（秒）
+    DB_POOL_RECYCLE: int = -1  # 连接回收周期（秒），-1 表示不回收
+    DB_POOL_PRE_PING: bool = False  # 取出连接前检测可用性
+    
+    # SQLite 性能配置（每个新连接建立时通过 PRAGMA 应用）
+    SQLITE_TUNING_ENABLED: bool = True
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL 下读写互不阻塞
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL 模式下 NORMAL 足以保证一致性
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 遇到写锁时等待而不是立即报 database is locked
+    SQLITE_CACHE_SIZE: int = -64000  # 页缓存，负数表示 KiB（约 64MB）
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # 内存映射读取大小，0 表示禁用
+    SQLITE_TEMP_STORE: str = "MEMORY"  # 临时表/排序使用内存
     
     # API配置
     API_HOST: str = "0.0.0.0"
@@ -32,9 +46,44 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_BASE_URL: Optional[str] = None
     DEFAULT_LLM_MODEL: str = "gpt-3.5-turbo"
+    LLM_SUMMARY_MODE: str = "stuff"  # 长文本总结方式：stuff（整段）/ map_reduce / refine，可在 LLM 节点 params.mode 中覆盖
+    LLM_CHUNK_TOKENS: int = 3000  # map_reduce / refine 每个分块的 token 预算
+    LLM_MAP_CONCURRENCY: int = 4  # map 阶段同时请求的分块数
+    LLM_CONTEXT_TOKENS: Optional[int] = None  # 模型上下文窗口，留空时按模型名推断
+    LLM_DEFAULT_CONTEXT_TOKENS: int = 8192  # 无法按模型名推断时使用的上下文窗口
+    LLM_USE_TIKTOKEN: bool = True  # 使用 tiktoken 计数 token（需可用的词表缓存），关闭时使用启发式估算
+    LLM_CACHE_ENABLED: bool = True  # 缓存相同模型/参数/提示的 LLM 响应
+    LLM_CACHE_PATH: Optional[Path] = None  # 默认 USRDATA_DIR/.llm_cache.sqlite3
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 缓存有效期
+    LLM_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 缓存总大小上限，超出时按最近使用淘汰
+    LLM_MODELS_CACHE_TTL_SECONDS: int = 300  # /v1/models 发现结果的缓存时间
+    LLM_MODELS_RETRY_SECONDS: float = 30.0  # 模型发现失败后，间隔多久再次自动尝试
+    LLM_MODEL_INSTANCES: int = 8  # 缓存的 ChatOpenAI 实例数上限，超出时按最近使用淘汰
+    LLM_MAX_IN_FLIGHT: int = 8  # 同时进行的 LLM 请求数上限（所有模型共享），可在 llm_config.json 的 max_in_flight 中覆盖
+    LLM_RATE_LIMIT_RPM: Optional[int] = None  # 每个模型每分钟请求数上限，可在 llm_config.json 的 rate_limits 中按模型设置
+    LLM_RATE_LIMIT_TPM: Optional[int] = None  # 每个模型每分钟 token 数上限（按输入估算加输出上限预留）
+    LLM_RETRY_MAX_ATTEMPTS: int = 3  # 单次 LLM 请求遇到临时错误（429/5xx/超时/连接错误）时的最大尝试次数
+    LLM_RETRY_BASE_SECONDS: float = 1.0  # 重试退避基数（按 2^(n-1) 递增，完全抖动）
+    LLM_RETRY_MAX_SECONDS: float = 30.0  # 单次退避上限
+    LLM_RETRY_DEADLINE_SECONDS: float = 300.0  # 单次 LLM 请求（含全部重试）的总时限
+    LLM_HEDGE_ENABLED: bool = False  # 请求延迟超过近期分位数时发出对冲请求（会增加请求量）
+    LLM_HEDGE_PERCENTILE: float = 95.0  # 触发对冲的延迟分位数
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # 模型延迟样本不足时不对冲
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 2.0  # 对冲等待时间下限
+    LLM_HTTP_TIMEOUT: float = 10.0  # 共享 HTTP 客户端的默认请求超时（秒），用于模型发现等短请求
+    LLM_REQUEST_TIMEOUT: float = 600.0  # 模型对话请求的超时（秒），长文本生成耗时较长，单独设置
+    LLM_HTTP_MAX_CONNECTIONS: int = 20  # 共享 HTTP 客户端的最大连接数
+    LLM_HTTP_MAX_KEEPALIVE: int = 10  # 保持复用的空闲连接数
     
     # 文件上传配置
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 流式上传分块大小 1MB
+    UPLOAD_BATCH_WORKERS: int = 4  # 批量上传时并发写入的文件数
+    IO_EXECUTOR_WORKERS: int = 8  # 文件/元数据阻塞I/O线程池大小
+    METADATA_CACHE_SIZE: int = 256  # record_meta.json 解析结果缓存条数，0 表示禁用
+    METADATA_FILE_LOCK: bool = False  # 元数据跨进程文件锁（API_WORKERS > 1 时自动启用）
+    FILE_INDEX_ENABLED: bool = True  # 上传/更新/删除时同步维护 file_records 索引
+    FILE_LIST_MAX_LIMIT: int = 1000  # 文件列表接口单页最大条数
     ALLOWED_FILE_TYPES: list[str] = [
         "application/pdf",
         "image/jpeg",
@@ -46,6 +95,28 @@ class Settings(BaseSettings):
         "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     ]
     
+    # 工作流执行配置
+    WORKFLOW_MAX_CONCURRENCY: int = 2  # 同时执行的工作流数量
+    WORKFLOW_QUEUE_SIZE: int = 32  # 等待执行的工作流数量上限，超出时接口返回 429
+    WORKFLOW_JOB_MAX_ATTEMPTS: int = 3  # 工作流失败后的最大执行次数（含首次）
+    WORKFLOW_JOB_LEASE_SECONDS: int = 60  # 任务租约时长，超时未续租视为 worker 已崩溃
+    WORKFLOW_JOB_HEARTBEAT_SECONDS: int = 15  # 续租间隔
+    WORKFLOW_JOB_RETRY_BASE_SECONDS: int = 10  # 重试退避基数（按 2^(n-1) 递增）
+    WORKFLOW_JOB_RETRY_MAX_SECONDS: int = 600  # 重试退避上限
+    WORKFLOW_SCHEDULER_POLL_SECONDS: float = 2.0  # 调度器轮询间隔
+    WORKFLOW_NODE_CONCURRENCY: int = 4  # 单个工作流内同时执行的节点数
+    WORKFLOW_STREAM_ENABLED: bool = True  # LLM 节点以流式方式生成，并通过 workflow_stream 接口推送
+    WORKFLOW_STREAM_KEEPALIVE_SECONDS: int = 15  # 流式接口无事件时发送心跳并检查工作流状态的间隔
+    WORKFLOW_INCREMENTAL_SUMMARY: bool = False  # 默认是否增量总结（只处理上次输出后新增的文件），可在工作流配置中单独设置
+    
+    # 文本提取配置
+    EXTRACTION_WORKERS: int = 2  # PDF解析/OCR 进程池大小，0 表示在主进程内执行
+    EXTRACTION_CACHE_ENABLED: bool = True  # 按文件内容哈希缓存 PDF/OCR/Excel 提取结果
+    EXTRACTION_CACHE_DIR: Optional[Path] = None  # 默认 USRDATA_DIR/.extraction_cache
+    EXTRACTION_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # 缓存总大小上限，超出时按最近使用淘汰
+    INGEST_ENABLED: bool = True  # 文件上传后在后台预先提取文本
+    INGEST_CONCURRENCY: int = 2  # 后台预提取同时处理的文件数
+    
     # OCR配置
     OCR_LANGUAGE: str = "ch"  # 中文
     OCR_USE_GPU: bool = False
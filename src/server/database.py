@@ -1,21 +1,123 @@
 """数据库连接和模型定义"""
-from datetime import datetime
-from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, ForeignKey
+import base64
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, List, Tuple
+from sqlalchemy import create_engine, event, inspect, select, text, Column, Integer, String, DateTime, Text, Boolean, ForeignKey, Index, and_, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, relationship, Session
 from sqlalchemy.sql import func
 from server.config import settings
 
+
+def _is_sqlite_memory(database_url: str) -> bool:
+    return database_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in database_url
+
+
+def apply_sqlite_pragmas(dbapi_connection):
+    """在新建的 SQLite 连接上应用性能配置"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA temp_store = {settings.SQLITE_TEMP_STORE}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(database_url: str = None, sqlite_tuning: bool = None) -> Engine:
+    """创建数据库引擎
+    
+    SQLite 文件库使用 Settings 中的连接池配置，并在每个新连接上应用 PRAGMA 性能配置；
+    sqlite_tuning=False 时保持默认行为（用于对比测试）。
+    """
+    database_url = database_url or settings.DATABASE_URL
+    if sqlite_tuning is None:
+        sqlite_tuning = settings.SQLITE_TUNING_ENABLED
+    is_sqlite = database_url.startswith("sqlite")
+
+    engine_kwargs = {}
+    if is_sqlite:
+        connect_args = {"check_same_thread": False}
+        if sqlite_tuning:
+            # sqlite3 模块自身的锁等待超时，与 busy_timeout 保持一致
+            connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        engine_kwargs["connect_args"] = connect_args
+    if not (is_sqlite and _is_sqlite_memory(database_url)):
+        engine_kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    db_engine = create_engine(database_url, **engine_kwargs)
+
+    if is_sqlite and sqlite_tuning:
+        @event.listens_for(db_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection)
+
+    return db_engine
+
+
+def to_async_database_url(database_url: str) -> str:
+    """将同步数据库URL转换为异步驱动URL（sqlite -> sqlite+aiosqlite）"""
+    if database_url.startswith("sqlite+aiosqlite"):
+        return database_url
+    if database_url.startswith("sqlite"):
+        return "sqlite+aiosqlite" + database_url[len("sqlite"):]
+    return database_url
+
+
+def create_async_db_engine(database_url: str = None, sqlite_tuning: bool = None) -> AsyncEngine:
+    """创建异步数据库引擎（连接池与 SQLite PRAGMA 配置与同步引擎一致）"""
+    database_url = to_async_database_url(database_url or settings.DATABASE_URL)
+    if sqlite_tuning is None:
+        sqlite_tuning = settings.SQLITE_TUNING_ENABLED
+    is_sqlite = database_url.startswith("sqlite")
+
+    engine_kwargs = {}
+    if is_sqlite and sqlite_tuning:
+        engine_kwargs["connect_args"] = {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if not (is_sqlite and _is_sqlite_memory(database_url)):
+        engine_kwargs.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    db_engine = create_async_engine(database_url, **engine_kwargs)
+
+    if is_sqlite and sqlite_tuning:
+        @event.listens_for(db_engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection)
+
+    return db_engine
+
+
 # 创建数据库引擎
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_db_engine()
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步引擎与会话工厂（供 async 路由使用，不阻塞事件循环）
+# expire_on_commit=False：提交后仍可直接读取对象属性，避免在异步上下文中触发隐式加载
+async_engine = create_async_db_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # 创建基础模型类
 Base = declarative_base()
 
@@ -60,22 +162,29 @@ class Workflow(Base):
 class FileRecord(Base):
     """文件记录表（用于快速索引）"""
     __tablename__ = "file_records"
+    __table_args__ = (
+        # 按项目列出某天的有效文件：等值 (project_id, is_active) + uploaded_at 范围/排序
+        Index("ix_file_records_project_active_uploaded", "project_id", "is_active", "uploaded_at"),
+        # 按记录日期（files/{date} 目录）列出文件，同一天内按 uploaded_at 排序/分页
+        Index("ix_file_records_project_active_date", "project_id", "is_active", "record_date", "uploaded_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
     file_id = Column(String(50), index=True, nullable=False)  # 如: f_ab12
     filename = Column(String(500), nullable=False)
-    stored_path = Column(String(1000), nullable=False)
+    stored_path = Column(String(1000), index=True, nullable=False)  # 同一文件可出现在多个日期，以存储路径区分
+    record_date = Column(String(10))  # 所属记录日期 YYYY-MM-DD（stored_path 所在的 files/{date} 目录）
     original_name = Column(String(500))
-    crc32 = Column(String(8))
-    mime_type = Column(String(100))
+    crc32 = Column(String(8), index=True)
+    mime_type = Column(String(100), index=True)
     size_bytes = Column(Integer)
     uploaded_at = Column(DateTime, default=func.now())
     source = Column(String(50))  # manual_upload, clipboard, screenshot, crawler
     tags = Column(Text)  # JSON字符串
     language = Column(String(10))
-    status_ocr = Column(String(20), default="pending")  # pending, done, failed
-    status_parsed = Column(String(20), default="pending")  # pending, done, failed
+    status_ocr = Column(String(20), default="pending")  # pending, done, failed, skipped
+    status_parsed = Column(String(20), default="pending")  # pending, done, failed, skipped
     embedding_id = Column(String(100))
     notes = Column(Text)
     is_active = Column(Boolean, default=True)
@@ -83,6 +192,51 @@ class FileRecord(Base):
     
     # 关系
     project = relationship("Project")
+    tag_items = relationship("FileRecordTag", back_populates="file_record", cascade="all, delete-orphan")
+
+
+class FileRecordTag(Base):
+    """文件标签表（FileRecord.tags 的展开，用于按标签索引查询）"""
+    __tablename__ = "file_record_tags"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_record_id = Column(Integer, ForeignKey("file_records.id", ondelete="CASCADE"), index=True, nullable=False)
+    tag = Column(String(100), index=True, nullable=False)
+    
+    # 关系
+    file_record = relationship("FileRecord", back_populates="tag_items")
+
+
+class WorkflowJobRecord(Base):
+    """工作流任务队列表（持久化待执行/执行中的工作流，支持租约、心跳和重试）"""
+    __tablename__ = "workflow_jobs"
+    __table_args__ = (
+        # 调度器按 (status, next_run_at) 取到期任务、回收过期租约
+        Index("ix_workflow_jobs_status_next_run", "status", "next_run_at"),
+        Index("ix_workflow_jobs_status_lease", "status", "lease_expires_at"),
+        # 每个工作流最多一个未结束的任务，并发提交时由数据库拒绝重复入队
+        Index(
+            "ux_workflow_jobs_active_wf_id", "wf_id", unique=True,
+            sqlite_where=text("status IN ('pending', 'running')"),
+            postgresql_where=text("status IN ('pending', 'running')"),
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    wf_id = Column(String(50), index=True, nullable=False)
+    project_name = Column(String(100), nullable=False)
+    date = Column(String(10), nullable=False)
+    payload = Column(Text)  # JSON字符串：files、custom_prompt
+    status = Column(String(20), default="pending")  # pending, running, success, failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    next_run_at = Column(DateTime, default=func.now())
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
 
 def get_db() -> Session:
@@ -94,9 +248,66 @@ def get_db() -> Session:
         db.close()
 
 
+async def get_async_db() -> AsyncSession:
+    """获取异步数据库会话"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def dispose_async_engine():
+    """关闭异步引擎的连接池（应用退出时调用）"""
+    await async_engine.dispose()
+
+
 def init_database():
     """初始化数据库"""
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _backfill_record_dates()
+    # create_all 不会为已存在的表补建新增索引，这里逐个检查补齐
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                # 如唯一索引与已有数据冲突：不影响启动，清理数据后重启即可补建
+                print(f"创建索引 {index.name} 失败: {e}")
+
+
+def _add_missing_columns():
+    """create_all 不会为已存在的表补建新增列，这里补齐（只补可为空的列）"""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    print(f"无法为已有表 {table.name} 补建非空列 {column.name}")
+                    continue
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN "
+                    f"{preparer.quote(column.name)} {column.type.compile(dialect=engine.dialect)}"
+                ))
+
+
+def record_date_of(stored_path: str) -> str:
+    """文件所属的记录日期：存储路径所在的 files/{date} 目录名"""
+    return Path(stored_path).parent.name
+
+
+def _backfill_record_dates():
+    """为补建 record_date 列之前写入的文件记录填充记录日期"""
+    with SessionLocal() as db:
+        records = db.query(FileRecord).filter(FileRecord.record_date.is_(None)).all()
+        for file_record in records:
+            file_record.record_date = record_date_of(file_record.stored_path)
+        if records:
+            db.commit()
 
 
 def get_project_by_name(db: Session, project_name: str) -> Optional[Project]:
@@ -165,17 +376,135 @@ def update_workflow_status(
     return workflow
 
 
-def get_project_files(db: Session, project_id: int, date: str = None) -> List[FileRecord]:
-    """获取项目文件列表"""
+async def get_project_by_name_async(db: AsyncSession, project_name: str) -> Optional[Project]:
+    """根据项目名获取项目（异步）"""
+    result = await db.execute(
+        select(Project).where(Project.name == project_name, Project.is_active == True)
+    )
+    return result.scalars().first()
+
+
+async def list_active_projects_async(db: AsyncSession) -> List[Project]:
+    """列出所有激活项目（异步）"""
+    result = await db.execute(select(Project).where(Project.is_active == True))
+    return list(result.scalars().all())
+
+
+async def create_project_async(db: AsyncSession, name: str, display_name: str, description: str = None) -> Project:
+    """创建新项目（异步）"""
+    project = Project(
+        name=name,
+        display_name=display_name,
+        description=description
+    )
+    db.add(project)
+    await db.commit()
+    await db.refresh(project)
+    return project
+
+
+async def get_workflow_by_wf_id_async(db: AsyncSession, wf_id: str) -> Optional[Workflow]:
+    """根据工作流ID获取工作流（异步）"""
+    result = await db.execute(select(Workflow).where(Workflow.wf_id == wf_id))
+    return result.scalars().first()
+
+
+async def list_project_workflows_async(db: AsyncSession, project_id: int) -> List[Workflow]:
+    """列出项目的所有工作流（异步）"""
+    result = await db.execute(select(Workflow).where(Workflow.project_id == project_id))
+    return list(result.scalars().all())
+
+
+async def create_workflow_async(
+    db: AsyncSession,
+    project_id: int,
+    wf_id: str,
+    name: str,
+    llm_model: str = None,
+    prompt_template: str = None
+) -> Workflow:
+    """创建新工作流（异步）"""
+    workflow = Workflow(
+        project_id=project_id,
+        wf_id=wf_id,
+        name=name,
+        llm_model=llm_model,
+        prompt_template=prompt_template
+    )
+    db.add(workflow)
+    await db.commit()
+    await db.refresh(workflow)
+    return workflow
+
+
+async def update_workflow_status_async(
+    db: AsyncSession,
+    wf_id: str,
+    status: str,
+    error_message: str = None
+) -> Optional[Workflow]:
+    """更新工作流状态（异步）"""
+    workflow = await get_workflow_by_wf_id_async(db, wf_id)
+    if workflow:
+        workflow.status = status
+        if status == "running":
+            workflow.started_at = datetime.now()
+        elif status in ["success", "failed"]:
+            workflow.finished_at = datetime.now()
+        if error_message:
+            workflow.error_message = error_message
+        await db.commit()
+        await db.refresh(workflow)
+    return workflow
+
+
+def get_project_files(
+    db: Session,
+    project_id: int,
+    date: str = None,
+    limit: int = None,
+    cursor: Tuple[datetime, int] = None
+) -> List[FileRecord]:
+    """获取项目文件列表
+    
+    date 为 YYYY-MM-DD，按文件所属的记录日期过滤（与上传时间无关，如补传到旧日期的文件），可走复合索引；
+    limit/cursor 为键集分页，cursor 是上一页最后一条记录的 (uploaded_at, id)。
+    """
     query = db.query(FileRecord).filter(
         FileRecord.project_id == project_id,
         FileRecord.is_active == True
     )
     if date:
-        query = query.filter(FileRecord.uploaded_at.like(f"{date}%"))
+        # 校验日期格式，格式错误时抛出 ValueError
+        datetime.strptime(date, "%Y-%m-%d")
+        query = query.filter(FileRecord.record_date == date)
+    if cursor:
+        cursor_time, cursor_id = cursor
+        query = query.filter(or_(
+            FileRecord.uploaded_at > cursor_time,
+            and_(FileRecord.uploaded_at == cursor_time, FileRecord.id > cursor_id)
+        ))
+    query = query.order_by(FileRecord.uploaded_at, FileRecord.id)
+    if limit:
+        query = query.limit(limit)
     return query.all()
 
 
+def encode_file_cursor(file_record: FileRecord) -> str:
+    """将文件记录编码为分页游标"""
+    raw = json.dumps([file_record.uploaded_at.isoformat(), file_record.id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_file_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        uploaded_at, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(uploaded_at), int(record_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
 def create_file_record(
     db: Session,
     project_id: int,
@@ -192,13 +521,12 @@ def create_file_record(
     notes: str = None
 ) -> FileRecord:
     """创建文件记录"""
-    import json
-    
     file_record = FileRecord(
         project_id=project_id,
         file_id=file_id,
         filename=filename,
         stored_path=stored_path,
+        record_date=record_date_of(stored_path),
         original_name=original_name,
         crc32=crc32,
         mime_type=mime_type,
@@ -223,3 +551,239 @@ def retire_file_record(db: Session, file_id: str) -> Optional[FileRecord]:
         db.commit()
         db.refresh(file_record)
     return file_record
+
+
+def get_file_record_by_path(db: Session, project_id: int, stored_path: str) -> Optional[FileRecord]:
+    """根据存储路径获取文件记录"""
+    return db.query(FileRecord).filter(
+        FileRecord.project_id == project_id,
+        FileRecord.stored_path == stored_path
+    ).first()
+
+
+def upsert_file_record(
+    db: Session,
+    project_id: int,
+    file_id: str,
+    filename: str,
+    stored_path: str,
+    original_name: str = None,
+    crc32: str = None,
+    mime_type: str = None,
+    size_bytes: int = None,
+    uploaded_at: datetime = None,
+    source: str = "manual_upload",
+    tags: List[str] = None,
+    language: str = None,
+    status_ocr: str = "pending",
+    status_parsed: str = "pending",
+    notes: str = None,
+    is_active: bool = True,
+    retired_at: datetime = None
+) -> FileRecord:
+    """按 (project_id, stored_path) 插入或更新文件记录（只 flush，不提交）"""
+    file_record = get_file_record_by_path(db, project_id, stored_path)
+    if file_record is None:
+        file_record = FileRecord(project_id=project_id, stored_path=stored_path)
+        db.add(file_record)
+    file_record.record_date = record_date_of(stored_path)
+    
+    file_record.file_id = file_id
+    file_record.filename = filename
+    file_record.original_name = original_name
+    file_record.crc32 = crc32
+    file_record.mime_type = mime_type
+    file_record.size_bytes = size_bytes
+    file_record.uploaded_at = uploaded_at or datetime.now()
+    file_record.source = source
+    file_record.tags = json.dumps(tags, ensure_ascii=False) if tags else None
+    file_record.language = language
+    file_record.status_ocr = status_ocr
+    file_record.status_parsed = status_parsed
+    file_record.notes = notes
+    file_record.is_active = is_active
+    file_record.retired_at = retired_at
+    file_record.tag_items = [FileRecordTag(tag=tag) for tag in (tags or [])]
+    
+    db.flush()
+    return file_record
+
+
+def find_file_records(
+    db: Session,
+    project_id: int,
+    file_id: str = None,
+    tag: str = None,
+    mime_type: str = None,
+    crc32: str = None,
+    include_retired: bool = False
+) -> List[FileRecord]:
+    """按文件ID、标签、MIME类型或CRC32查询文件记录（均走索引）"""
+    query = db.query(FileRecord).filter(FileRecord.project_id == project_id)
+    if not include_retired:
+        query = query.filter(FileRecord.is_active == True)
+    if file_id:
+        query = query.filter(FileRecord.file_id == file_id)
+    if mime_type:
+        query = query.filter(FileRecord.mime_type == mime_type)
+    if crc32:
+        query = query.filter(FileRecord.crc32 == crc32)
+    if tag:
+        query = query.join(FileRecordTag).filter(FileRecordTag.tag == tag)
+    return query.all()
+
+
+def delete_project_file_records(db: Session, project_id: int) -> int:
+    """删除项目的全部文件记录（只 flush，不提交）"""
+    records = db.query(FileRecord).filter(FileRecord.project_id == project_id).all()
+    for record in records:
+        db.delete(record)
+    db.flush()
+    return len(records)
+
+
+def enqueue_workflow_job(
+    db: Session,
+    wf_id: str,
+    project_name: str,
+    date: str,
+    payload: dict = None,
+    max_attempts: int = 3
+) -> WorkflowJobRecord:
+    """将工作流加入任务队列
+    
+    工作流已有未结束的任务时抛出 IntegrityError（由 ux_workflow_jobs_active_wf_id 保证）。
+    """
+    job = WorkflowJobRecord(
+        wf_id=wf_id,
+        project_name=project_name,
+        date=date,
+        payload=json.dumps(payload or {}, ensure_ascii=False),
+        status="pending",
+        attempts=0,
+        max_attempts=max_attempts,
+        next_run_at=datetime.now()
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
+    db.refresh(job)
+    return job
+
+
+def get_active_workflow_job(db: Session, wf_id: str) -> Optional[WorkflowJobRecord]:
+    """获取工作流尚未结束的任务（pending 或 running）"""
+    return db.query(WorkflowJobRecord).filter(
+        WorkflowJobRecord.wf_id == wf_id,
+        WorkflowJobRecord.status.in_(["pending", "running"])
+    ).first()
+
+
+def count_workflow_jobs(db: Session) -> dict:
+    """按状态统计任务数量"""
+    rows = db.query(WorkflowJobRecord.status, func.count(WorkflowJobRecord.id)).group_by(
+        WorkflowJobRecord.status
+    ).all()
+    return {status: count for status, count in rows}
+
+
+def claim_workflow_job(db: Session, worker_id: str, lease_seconds: int) -> Optional[WorkflowJobRecord]:
+    """领取一个到期的 pending 任务并加租约
+    
+    先查候选再做带状态条件的 UPDATE，多进程同时领取时只有一个能成功。
+    """
+    now = datetime.now()
+    candidate = db.query(WorkflowJobRecord).filter(
+        WorkflowJobRecord.status == "pending",
+        WorkflowJobRecord.next_run_at <= now
+    ).order_by(WorkflowJobRecord.next_run_at, WorkflowJobRecord.id).first()
+    if not candidate:
+        return None
+    
+    claimed = db.query(WorkflowJobRecord).filter(
+        WorkflowJobRecord.id == candidate.id,
+        WorkflowJobRecord.status == "pending"
+    ).update({
+        WorkflowJobRecord.status: "running",
+        WorkflowJobRecord.attempts: WorkflowJobRecord.attempts + 1,
+        WorkflowJobRecord.lease_owner: worker_id,
+        WorkflowJobRecord.lease_expires_at: now + timedelta(seconds=lease_seconds),
+        WorkflowJobRecord.heartbeat_at: now
+    }, synchronize_session=False)
+    db.commit()
+    if not claimed:
+        return None
+    db.refresh(candidate)
+    return candidate
+
+
+def heartbeat_workflow_job(db: Session, job_id: int, worker_id: str, lease_seconds: int) -> bool:
+    """续租，返回 False 表示租约已不属于当前 worker"""
+    now = datetime.now()
+    renewed = db.query(WorkflowJobRecord).filter(
+        WorkflowJobRecord.id == job_id,
+        WorkflowJobRecord.status == "running",
+        WorkflowJobRecord.lease_owner == worker_id
+    ).update({
+        WorkflowJobRecord.lease_expires_at: now + timedelta(seconds=lease_seconds),
+        WorkflowJobRecord.heartbeat_at: now
+    }, synchronize_session=False)
+    db.commit()
+    return bool(renewed)
+
+
+def finish_workflow_job(
+    db: Session,
+    job_id: int,
+    status: str,
+    error_message: str = None,
+    next_run_at: datetime = None,
+    lease_owner: str = None
+) -> Optional[WorkflowJobRecord]:
+    """结束一次执行：status 为 success/failed，或 pending（配合 next_run_at 重试）
+    
+    传入 lease_owner 时只在任务仍由该租约持有（running 且 lease_owner 一致）时更新，
+    租约已被回收或转给其他执行时返回 None。
+    """
+    query = db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id)
+    if lease_owner is not None:
+        query = query.filter(
+            WorkflowJobRecord.status == "running",
+            WorkflowJobRecord.lease_owner == lease_owner
+        )
+    values = {
+        WorkflowJobRecord.status: status,
+        WorkflowJobRecord.lease_owner: None,
+        WorkflowJobRecord.lease_expires_at: None
+    }
+    if next_run_at:
+        values[WorkflowJobRecord.next_run_at] = next_run_at
+    if error_message:
+        values[WorkflowJobRecord.last_error] = error_message
+    updated = query.update(values, synchronize_session=False)
+    db.commit()
+    if not updated:
+        return None
+    return db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id).first()
+
+
+def get_expired_workflow_jobs(db: Session) -> List[WorkflowJobRecord]:
+    """获取租约已过期的执行中任务（worker 崩溃或进程重启后遗留）"""
+    return db.query(WorkflowJobRecord).filter(
+        WorkflowJobRecord.status == "running",
+        WorkflowJobRecord.lease_expires_at < datetime.now()
+    ).all()
+
+
+def get_orphaned_running_workflows(db: Session) -> List[Workflow]:
+    """获取状态为 running 但没有未结束任务的工作流"""
+    active_wf_ids = db.query(WorkflowJobRecord.wf_id).filter(
+        WorkflowJobRecord.status.in_(["pending", "running"])
+    )
+    return db.query(Workflow).filter(
+        Workflow.status == "running",
+        Workflow.wf_id.notin_(active_wf_ids)
+    ).all()
@@ -10,10 +10,17 @@ if str(_src_dir) not in sys.path:
 if str(_project_root) not in sys.path:
     sys.path.insert(0, str(_project_root))
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from server.config import settings, ensure_directories
-from server.database import init_database
+from server.database import init_database, dispose_async_engine
+from server.DataManager.AsyncDataManager import shutdown_io_executor
+from server.DataManager.IngestPipeline import ingest_pipeline
+from server.WorkflowManager.WorkflowExecutor import workflow_executor
+from server.ToolManager.ExtractionPool import shutdown_extraction_pool
+from server.LLMManager.LLMService import llm_service
+from server.LLMManager.HttpClient import close_http_client
 from server.routers.tool_router import router as tool_router
 from server.routers.project_router import router as project_router
 from server.routers.data_router import router as data_router
@@ -39,6 +46,20 @@ app.include_router(llm_router)
 async def on_startup():
     ensure_directories()
     init_database()
+    ingest_pipeline.start()
+    workflow_executor.start()
+    # 在后台发现并初始化 LLM 模型，不阻塞启动
+    app.state.llm_warmup = asyncio.create_task(llm_service.ensure_models())
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    workflow_executor.stop()
+    ingest_pipeline.stop()
+    shutdown_extraction_pool()
+    shutdown_io_executor()
+    await close_http_client()
+    await dispose_async_engine()
 
 
 @app.get("/health")
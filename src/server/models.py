@@ -26,6 +26,7 @@ class FileStatus(str, Enum):
     PENDING = "pending"
     DONE = "done"
     FAILED = "failed"
+    SKIPPED = "skipped"  # 该处理步骤不适用于此文件类型
 
 
 # 基础响应模型
@@ -51,6 +52,7 @@ class FileInfo(BaseModel):
     stored_path: str = Field(description="存储路径")
     original_name: Optional[str] = Field(default=None, description="原始文件名")
     crc32: Optional[str] = Field(default=None, description="CRC32校验码")
+    sha256: Optional[str] = Field(default=None, description="SHA-256内容哈希（blob存储键）")
     mime: Optional[str] = Field(default=None, description="MIME类型")
     size_bytes: Optional[int] = Field(default=None, description="文件大小（字节）")
     uploaded_at: datetime = Field(description="上传时间")
@@ -159,7 +161,7 @@ class WorkflowNode(BaseModel):
     tool_name: Optional[str] = None
     params: Dict[str, Any] = Field(default_factory=dict)
     input_map: Dict[str, str] = Field(default_factory=dict)  # from context keys
-    output_key: str = Field(default="result")
+    output_key: str = Field(default="result")  # 结果写入的 context 键，保留默认值时使用节点 id
 
 
 class WorkflowEdge(BaseModel):
@@ -172,6 +174,8 @@ class WorkflowGraphConfig(BaseModel):
     name: str
     llm_model: Optional[str] = None
     prompt_template: Optional[str] = None
+    max_concurrency: Optional[int] = None  # 同时执行的节点数上限，默认使用 WORKFLOW_NODE_CONCURRENCY
+    incremental: Optional[bool] = None  # 增量总结，默认使用 WORKFLOW_INCREMENTAL_SUMMARY
     nodes: List[WorkflowNode]
     edges: List[WorkflowEdge]
 
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, UploadFile, File, Form, Depends, Response
 from typing import Any, Dict, Optional, List
 
-from server.DataManager.FileManager import FileManager
-from server.DataManager.MetadataManager import MetadataManager
+from server.DataManager.AsyncDataManager import AsyncFileManager, AsyncMetadataManager, run_io
+from server.DataManager.FileIndex import file_index
 from server.ProjectManager.ProjectManager import ProjectManager
+from server.config import settings
 from server.models import BaseResponse, FileSource
 
 router = APIRouter(prefix="/project/{project}/data", tags=["data"])
 
-file_manager = FileManager()
-metadata_manager = MetadataManager()
+# 文件/元数据操作在I/O线程池中执行，避免阻塞事件循环
+file_manager = AsyncFileManager()
+metadata_manager = AsyncMetadataManager()
 project_manager = ProjectManager()
 
 
@@ -22,14 +24,48 @@ async def upload_files(
     tags: str = Form(""),
     notes: str = Form("")
 ) -> Dict[str, Any]:
-    content = await file.read()
     tag_list = [t for t in tags.split(',') if t.strip()] if tags else []
-    ok, msg, info = file_manager.upload_file(project, date, content, file.filename, FileSource(source), tag_list, notes, False)
+    # 直接从 UploadFile 的底层文件对象分块读取，避免整文件读入内存
+    ok, msg, info = await file_manager.upload_file_stream(project, date, file.file, file.filename, FileSource(source), tag_list, notes, False)
     if not ok:
         return {"code": 1, "status": "error", "message": msg or "upload failed", "data": None}
     return {"code": 0, "status": "ok", "message": "uploaded", "data": info.dict()}
 
 
+@router.post("/{date}/upload_files_batch", response_model=BaseResponse)
+async def upload_files_batch(
+    project: str,
+    date: str,
+    files: List[UploadFile] = File(...),
+    source: str = Form("manual_upload"),
+    tags: str = Form(""),
+    notes: str = Form(""),
+    replace_existing: bool = Form(False)
+) -> Dict[str, Any]:
+    """批量上传文件：并发写入，所有文件的元数据只提交一次，返回逐个文件的结果"""
+    tag_list = [t for t in tags.split(',') if t.strip()] if tags else []
+    results = await file_manager.upload_files(
+        project, date, [(f.file, f.filename) for f in files],
+        FileSource(source), tag_list, notes, replace_existing
+    )
+    items = [
+        {
+            "filename": f.filename,
+            "success": ok,
+            "message": "uploaded" if ok else (msg or "upload failed"),
+            "data": info.dict() if info else None,
+        }
+        for f, (ok, msg, info) in zip(files, results)
+    ]
+    succeeded = sum(1 for item in items if item["success"])
+    data = {"results": items, "succeeded": succeeded, "failed": len(items) - succeeded}
+    if succeeded == len(items):
+        return {"code": 0, "status": "ok", "message": "uploaded", "data": data}
+    if succeeded == 0:
+        return {"code": 4, "status": "error", "message": "all uploads failed", "data": data}
+    return {"code": 4, "status": "partial", "message": "some uploads failed", "data": data}
+
+
 @router.post("/{date}/update_files", response_model=BaseResponse)
 async def update_files(
     project: str,
@@ -39,9 +75,8 @@ async def update_files(
     tags: str = Form(""),
     notes: str = Form("")
 ) -> Dict[str, Any]:
-    content = await file.read()
     tag_list = [t for t in tags.split(',') if t.strip()] if tags else []
-    ok, msg, info = file_manager.update_file(project, date, content, file.filename, FileSource(source), tag_list, notes)
+    ok, msg, info = await file_manager.update_file_stream(project, date, file.file, file.filename, FileSource(source), tag_list, notes)
     if not ok:
         return {"code": 2, "status": "error", "message": msg or "update failed", "data": None}
     return {"code": 0, "status": "ok", "message": "updated", "data": info.dict()}
@@ -49,7 +84,7 @@ async def update_files(
 
 @router.get("/{date}/metadata", response_model=BaseResponse)
 async def get_metadata(project: str, date: str) -> Dict[str, Any]:
-    md = metadata_manager.load_metadata(project, date)
+    md = await metadata_manager.load_metadata(project, date)
     if not md:
         return {"code": 3, "status": "error", "message": "metadata not found", "data": None}
     return {"code": 0, "status": "ok", "message": "", "data": md.dict()}
@@ -58,10 +93,59 @@ async def get_metadata(project: str, date: str) -> Dict[str, Any]:
 @router.get("/dates", response_model=BaseResponse)
 async def get_project_dates(project: str) -> Dict[str, Any]:
     """获取项目下所有已有记录的日期列表（按时间倒序）"""
-    dates: List[str] = project_manager.get_project_dates(project)
+    dates: List[str] = await run_io(project_manager.get_project_dates, project)
     return {"code": 0, "status": "ok", "message": "", "data": dates}
 
 
+@router.get("/{date}/files", response_model=BaseResponse)
+async def list_files(
+    project: str,
+    date: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """分页列出某日期记录下的文件（基于 file_records 索引），下一页使用返回的 next_cursor"""
+    limit = max(1, min(limit, settings.FILE_LIST_MAX_LIMIT))
+    try:
+        records, next_cursor = await run_io(file_index.list_files, project, date, limit, cursor)
+    except ValueError as e:
+        return {"code": 7, "status": "error", "message": str(e), "data": None}
+    return {
+        "code": 0,
+        "status": "ok",
+        "message": "",
+        "data": {"files": records, "next_cursor": next_cursor},
+    }
+
+
+@router.get("/files/search", response_model=BaseResponse)
+async def search_files(
+    project: str,
+    file_id: Optional[str] = None,
+    tag: Optional[str] = None,
+    mime: Optional[str] = None,
+    crc32: Optional[str] = None,
+    include_retired: bool = False,
+) -> Dict[str, Any]:
+    """跨日期按文件ID、标签、MIME类型或CRC32查询文件（基于 file_records 索引）"""
+    if not any([file_id, tag, mime, crc32]):
+        return {"code": 5, "status": "error", "message": "file_id, tag, mime or crc32 is required", "data": []}
+    records = await run_io(
+        file_index.find_files, project, file_id=file_id, tag=tag, mime_type=mime,
+        crc32=crc32, include_retired=include_retired
+    )
+    return {"code": 0, "status": "ok", "message": "", "data": records}
+
+
+@router.post("/rebuild_index", response_model=BaseResponse)
+async def rebuild_file_index(project: str) -> Dict[str, Any]:
+    """根据现有 record_meta.json 重建项目的文件索引"""
+    stats = await run_io(file_index.rebuild, project)
+    if stats["errors"]:
+        return {"code": 6, "status": "error", "message": "; ".join(stats["errors"]), "data": stats}
+    return {"code": 0, "status": "ok", "message": "rebuilt", "data": stats}
+
+
 @router.get("/{date}/preview")
 async def preview_file(
     project: str,
@@ -76,7 +160,7 @@ async def preview_file(
     - date: 日期（路径参数）
     - filename: 文件名（查询参数）
     """
-    ok, msg, content, mime_type = file_manager.get_file_content_by_name(
+    ok, msg, content, mime_type = await file_manager.get_file_content_by_name(
         project, date, filename
     )
     if not ok or content is None:
@@ -5,6 +5,9 @@ import json
 from server.config import settings
 from server.models import BaseResponse
 from server.LLMManager.LLMService import llm_service
+from server.LLMManager.ResponseCache import response_cache
+from server.LLMManager.HttpClient import HTTPX_AVAILABLE
+from server.DataManager.AsyncDataManager import run_io
 
 router = APIRouter(prefix="/llm", tags=["llm"])
 
@@ -20,6 +23,8 @@ def _load_llm_config() -> Dict[str, Any]:
           "base_url": data.get("base_url"),
           "api_key": data.get("api_key"),
           "default_model": data.get("default_model"),
+          "rate_limits": data.get("rate_limits"),
+          "max_in_flight": data.get("max_in_flight"),
         }
     except (IOError, json.JSONDecodeError):
       pass
@@ -35,16 +40,27 @@ def _save_llm_config(
   base_url: Optional[str],
   api_key: Optional[str],
   default_model: Optional[str],
+  limits: Optional[Dict[str, Any]] = None,
 ) -> bool:
   try:
     _LLM_CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # 保留文件中的其他配置（如 rate_limits / max_in_flight），limits 中给出的项覆盖原值
+    data: Dict[str, Any] = {}
+    if _LLM_CONFIG_PATH.exists():
+      try:
+        with open(_LLM_CONFIG_PATH, "r", encoding="utf-8") as f:
+          data = json.load(f)
+      except (IOError, json.JSONDecodeError):
+        data = {}
+    data.update(limits or {})
+    data.update({
+      "base_url": base_url,
+      "api_key": api_key,
+      "default_model": default_model,
+    })
     with open(_LLM_CONFIG_PATH, "w", encoding="utf-8") as f:
       json.dump(
-        {
-          "base_url": base_url,
-          "api_key": api_key,
-          "default_model": default_model,
-        },
+        data,
         f,
         ensure_ascii=False,
         indent=2,
@@ -98,16 +114,19 @@ async def get_llm_config() -> Dict[str, Any]:
     "base_url": cfg.get("base_url"),
     "has_api_key": bool(cfg.get("api_key")),
     "default_model": cfg.get("default_model"),
+    "rate_limits": cfg.get("rate_limits"),
+    "max_in_flight": cfg.get("max_in_flight"),
   }
   return {"code": 0, "status": "ok", "message": "", "data": data}
 
 
 @router.post("/config", response_model=BaseResponse)
 async def update_llm_config(body: Dict[str, Any]) -> Dict[str, Any]:
-  """更新 LLM 配置（base_url + api_key）"""
+  """更新 LLM 配置（base_url + api_key，可选 rate_limits / max_in_flight 限流配置）"""
   base_url = body.get("base_url")
   api_key = body.get("api_key")
   default_model = body.get("default_model")
+  limits = {k: body[k] for k in ("rate_limits", "max_in_flight") if k in body}
 
   if not base_url:
     return {
@@ -117,7 +136,7 @@ async def update_llm_config(body: Dict[str, Any]) -> Dict[str, Any]:
       "data": None,
     }
 
-  ok = _save_llm_config(base_url, api_key, default_model)
+  ok = _save_llm_config(base_url, api_key, default_model, limits)
   if not ok:
     return {
       "code": 2,
@@ -128,12 +147,12 @@ async def update_llm_config(body: Dict[str, Any]) -> Dict[str, Any]:
 
   # 保存配置后自动重新初始化模型
   try:
-    reinit_result = llm_service.reinitialize_models()
+    reinit_result = await llm_service.reinitialize_models()
     if reinit_result["success"]:
       return {
         "code": 0,
         "status": "ok",
-        "message": f"配置已更新，已自动初始化 {reinit_result['count']} 个模型",
+        "message": f"配置已更新，已发现 {reinit_result['count']} 个可用模型",
         "data": {
           "base_url": base_url,
           "initialized_models": reinit_result["models"],
@@ -157,11 +176,10 @@ async def update_llm_config(body: Dict[str, Any]) -> Dict[str, Any]:
 
 
 @router.get("/models", response_model=BaseResponse)
-async def list_llm_models() -> Dict[str, Any]:
-  """根据当前 LLM 配置调用 /v1/models，返回可用模型列表"""
+async def list_llm_models(refresh: bool = False) -> Dict[str, Any]:
+  """根据当前 LLM 配置调用 /v1/models，返回可用模型列表（结果有缓存，refresh=true 时重新请求）"""
   cfg = _load_llm_config()
   base_url = cfg.get("base_url") or settings.OPENAI_BASE_URL
-  api_key = cfg.get("api_key") or settings.OPENAI_API_KEY
 
   if not base_url:
     return {
@@ -171,43 +189,17 @@ async def list_llm_models() -> Dict[str, Any]:
       "data": [],
     }
 
-  try:
-    try:
-      import httpx  # type: ignore
-    except ImportError:
-      return {
-        "code": 2,
-        "status": "error",
-        "message": "服务器缺少 httpx 依赖，无法请求模型列表",
-        "data": [],
-      }
-
-    base = base_url.rstrip("/")
-    # 兼容用户已经在 Base URL 里写了 /v1 的情况，避免出现 /v1/v1/models
-    if base.endswith("/v1"):
-      url = base + "/models"
-    else:
-      url = base + "/v1/models"
-    headers = {}
-    if api_key:
-      headers["Authorization"] = f"Bearer {api_key}"
-
-    with httpx.Client(timeout=10.0) as client:
-      resp = client.get(url, headers=headers)
-      resp.raise_for_status()
-      data = resp.json()
-
-    raw_models = data.get("data", [])
-    models: List[Dict[str, Any]] = []
-    for m in raw_models:
-      models.append(
-        {
-          "id": m.get("id"),
-          "owned_by": m.get("owned_by"),
-          "object": m.get("object"),
-        }
-      )
+  if not HTTPX_AVAILABLE:
+    return {
+      "code": 2,
+      "status": "error",
+      "message": "服务器缺少 httpx 依赖，无法请求模型列表",
+      "data": [],
+    }
 
+  try:
+    # 与 LLMService 共用模型发现缓存和连接池
+    models = await llm_service.discover_models(force=refresh)
     return {
       "code": 0,
       "status": "ok",
@@ -225,8 +217,9 @@ async def list_llm_models() -> Dict[str, Any]:
 
 @router.get("/status", response_model=BaseResponse)
 async def get_llm_status() -> Dict[str, Any]:
-  """获取LLM服务状态（已初始化的模型列表）"""
-  status = llm_service.get_service_status()
+  """获取LLM服务状态（已初始化的模型列表、响应缓存命中率）"""
+  # 响应缓存统计需要查询 SQLite，放到I/O线程池执行
+  status = await run_io(llm_service.get_service_status)
   return {
     "code": 0,
     "status": "ok",
@@ -235,10 +228,22 @@ async def get_llm_status() -> Dict[str, Any]:
   }
 
 
+@router.post("/cache/clear", response_model=BaseResponse)
+async def clear_llm_cache() -> Dict[str, Any]:
+  """清空LLM响应缓存"""
+  removed = await run_io(response_cache.clear)
+  return {
+    "code": 0,
+    "status": "ok",
+    "message": "cleared",
+    "data": {"removed": removed},
+  }
+
+
 @router.post("/reinitialize", response_model=BaseResponse)
 async def reinitialize_llm_models() -> Dict[str, Any]:
   """重新初始化LLM模型"""
-  result = llm_service.reinitialize_models()
+  result = await llm_service.reinitialize_models()
   if result["success"]:
     return {
       "code": 0,
@@ -1,13 +1,20 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
-from typing import Any, Dict, List, Optional
+import asyncio
+import json
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from server.database import get_db, SessionLocal, get_project_by_name
+from server.config import settings
+from server.database import AsyncSessionLocal, get_async_db, get_project_by_name_async
 from server.WorkflowManager.WorkflowStorage import WorkflowStorage
 from server.WorkflowManager.WorkflowEngine import workflow_engine
+from server.WorkflowManager.WorkflowExecutor import workflow_executor, WorkflowJob
+from server.WorkflowManager.WorkflowStream import workflow_stream, TERMINAL_EVENTS
+from server.DataManager.AsyncDataManager import run_io
 from server.ProjectManager.ProjectManager import ProjectManager
-from server.models import BaseResponse, WorkflowGraphConfig, ProjectInfo
+from server.models import BaseResponse, WorkflowGraphConfig, ProjectInfo, WorkflowStatus
 
 router = APIRouter(prefix="/project", tags=["project"])
 
@@ -16,14 +23,14 @@ project_manager = ProjectManager()
 
 
 @router.get("/projects", response_model=BaseResponse)
-async def list_projects(db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def list_projects(db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
     """列出所有项目，并标记当前项目"""
-    projects = project_manager.list_projects(db)
+    projects = await project_manager.list_projects_async(db)
     current_name = project_manager.get_current_project_name()
 
     # 校验当前项目是否仍然存在且为激活状态
     if current_name:
-        current_proj = project_manager.get_project(db, current_name)
+        current_proj = await project_manager.get_project_async(db, current_name)
         if not current_proj or not current_proj.is_active:
             current_name = None
 
@@ -52,7 +59,7 @@ async def list_projects(db: Session = Depends(get_db)) -> Dict[str, Any]:
 @router.post("/projects", response_model=BaseResponse)
 async def create_project(
     body: Dict[str, Any],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict[str, Any]:
     """创建新项目"""
     name: Optional[str] = body.get("name")
@@ -67,7 +74,7 @@ async def create_project(
             "data": None,
         }
 
-    ok, msg, project = project_manager.create_project(
+    ok, msg, project = await project_manager.create_project_async(
         db,
         name=name,
         display_name=display_name or name,
@@ -101,13 +108,13 @@ async def create_project(
 
 
 @router.get("/projects/current", response_model=BaseResponse)
-async def get_current_project(db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def get_current_project(db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
     """获取当前项目详情，如果未设置则尝试使用第一个激活项目"""
     current_name = project_manager.get_current_project_name()
 
     if not current_name:
         # 尝试自动选择第一个激活项目
-        projects = project_manager.list_projects(db)
+        projects = await project_manager.list_projects_async(db)
         if projects:
             current = projects[0]
             project_manager.set_current_project_name(current.name)
@@ -120,7 +127,7 @@ async def get_current_project(db: Session = Depends(get_db)) -> Dict[str, Any]:
                 "data": None,
             }
 
-    project = project_manager.get_project(db, current_name)
+    project = await project_manager.get_project_async(db, current_name)
     if not project:
         return {
             "code": 2,
@@ -147,7 +154,7 @@ async def get_current_project(db: Session = Depends(get_db)) -> Dict[str, Any]:
 @router.post("/projects/switch", response_model=BaseResponse)
 async def switch_project(
     body: Dict[str, Any],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict[str, Any]:
     """切换当前项目"""
     name: Optional[str] = body.get("name")
@@ -159,7 +166,7 @@ async def switch_project(
             "data": None,
         }
 
-    proj = get_project_by_name(db, name)
+    proj = await get_project_by_name_async(db, name)
     if not proj:
         return {
             "code": 2,
@@ -181,7 +188,7 @@ async def switch_project(
 @router.delete("/projects/{name}", response_model=BaseResponse)
 async def delete_project(
     name: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ) -> Dict[str, Any]:
     """删除项目（硬删除，删除所有数据）"""
     if not name:
@@ -196,7 +203,7 @@ async def delete_project(
     current_name = project_manager.get_current_project_name()
     if current_name == name:
         # 如果删除的是当前项目，需要先切换到其他项目
-        projects = project_manager.list_projects(db)
+        projects = await project_manager.list_projects_async(db)
         other_projects = [p for p in projects if p.name != name]
         if other_projects:
             # 切换到第一个其他项目
@@ -206,7 +213,7 @@ async def delete_project(
             project_manager.set_current_project_name("")
 
     # 执行硬删除
-    ok, msg = project_manager.hard_delete_project(db, name)
+    ok, msg = await project_manager.hard_delete_project_async(db, name)
     if not ok:
         return {
             "code": 2,
@@ -224,11 +231,11 @@ async def delete_project(
 
 
 @router.get("/{project}/workflow_list", response_model=BaseResponse)
-async def workflow_list(project: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    proj = get_project_by_name(db, project)
+async def workflow_list(project: str, db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
+    proj = await get_project_by_name_async(db, project)
     if not proj:
         return {"code": 1, "status": "error", "message": "project not found", "data": []}
-    executions = storage.list_workflow_executions(db, proj.id)
+    executions = await storage.list_workflow_executions_async(db, proj.id)
     data = [
         {
             "wf_id": w.wf_id,
@@ -252,7 +259,7 @@ async def workflow_template(project: str) -> Dict[str, Any]:
 
 
 @router.post("/{project}/create_workflow_from_template", response_model=BaseResponse)
-async def create_workflow_from_template(project: str, body: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def create_workflow_from_template(project: str, body: Dict[str, Any], db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
     date = body.get("date")
     name = body.get("name", "workflow")
     overrides = body.get("overrides", {})
@@ -263,7 +270,7 @@ async def create_workflow_from_template(project: str, body: Dict[str, Any], db:
         return {"code": 3, "status": "error", "message": err or "create from template failed", "data": None}
     
     # 创建数据库记录
-    proj = get_project_by_name(db, project)
+    proj = await get_project_by_name_async(db, project)
     if proj:
         # 从保存的配置文件中获取llm_model和prompt_template
         config = storage.load_workflow_config(project, date, wf_id)
@@ -273,13 +280,13 @@ async def create_workflow_from_template(project: str, body: Dict[str, Any], db:
             llm_model = config.get("llm_model")
             prompt_template = config.get("prompt_template")
         
-        storage.create_workflow_execution(db, proj.id, wf_id, name, llm_model, prompt_template)
+        await storage.create_workflow_execution_async(db, proj.id, wf_id, name, llm_model, prompt_template)
     
     return {"code": 0, "status": "ok", "message": "created", "data": {"wf_id": wf_id}}
 
 
 @router.post("/{project}/upload_workflow", response_model=BaseResponse)
-async def upload_workflow(project: str, body: Dict[str, Any], db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def upload_workflow(project: str, body: Dict[str, Any], db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
     date = body.get("date")
     wf_id = body.get("wf_id")
     config = body.get("config") or body.get("graph") or body
@@ -292,14 +299,14 @@ async def upload_workflow(project: str, body: Dict[str, Any], db: Session = Depe
     ok, err = storage.save_workflow_config(project, date, wf_id, config)
     if not ok:
         return {"code": 6, "status": "error", "message": err or "save failed", "data": None}
-    proj = get_project_by_name(db, project)
+    proj = await get_project_by_name_async(db, project)
     if proj:
-        storage.create_workflow_execution(db, proj.id, wf_id, config.get("name", wf_id), config.get("llm_model"), config.get("prompt_template"))
+        await storage.create_workflow_execution_async(db, proj.id, wf_id, config.get("name", wf_id), config.get("llm_model"), config.get("prompt_template"))
     return {"code": 0, "status": "ok", "message": "uploaded", "data": {"wf_id": wf_id}}
 
 
 @router.post("/{project}/start_workflow", response_model=BaseResponse)
-async def start_workflow(project: str, body: Dict[str, Any], background: BackgroundTasks, db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def start_workflow(project: str, body: Dict[str, Any]) -> Any:
     wf_id = body.get("wf_id")
     date = body.get("date")
     files = body.get("files", [])
@@ -307,32 +314,44 @@ async def start_workflow(project: str, body: Dict[str, Any], background: Backgro
     if not wf_id or not date:
         return {"code": 4, "status": "error", "message": "wf_id and date are required", "data": None}
 
-    def _run():
-        from server.database import SessionLocal
-        with SessionLocal() as s:
-            import asyncio
-            asyncio.run(workflow_engine.execute_workflow(s, project, date, wf_id, files, custom_prompt))
-
-    background.add_task(_run)
+    job = WorkflowJob(project_name=project, date=date, wf_id=wf_id, files=files or [], custom_prompt=custom_prompt)
+    ok, reason = await workflow_executor.submit(job)
+    if not ok:
+        if reason == workflow_executor.REJECT_QUEUE_FULL:
+            # 队列已满：返回 429，前端稍后重试
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": "5"},
+                content={"code": 7, "status": "error", "message": "workflow queue is full, retry later", "data": await run_io(workflow_executor.get_stats)},
+            )
+        if reason == workflow_executor.REJECT_DUPLICATE:
+            return {"code": 8, "status": "error", "message": "workflow is already queued or running", "data": {"wf_id": wf_id, "date": date}}
+        return {"code": 9, "status": "error", "message": "workflow executor is not running", "data": None}
     return {"code": 0, "status": "ok", "message": "started", "data": {"wf_id": wf_id, "date": date}}
 
 
+@router.get("/workflow_executor/stats", response_model=BaseResponse)
+async def workflow_executor_stats() -> Dict[str, Any]:
+    """工作流执行器状态：运行中/排队数量、并发上限、任务表各状态数量及累计统计"""
+    return {"code": 0, "status": "ok", "message": "", "data": await run_io(workflow_executor.get_stats)}
+
+
 @router.get("/{project}/workflow_status/{wf_id}", response_model=BaseResponse)
-async def workflow_status(project: str, wf_id: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
-    info = workflow_engine.get_workflow_status(db, wf_id)
+async def workflow_status(project: str, wf_id: str, db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
+    info = await workflow_engine.get_workflow_status_async(db, wf_id)
     if not info:
         return {"code": 5, "status": "error", "message": "workflow not found", "data": None}
     return {"code": 0, "status": "ok", "message": "", "data": info}
 
 
 @router.get("/{project}/workflow_detail/{wf_id}", response_model=BaseResponse)
-async def workflow_detail(project: str, wf_id: str, db: Session = Depends(get_db)) -> Dict[str, Any]:
+async def workflow_detail(project: str, wf_id: str, db: AsyncSession = Depends(get_async_db)) -> Dict[str, Any]:
     """
     获取工作流执行详情：
     - status: 数据库中的状态信息（包含 error_message 等）
     - output: 工作流输出（包含 summary 等）
     """
-    status_info = workflow_engine.get_workflow_status(db, wf_id)
+    status_info = await workflow_engine.get_workflow_status_async(db, wf_id)
     output = storage.get_workflow_output_by_wf_id(project, wf_id)
 
     if not status_info and not output:
@@ -343,3 +362,66 @@ async def workflow_detail(project: str, wf_id: str, db: Session = Depends(get_db
         "output": output,
     }
     return {"code": 0, "status": "ok", "message": "", "data": data}
+
+
+@router.get("/{project}/workflow_stream/{wf_id}")
+async def workflow_stream_events(project: str, wf_id: str, db: AsyncSession = Depends(get_async_db)) -> Any:
+    """
+    以 SSE 推送工作流的生成过程：先调用 start_workflow，再连接本接口。
+    - token 事件：LLM 节点生成的文本片段（中途连接时先补发本次执行已生成的部分）
+    - done 事件：执行成功，summary 为已保存的最终总结；工作流已结束时直接返回保存的结果
+    - error / failed 事件：执行失败（error 之后执行器可能重试，failed 表示不再重试）
+    """
+    info = await workflow_engine.get_workflow_status_async(db, wf_id)
+    if not info:
+        return {"code": 5, "status": "error", "message": "workflow not found", "data": None}
+    return StreamingResponse(
+        _stream_workflow_events(project, wf_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_workflow_events(project: str, wf_id: str) -> AsyncIterator[str]:
+    queue = workflow_stream.subscribe(wf_id)
+    try:
+        if queue.empty():
+            final = await _final_workflow_event(project, wf_id)
+            if final:
+                yield _format_sse(final)
+                return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.WORKFLOW_STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # 订阅前工作流已结束或在其他进程中执行时收不到事件，按保存的状态结束
+                final = await _final_workflow_event(project, wf_id)
+                if final:
+                    yield _format_sse(final)
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield _format_sse(event)
+            if event["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        workflow_stream.unsubscribe(wf_id, queue)
+
+
+async def _final_workflow_event(project: str, wf_id: str) -> Optional[Dict[str, Any]]:
+    """工作流已结束且没有待执行的任务时，根据保存的状态和输出生成终止事件"""
+    async with AsyncSessionLocal() as db:
+        info = await workflow_engine.get_workflow_status_async(db, wf_id)
+    status = info["status"] if info else None
+    if status not in (WorkflowStatus.SUCCESS.value, WorkflowStatus.FAILED.value):
+        return None
+    if await run_io(workflow_executor.has_active_job, wf_id):
+        return None
+    if status == WorkflowStatus.FAILED.value:
+        return {"event": "failed", "message": info.get("error_message")}
+    output = await run_io(storage.get_workflow_output_by_wf_id, project, wf_id) or {}
+    return {"event": "done", "summary": output.get("summary", "")}
+
+
+def _format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
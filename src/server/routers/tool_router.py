@@ -2,6 +2,8 @@ from fastapi import APIRouter
 from typing import Any, Dict
 
 from server.DataManager.ToolConfigManager import ToolConfigManager
+from server.DataManager.AsyncDataManager import run_io
+from server.ToolManager.ExtractionCache import extraction_cache
 from server.models import BaseResponse, ErrorResponse
 
 router = APIRouter(prefix="/tool", tags=["tool"])
@@ -30,6 +32,20 @@ async def tool_templates() -> Dict[str, Any]:
     return {"code": 0, "status": "ok", "message": "", "data": templates}
 
 
+@router.get("/extraction_cache/stats", response_model=BaseResponse)
+async def extraction_cache_stats() -> Dict[str, Any]:
+    """获取提取结果缓存统计（条目数、占用空间、命中/未命中次数）"""
+    stats = await run_io(extraction_cache.get_stats)
+    return {"code": 0, "status": "ok", "message": "", "data": stats}
+
+
+@router.post("/extraction_cache/clear", response_model=BaseResponse)
+async def clear_extraction_cache() -> Dict[str, Any]:
+    """清空提取结果缓存"""
+    removed = await run_io(extraction_cache.clear)
+    return {"code": 0, "status": "ok", "message": "cleared", "data": {"removed": removed}}
+
+
 @router.get("/{user_tool}", response_model=BaseResponse)
 async def get_user_tool(user_tool: str) -> Dict[str, Any]:
     cfg = tool_manager.get_tool_config(user_tool)
@@ -0,0 +1,12 @@
+"""测试环境：数据目录和数据库放在临时目录中，须在导入 server 之前设置"""
+import os
+import tempfile
+from pathlib import Path
+
+_BASE_DIR = Path(tempfile.mkdtemp(prefix="arl-test-"))
+os.environ.setdefault("BASE_DIR", str(_BASE_DIR))
+os.environ.setdefault("USRDATA_DIR", str(_BASE_DIR / "usrdata"))
+os.environ.setdefault("TOOLS_DIR", str(_BASE_DIR / "usrdata" / "tools"))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_BASE_DIR / 'test.db'}")
+# 离线环境中 tiktoken 无法下载词表
+os.environ.setdefault("LLM_USE_TIKTOKEN", "false")
@@ -0,0 +1,71 @@
+import hashlib
+
+import pytest
+
+from server.config import settings
+from server.DataManager.BlobStore import BlobStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "USRDATA_DIR", tmp_path)
+    # 开启文件锁，确认锁文件不会被当成 blob
+    monkeypatch.setattr(settings, "METADATA_FILE_LOCK", True)
+    return BlobStore()
+
+
+def _stage(tmp_path, content: bytes):
+    src = tmp_path / f"upload-{hashlib.md5(content).hexdigest()}.tmp"
+    src.write_bytes(content)
+    return src, hashlib.sha256(content).hexdigest()
+
+
+def test_store_deduplicates_and_counts_references(store, tmp_path):
+    files_dir = tmp_path / "proj" / "files"
+    src, sha = _stage(tmp_path, b"same content")
+    assert store.store("proj", sha, src, files_dir / "2025-01-01" / "a.txt")
+    src, _ = _stage(tmp_path, b"same content")
+    assert store.store("proj", sha, src, files_dir / "2025-01-02" / "b.txt")
+
+    assert store.ref_count("proj", sha) == 2
+    assert not src.exists()
+    stats = store.get_statistics("proj")
+    assert stats == {"blob_count": 1, "blob_bytes": len(b"same content"), "references": 2}
+
+
+def test_release_removes_blob_after_last_reference(store, tmp_path):
+    files_dir = tmp_path / "proj" / "files"
+    src, sha = _stage(tmp_path, b"data")
+    first = files_dir / "2025-01-01" / "a.txt"
+    second = files_dir / "2025-01-01" / "b.txt"
+    store.store("proj", sha, src, first)
+    src, _ = _stage(tmp_path, b"data")
+    store.store("proj", sha, src, second)
+
+    first.unlink()
+    store.release("proj", sha)
+    assert store.has_blob("proj", sha)
+    assert store.ref_count("proj", sha) == 1
+
+    second.unlink()
+    store.release("proj", sha)
+    assert not store.has_blob("proj", sha)
+
+
+def test_collect_garbage_ignores_lock_files(store, tmp_path):
+    files_dir = tmp_path / "proj" / "files"
+    kept_src, kept_sha = _stage(tmp_path, b"kept")
+    store.store("proj", kept_sha, kept_src, files_dir / "2025-01-01" / "kept.txt")
+    orphan_src, orphan_sha = _stage(tmp_path, b"orphan")
+    orphan = files_dir / "2025-01-01" / "orphan.txt"
+    store.store("proj", orphan_sha, orphan_src, orphan)
+    orphan.unlink()
+    # 旧版本把锁文件放在 blob 目录中
+    legacy_lock = store.get_blob_dir("proj") / ".record_meta.lock"
+    legacy_lock.touch()
+
+    assert store.collect_garbage("proj") == 1
+    assert store.has_blob("proj", kept_sha)
+    assert not store.has_blob("proj", orphan_sha)
+    assert legacy_lock.exists()
+    assert store.get_statistics("proj")["blob_count"] == 1
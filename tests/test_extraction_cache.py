@@ -0,0 +1,69 @@
+from server.ToolManager.ExtractionCache import ExtractionCache, is_complete_result
+
+
+def _result(text="hello", **processing_info):
+    result = {"text_content": text}
+    if processing_info:
+        result["processing_info"] = processing_info
+    return result
+
+
+def test_key_depends_on_content_tool_and_config(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=1 << 20)
+    a = tmp_path / "a.pdf"
+    a.write_bytes(b"one")
+    sha = cache.content_hash(str(a))
+
+    key = cache.make_key(sha, "pdf_parser", {"dpi": 100})
+    assert key == cache.make_key(cache.content_hash(b"one"), "pdf_parser", {"dpi": 100})
+    assert key != cache.make_key(sha, "pdf_parser", {"dpi": 200})
+    assert key != cache.make_key(sha, "image_reader", {"dpi": 100})
+    assert key != cache.make_key(cache.content_hash(b"two"), "pdf_parser", {"dpi": 100})
+
+
+def test_put_and_get_round_trip(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=1 << 20)
+    f = tmp_path / "a.pdf"
+    f.write_bytes(b"content")
+
+    assert cache.get("pdf_parser", {}, str(f)) is None
+    cache.put("pdf_parser", {}, str(f), _result("text"))
+    cached = cache.get("pdf_parser", {}, str(f))
+    assert cached["text_content"] == "text"
+    assert cached["cached"] is True
+    # 配置变化时不命中
+    assert cache.get("pdf_parser", {"dpi": 1}, str(f)) is None
+
+
+def test_result_without_ocr_is_not_cached(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=1 << 20)
+    f = tmp_path / "a.png"
+    f.write_bytes(b"image")
+
+    unavailable = _result("", ocr_enabled=False)
+    assert not is_complete_result(unavailable)
+    cache.put("image_reader", {}, str(f), unavailable)
+    assert cache.get("image_reader", {}, str(f)) is None
+    assert cache.writes == 0
+
+    cache.put("image_reader", {}, str(f), _result("text", ocr_enabled=True))
+    assert cache.get("image_reader", {}, str(f))["text_content"] == "text"
+
+
+def test_bypass_for_uncacheable_calls(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=1 << 20)
+    assert cache.is_cacheable("pdf_parser", "/some/file.pdf")
+    assert cache.is_cacheable("image_reader", b"bytes")
+    assert not cache.is_cacheable("text_processor", "/some/file.txt")
+    assert not cache.is_cacheable("pdf_parser", {"path": "/some/file.pdf"})
+
+    disabled = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=0)
+    assert not disabled.is_cacheable("pdf_parser", "/some/file.pdf")
+
+
+def test_eviction_keeps_total_under_limit(tmp_path):
+    cache = ExtractionCache(cache_dir=tmp_path / "cache", max_bytes=600)
+    for i in range(10):
+        cache.put("pdf_parser", {}, f"content-{i}".encode(), _result("x" * 100))
+    assert cache.get_stats()["total_bytes"] <= 600
+    assert cache.evictions > 0
@@ -0,0 +1,75 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from server import database
+from server.database import SessionLocal, FileRecord, Project, init_database, upsert_file_record
+from server.DataManager.FileIndex import file_index
+
+
+@pytest.fixture
+def project_id():
+    init_database()
+    with SessionLocal() as db:
+        db.query(FileRecord).delete()
+        project = db.query(Project).filter(Project.name == "index-proj").first()
+        if project is None:
+            project = Project(name="index-proj", display_name="index-proj")
+            db.add(project)
+        db.commit()
+        return project.id
+
+
+def _add_file(project_id: int, date: str, name: str, uploaded_at: datetime):
+    with SessionLocal() as db:
+        upsert_file_record(
+            db, project_id, file_id=f"f_{name}", filename=name,
+            stored_path=f"usrdata/projects/index-proj/files/{date}/{name}", uploaded_at=uploaded_at
+        )
+        db.commit()
+
+
+def test_list_files_filters_on_record_date_not_upload_day(project_id):
+    # 补传到前一天记录中的文件，上传时间在第二天
+    _add_file(project_id, "2025-01-01", "late.txt", datetime(2025, 1, 2, 9, 0))
+    _add_file(project_id, "2025-01-01", "early.txt", datetime(2025, 1, 1, 9, 0))
+    _add_file(project_id, "2025-01-02", "next.txt", datetime(2025, 1, 2, 8, 0))
+
+    records, _ = file_index.list_files("index-proj", "2025-01-01")
+    assert [r["filename"] for r in records] == ["early.txt", "late.txt"]
+    records, _ = file_index.list_files("index-proj", "2025-01-02")
+    assert [r["filename"] for r in records] == ["next.txt"]
+
+    page, cursor = file_index.list_files("index-proj", "2025-01-01", limit=1)
+    assert [r["filename"] for r in page] == ["early.txt"]
+    page, _ = file_index.list_files("index-proj", "2025-01-01", limit=1, cursor=cursor)
+    assert [r["filename"] for r in page] == ["late.txt"]
+
+    with pytest.raises(ValueError):
+        file_index.list_files("index-proj", "2025/01/01")
+
+
+def test_existing_records_get_record_date_backfilled(project_id):
+    _add_file(project_id, "2025-01-01", "old.txt", datetime(2025, 1, 3))
+    with SessionLocal() as db:
+        db.execute(text("UPDATE file_records SET record_date = NULL"))
+        db.commit()
+
+    init_database()
+    records, _ = file_index.list_files("index-proj", "2025-01-01")
+    assert [r["filename"] for r in records] == ["old.txt"]
+
+
+def test_missing_columns_are_added_to_existing_table(tmp_path, monkeypatch):
+    old_engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE file_records (id INTEGER PRIMARY KEY, project_id INTEGER NOT NULL, "
+            "file_id VARCHAR(50) NOT NULL, filename VARCHAR(500) NOT NULL, stored_path VARCHAR(1000) NOT NULL)"
+        ))
+    monkeypatch.setattr(database, "engine", old_engine)
+
+    database._add_missing_columns()
+    columns = {column["name"] for column in inspect(old_engine).get_columns("file_records")}
+    assert {"record_date", "uploaded_at", "retired_at"} <= columns
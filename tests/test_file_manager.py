@@ -0,0 +1,72 @@
+import io
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from server.config import settings
+from server.DataManager.BlobStore import blob_store
+from server.DataManager.FileIndex import file_index
+from server.DataManager.FileManager import FileManager
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(settings, "USRDATA_DIR", tmp_path / "usrdata")
+    monkeypatch.setattr(settings, "FILE_INDEX_ENABLED", False)
+    monkeypatch.setattr(settings, "INGEST_ENABLED", False)
+    return FileManager()
+
+
+def _upload(manager, content: bytes, replace: bool = False):
+    ok, msg, info = manager.upload_file_stream(
+        "proj", "2025-01-01", io.BytesIO(content), "notes.txt", replace_existing=replace
+    )
+    assert ok, msg
+    return info
+
+
+def test_replacing_file_releases_previous_version(manager, tmp_path):
+    old = _upload(manager, b"first version")
+    old_path = tmp_path / old.stored_path
+    assert blob_store.ref_count("proj", old.sha256) == 1
+
+    new = _upload(manager, b"second version", replace=True)
+    assert new.stored_path != old.stored_path
+    assert not old_path.exists()
+    assert not blob_store.has_blob("proj", old.sha256)
+    assert (tmp_path / new.stored_path).read_bytes() == b"second version"
+    assert [f.file_id for f in manager.list_files("proj", "2025-01-01")] == [new.file_id]
+
+
+def test_replacing_with_same_content_keeps_file(manager, tmp_path):
+    old = _upload(manager, b"same")
+    new = _upload(manager, b"same", replace=True)
+    assert new.stored_path == old.stored_path
+    assert (tmp_path / new.stored_path).exists()
+    assert blob_store.ref_count("proj", new.sha256) == 1
+
+
+@pytest.fixture
+def broken_index(monkeypatch):
+    monkeypatch.setattr(settings, "FILE_INDEX_ENABLED", True)
+
+    def fail(*args, **kwargs):
+        raise OperationalError("UPDATE file_records", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(file_index, "stage_files", fail)
+    monkeypatch.setattr(file_index, "stage_retire", fail)
+
+
+def test_index_errors_do_not_break_metadata_updates(manager, broken_index, tmp_path):
+    # 索引写入失败时 record_meta.json 仍是权威来源，上传、状态更新和删除照常完成
+    info = _upload(manager, b"indexed content")
+    assert [f.file_id for f in manager.list_files("proj", "2025-01-01")] == [info.file_id]
+
+    assert manager.update_file_status("proj", "2025-01-01", info.file_id, "ocr", "done")
+    assert manager.get_file_info("proj", "2025-01-01", info.file_id).status["ocr"] == "done"
+
+    assert manager.delete_file("proj", "2025-01-01", info.file_id)
+    assert [f.status.get("retired") for f in manager.list_files("proj", "2025-01-01")] == ["true"]
+    assert not (tmp_path / info.stored_path).exists()
+    assert not blob_store.has_blob("proj", info.sha256)
@@ -0,0 +1,61 @@
+import pytest
+from PIL import Image
+
+from server.config import settings
+from server.DataManager import IngestPipeline as ingest
+from server.ToolManager import ExtractionPool
+from server.ToolManager.ExtractionPool import OCR_UNAVAILABLE_ERROR, extract_text
+
+
+@pytest.fixture
+def image_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "USRDATA_DIR", tmp_path)
+    monkeypatch.setattr(settings, "EXTRACTION_WORKERS", 0)
+    path = tmp_path / "proj" / "data" / "2025-01-01" / "shot.png"
+    path.parent.mkdir(parents=True)
+    Image.new("RGB", (8, 8)).save(path)
+    return path
+
+
+def _status_item(tool, error=None):
+    return {"tool": tool, "error": error}
+
+
+def test_statuses_for_extraction_results():
+    FileStatus = ingest.FileStatus
+    assert ingest._statuses_for(_status_item("image_reader")) == {"ocr": FileStatus.DONE.value, "parsed": FileStatus.DONE.value}
+    assert ingest._statuses_for(_status_item("pdf_parser")) == {"ocr": FileStatus.SKIPPED.value, "parsed": FileStatus.DONE.value}
+    assert ingest._statuses_for(_status_item("image_reader", "boom")) == {
+        "ocr": FileStatus.FAILED.value, "parsed": FileStatus.FAILED.value
+    }
+    assert ingest._statuses_for(_status_item("image_reader", OCR_UNAVAILABLE_ERROR)) == {
+        "ocr": FileStatus.SKIPPED.value, "parsed": FileStatus.SKIPPED.value
+    }
+
+
+async def test_image_without_ocr_is_reported_and_not_saved(image_path, monkeypatch):
+    async def fake_tool(tool_name, file_path):
+        return {"text_content": "", "processing_info": {"ocr_enabled": False}}
+
+    monkeypatch.setattr(ExtractionPool, "_run_tool", fake_tool)
+    item = await extract_text(str(image_path))
+    assert item["error"] == OCR_UNAVAILABLE_ERROR
+    assert item["text"] == ""
+
+    pipeline = ingest.IngestPipeline()
+    loaded = await pipeline.load_text(str(image_path))
+    assert loaded["error"] == OCR_UNAVAILABLE_ERROR
+    assert not ingest.get_extracted_text_path(image_path).exists()
+
+
+async def test_empty_image_sidecar_is_re_extracted(image_path, monkeypatch):
+    async def fake_tool(tool_name, file_path):
+        return {"text_content": "recognized", "processing_info": {"ocr_enabled": True}}
+
+    monkeypatch.setattr(ExtractionPool, "_run_tool", fake_tool)
+    assert ingest.save_extracted_text(image_path, "")
+
+    loaded = await ingest.IngestPipeline().load_text(str(image_path))
+    assert loaded["source"] == "extracted"
+    assert loaded["text"] == "recognized"
+    assert ingest.read_extracted_text(image_path) == "recognized"
@@ -0,0 +1,97 @@
+import pytest
+
+from server.LLMManager.LLMService import llm_service
+
+
+class FakeLLM:
+    max_tokens = 256
+
+
+@pytest.fixture
+def prompts(monkeypatch):
+    sent = []
+
+    async def get_llm(model_name):
+        return FakeLLM()
+
+    async def invoke(llm, system_prompt, prompt, stats, model_name, use_cache=True, on_token=None):
+        sent.append(prompt)
+        stats["llm_calls"] += 1
+        return f"partial-{len(sent)}"
+
+    monkeypatch.setattr(llm_service, "_get_llm", get_llm)
+    monkeypatch.setattr(llm_service, "_invoke", invoke)
+    return sent
+
+
+async def test_map_reduce_chunks_only_new_content(prompts):
+    content = "\n\n".join(f"新增段落{i} " + "内容" * 40 for i in range(6))
+    success, summary, metadata = await llm_service.generate_summary(
+        content, model_name="fake", mode="map_reduce", chunk_tokens=80, previous_summary="PREVIOUS-SUMMARY"
+    )
+    assert success, summary
+    assert metadata["chunk_count"] > 1
+    # 分块摘要只处理新增内容，上次的总结只出现在最终提示中
+    assert all("PREVIOUS-SUMMARY" not in prompt for prompt in prompts[:-1])
+    assert "PREVIOUS-SUMMARY" in prompts[-1]
+
+
+async def test_refine_passes_previous_summary_once(prompts):
+    content = "\n\n".join(f"新增段落{i} " + "内容" * 40 for i in range(4))
+    success, summary, metadata = await llm_service.generate_summary(
+        content, model_name="fake", mode="refine", chunk_tokens=80, previous_summary="PREVIOUS-SUMMARY"
+    )
+    assert success, summary
+    assert metadata["chunk_count"] > 1
+    assert "PREVIOUS-SUMMARY" in prompts[0]
+    assert all("PREVIOUS-SUMMARY" not in prompt for prompt in prompts[1:])
+
+
+async def test_stuff_without_previous_summary_uses_content_as_is(prompts):
+    success, summary, _ = await llm_service.generate_summary("短内容", model_name="fake", mode="stuff")
+    assert success, summary
+    assert "已有总结" not in prompts[0]
+    assert "短内容" in prompts[0]
+
+
+async def test_failed_discovery_is_retried_after_backoff(monkeypatch):
+    from server.config import settings
+    from server.LLMManager.LLMService import LLMService
+
+    service = LLMService()
+    responses = [[], ["gpt-4o"]]
+    calls = []
+
+    async def from_api():
+        calls.append(1)
+        return responses.pop(0)
+
+    monkeypatch.setattr(service, "_get_available_models_from_api", from_api)
+    monkeypatch.setattr(service, "_load_llm_config", lambda: {
+        "base_url": "http://llm.local", "api_key": "key", "default_model": "gpt-4o",
+        "rate_limits": None, "max_in_flight": None,
+    })
+    monkeypatch.setattr(settings, "LLM_MODELS_RETRY_SECONDS", 60)
+
+    await service.ensure_models()
+    # 发现失败：回退到默认模型，退避期内不再请求
+    assert service.available_models == ["gpt-4o"]
+    await service.ensure_models()
+    assert len(calls) == 1
+
+    service._init_retry_at = 0.0
+    await service.ensure_models()
+    assert len(calls) == 2
+    assert service._models_initialized
+    await service.ensure_models()
+    assert len(calls) == 2
+
+
+async def test_completions_use_their_own_timeout(monkeypatch):
+    from server.config import settings
+
+    monkeypatch.setattr(settings, "LLM_REQUEST_TIMEOUT", 321.0)
+    llm = llm_service._create_llm("gpt-4o", {"api_key": "key", "base_url": "http://llm.local/v1"})
+    # 共享 HTTP 客户端保持短超时，对话请求使用单独的超时
+    assert llm.request_timeout == 321.0
+    assert llm.http_async_client.timeout.read == settings.LLM_HTTP_TIMEOUT
@@ -0,0 +1,90 @@
+import asyncio
+
+from server.LLMManager.RateLimiter import RateLimiter, _InFlightGate
+
+
+async def test_gate_limits_concurrency():
+    gate = _InFlightGate(2)
+    await gate.acquire()
+    await gate.acquire()
+    waiter = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    assert gate.waiting == 1
+
+    gate.release()
+    await waiter
+    assert gate.active == 2
+    gate.release()
+    gate.release()
+    assert gate.active == 0
+
+
+async def test_gate_cancelled_waiter_is_removed():
+    gate = _InFlightGate(1)
+    await gate.acquire()
+    waiter = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert gate.waiting == 0
+
+    gate.release()
+    assert gate.active == 0
+
+
+async def test_gate_cancelled_after_grant_returns_slot():
+    gate = _InFlightGate(1)
+    await gate.acquire()
+    waiter = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+
+    # release 把名额转交给等待者；_grant 设置结果后、等待者恢复前取消它
+    gate.release()
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    assert waiter.cancelled()
+    assert gate.active == 0
+
+    await asyncio.wait_for(gate.acquire(), 1)
+    assert gate.active == 1
+
+
+async def test_gate_cancelled_before_grant_passes_slot_on():
+    gate = _InFlightGate(1)
+    await gate.acquire()
+    first = asyncio.ensure_future(gate.acquire())
+    second = asyncio.ensure_future(gate.acquire())
+    await asyncio.sleep(0)
+
+    # _grant 尚未执行时取消：名额转交给下一个等待者
+    gate.release()
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await asyncio.wait_for(second, 1)
+    assert gate.active == 1
+    gate.release()
+    assert gate.active == 0
+
+
+async def test_rate_limiter_releases_on_exit():
+    limiter = RateLimiter()
+    limiter.configure({"default": {"rpm": None, "tpm": None}}, max_in_flight=1)
+    async with limiter.acquire("model", 100) as permit:
+        assert permit.reserved_tokens == 100
+        assert limiter.get_stats()["in_flight"] == 1
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+async def test_settle_refunds_only_what_was_deducted():
+    limiter = RateLimiter()
+    limiter.configure({"default": {"rpm": None, "tpm": 1000}})
+    # 预估超过容量时只扣除容量
+    async with limiter.acquire("m", 5000) as permit:
+        pass
+    assert permit.reserved_tokens == 1000
+    limiter.settle(permit, 400)
+    _, tpm_bucket = limiter._buckets["m"]
+    # 扣除 1000、退还 600：余额不会超过实际未用的部分
+    assert tpm_bucket.tokens <= 600 + 1
@@ -0,0 +1,61 @@
+import pytest
+
+from server.config import settings
+from server.LLMManager import LLMService as service_module
+from server.LLMManager.LLMService import llm_service
+from server.LLMManager.ResponseCache import ResponseCache
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+        self.usage_metadata = {"input_tokens": 3, "output_tokens": 2, "total_tokens": 5}
+
+
+class FakeLLM:
+    temperature = 0.2
+    max_tokens = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return FakeResponse(f"answer-{self.calls}")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(service_module, "response_cache", cache)
+    return cache
+
+
+def test_key_depends_on_model_params_and_prompt(cache):
+    key = cache.make_key("m", 0.2, 64, "system", "prompt")
+    assert key == cache.make_key("m", 0.2, 64, "system", "prompt")
+    assert key != cache.make_key("other", 0.2, 64, "system", "prompt")
+    assert key != cache.make_key("m", 0.7, 64, "system", "prompt")
+    assert key != cache.make_key("m", 0.2, 128, "system", "prompt")
+    assert key != cache.make_key("m", 0.2, 64, "system", "prompt!")
+
+
+def test_expired_entries_are_misses(cache, monkeypatch):
+    cache.put("k", "m", "content", {"total_tokens": 1})
+    assert cache.get("k") == {"content": "content", "usage": {"total_tokens": 1}}
+    monkeypatch.setattr(settings, "LLM_CACHE_TTL_SECONDS", -1)
+    assert cache.get("k") is None
+
+
+async def test_invoke_uses_cache_unless_bypassed(cache):
+    llm = FakeLLM()
+    stats = llm_service._new_usage_stats()
+    first = await llm_service._invoke(llm, "system", "prompt", stats, "m")
+    second = await llm_service._invoke(llm, "system", "prompt", stats, "m")
+    assert first == second == "answer-1"
+    assert llm.calls == 1
+    assert stats["cache_hits"] == 1
+
+    bypassed = await llm_service._invoke(llm, "system", "prompt", stats, "m", use_cache=False)
+    assert bypassed == "answer-2"
+    assert llm.calls == 2
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from server.config import settings
+from server.LLMManager.RetryPolicy import RetryPolicy, is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "LLM_RETRY_DEADLINE_SECONDS", 5.0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (StatusError(429), True),
+    (StatusError(503), True),
+    (StatusError(408), True),
+    (StatusError(400), False),
+    (StatusError(401), False),
+    (asyncio.TimeoutError(), True),
+    (ConnectionResetError(), True),
+    (ValueError("bad prompt"), False),
+])
+def test_is_retryable_classifies_errors(exc, expected):
+    assert is_retryable(exc) is expected
+
+
+def _flaky(errors):
+    calls = []
+
+    async def call(mark_sent):
+        mark_sent()
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return call, calls
+
+
+async def test_transient_errors_are_retried():
+    call, calls = _flaky([StatusError(429), StatusError(502)])
+    stats = {}
+    assert await RetryPolicy().run("m", call, stats=stats) == "ok"
+    assert len(calls) == 3
+    assert stats["retries"] == 2
+
+
+async def test_permanent_error_is_not_retried():
+    call, calls = _flaky([StatusError(400)])
+    with pytest.raises(StatusError):
+        await RetryPolicy().run("m", call)
+    assert len(calls) == 1
+
+
+async def test_gives_up_after_max_attempts():
+    call, calls = _flaky([StatusError(500)] * 5)
+    policy = RetryPolicy()
+    with pytest.raises(StatusError):
+        await policy.run("m", call)
+    assert len(calls) == 3
+    assert policy.get_stats()["gave_up"] == 1
+
+
+async def test_no_retry_after_partial_output():
+    call, calls = _flaky([StatusError(503)])
+    with pytest.raises(StatusError):
+        await RetryPolicy().run("m", call, can_retry=lambda: False)
+    assert len(calls) == 1
+
+
+async def test_deadline_bounds_all_attempts(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_DEADLINE_SECONDS", 0.05)
+
+    async def hang(mark_sent):
+        mark_sent()
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError, match="总时限"):
+        await RetryPolicy().run("m", hang)
@@ -0,0 +1,29 @@
+from server.LLMManager.TokenCounter import TokenCounter
+
+counter = TokenCounter()
+
+
+def test_short_text_is_one_chunk():
+    assert counter.split("短文本。", 100) == ["短文本。"]
+
+
+def test_split_respects_budget_and_sentence_boundaries():
+    text = "".join(f"第{i}句话的内容比较长一些。" for i in range(40))
+    chunks = counter.split(text, 30)
+    assert len(chunks) > 1
+    assert "".join(chunks) == text
+    assert all(counter.count(chunk) <= 30 for chunk in chunks)
+    assert all(chunk.endswith("。") for chunk in chunks)
+
+
+def test_overlong_sentence_is_hard_split():
+    text = "前一句。" + "长" * 100
+    chunks = counter.split(text, 20)
+    assert "".join(chunks) == text
+    assert chunks[0] == "前一句。"
+    assert all(counter.count(chunk) <= 20 for chunk in chunks)
+
+
+def test_group_packs_texts_within_budget():
+    texts = ["一二三四五", "六七八九十", "甲乙丙丁戊", "己"]
+    assert counter.group(texts, 10) == [["一二三四五", "六七八九十"], ["甲乙丙丁戊", "己"]]
@@ -0,0 +1,220 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from server.config import settings
+from server.database import (
+    SessionLocal, WorkflowJobRecord, claim_workflow_job, enqueue_workflow_job, init_database
+)
+from server.WorkflowManager.WorkflowExecutor import WorkflowExecutor, WorkflowJob
+
+
+@pytest.fixture(autouse=True)
+def jobs_table():
+    init_database()
+    with SessionLocal() as db:
+        db.query(WorkflowJobRecord).delete()
+        db.commit()
+    yield
+
+
+def _enqueue(wf_id: str, max_attempts: int = 3) -> int:
+    with SessionLocal() as db:
+        return enqueue_workflow_job(db, wf_id, "proj", "2025-01-01", max_attempts=max_attempts).id
+
+
+def _claim(lease_owner: str) -> WorkflowJob:
+    with SessionLocal() as db:
+        return WorkflowJob.from_record(claim_workflow_job(db, lease_owner, 60))
+
+
+def _expire(job_id: int):
+    with SessionLocal() as db:
+        db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id).update(
+            {WorkflowJobRecord.lease_expires_at: datetime.now() - timedelta(seconds=1)}
+        )
+        db.commit()
+
+
+def _record(job_id: int) -> WorkflowJobRecord:
+    with SessionLocal() as db:
+        return db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id).first()
+
+
+def test_claim_uses_a_distinct_lease_per_claim():
+    executor = WorkflowExecutor()
+    _enqueue("wf_a")
+    _enqueue("wf_b")
+    first = executor._claim_next()
+    second = executor._claim_next()
+    assert first.lease_owner.startswith(executor.worker_id)
+    assert first.lease_owner != second.lease_owner
+    assert _record(first.job_id).status == "running"
+
+
+def test_reclaim_skips_jobs_running_in_this_executor():
+    executor = WorkflowExecutor()
+    own_id = _enqueue("wf_own")
+    other_id = _enqueue("wf_other")
+    own = executor._claim_next()
+    _claim("crashed-worker#1")
+    _expire(own_id)
+    _expire(other_id)
+
+    executor._reclaim_expired_jobs({own.job_id})
+
+    assert _record(own_id).status == "running"
+    assert _record(own_id).lease_owner == own.lease_owner
+    other = _record(other_id)
+    assert other.status == "pending"
+    assert other.lease_owner is None
+    assert "crashed-worker#1" in other.last_error
+
+
+def test_reclaim_fails_job_after_max_attempts():
+    executor = WorkflowExecutor()
+    job_id = _enqueue("wf_last", max_attempts=1)
+    _claim("crashed-worker#1")
+    _expire(job_id)
+
+    executor._reclaim_expired_jobs()
+    assert _record(job_id).status == "failed"
+
+
+def test_finish_is_ignored_after_lease_moved():
+    executor = WorkflowExecutor()
+    job_id = _enqueue("wf_moved")
+    stale = executor._claim_next()
+    _expire(job_id)
+    WorkflowExecutor()._reclaim_expired_jobs()
+    with SessionLocal() as db:
+        db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id).update(
+            {WorkflowJobRecord.next_run_at: datetime.now()}
+        )
+        db.commit()
+    current = _claim("other-worker#1")
+
+    executor._finish(stale, False, "late failure")
+    record = _record(job_id)
+    assert record.status == "running"
+    assert record.lease_owner == current.lease_owner
+    assert executor._stats["retried"] == 0
+
+    executor._finish(current, True, None)
+    assert _record(job_id).status == "success"
+
+
+def test_non_retryable_failure_fails_at_once():
+    executor = WorkflowExecutor()
+    job_id = _enqueue("wf_bad_config", max_attempts=3)
+    job = executor._claim_next()
+    executor._finish(job, False, "工作流配置不存在", retryable=False)
+    record = _record(job_id)
+    assert record.status == "failed"
+    assert record.attempts == 1
+    assert executor._stats["failed"] == 1
+
+
+async def test_missing_config_is_not_retried(monkeypatch):
+    executor = WorkflowExecutor()
+    executor._loop = asyncio.get_running_loop()
+    job_id = _enqueue("wf_20250101_000001", max_attempts=3)
+    job = executor._claim_next()
+    await executor._run_job(job)
+    record = _record(job_id)
+    assert record.status == "failed"
+    assert "工作流配置不存在" in record.last_error
+
+
+def test_requeue_only_returns_own_lease():
+    executor = WorkflowExecutor()
+    job_id = _enqueue("wf_requeue")
+    job = executor._claim_next()
+    executor._requeue(job)
+    record = _record(job_id)
+    assert record.status == "pending"
+    assert record.attempts == 0
+
+    current = _claim("other-worker#1")
+    executor._requeue(job)
+    assert _record(job_id).lease_owner == current.lease_owner
+
+
+async def test_lost_lease_cancels_execution(monkeypatch):
+    monkeypatch.setattr(settings, "WORKFLOW_JOB_HEARTBEAT_SECONDS", 0.01)
+    executor = WorkflowExecutor()
+    executor._loop = asyncio.get_running_loop()
+    job_id = _enqueue("wf_lost")
+    job = executor._claim_next()
+    cancelled = asyncio.Event()
+
+    async def execute(_job):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(executor, "_execute", execute)
+    # 其他进程回收并重新领取了任务
+    with SessionLocal() as db:
+        db.query(WorkflowJobRecord).filter(WorkflowJobRecord.id == job_id).update(
+            {WorkflowJobRecord.lease_owner: "other-worker#1"}
+        )
+        db.commit()
+
+    task = asyncio.ensure_future(executor._run_job(job))
+    executor._tasks[job.job_id] = task
+    await asyncio.wait_for(task, 5)
+
+    assert cancelled.is_set()
+    assert job.job_id not in executor._tasks
+    record = _record(job_id)
+    assert record.status == "running"
+    assert record.lease_owner == "other-worker#1"
+
+
+async def test_finished_run_does_not_remove_newer_task(monkeypatch):
+    executor = WorkflowExecutor()
+    executor._loop = asyncio.get_running_loop()
+    _enqueue("wf_newer")
+    job = executor._claim_next()
+
+    async def execute(_job):
+        return True, None, False
+
+    monkeypatch.setattr(executor, "_execute", execute)
+    newer = asyncio.ensure_future(asyncio.sleep(0))
+    executor._tasks[job.job_id] = newer
+    await executor._run_job(job)
+    assert executor._tasks[job.job_id] is newer
+    await newer
+
+
+def test_active_job_is_unique_per_workflow():
+    _enqueue("wf_unique")
+    with pytest.raises(IntegrityError):
+        _enqueue("wf_unique")
+
+    with SessionLocal() as db:
+        db.query(WorkflowJobRecord).filter(WorkflowJobRecord.wf_id == "wf_unique").update(
+            {WorkflowJobRecord.status: "success"}
+        )
+        db.commit()
+    # 之前的任务结束后可以再次入队
+    _enqueue("wf_unique")
+
+
+def test_concurrent_submissions_enqueue_once(monkeypatch):
+    executor = WorkflowExecutor()
+    job = WorkflowJob(project_name="proj", date="2025-01-01", wf_id="wf_race")
+    # 模拟两个请求都通过了存在性检查
+    monkeypatch.setattr(
+        "server.WorkflowManager.WorkflowExecutor.get_active_workflow_job", lambda db, wf_id: None
+    )
+    assert executor._enqueue(job) is None
+    assert executor._enqueue(job) == WorkflowExecutor.REJECT_DUPLICATE
+    with SessionLocal() as db:
+        assert db.query(WorkflowJobRecord).filter(WorkflowJobRecord.wf_id == "wf_race").count() == 1
@@ -0,0 +1,194 @@
+import asyncio
+import time
+
+import pytest
+
+from server.models import WorkflowGraphConfig
+from server.WorkflowManager import WorkflowEngine as engine_module
+from server.WorkflowManager.WorkflowEngine import WorkflowEngine
+
+
+def _graph(nodes, edges, **kwargs):
+    return WorkflowGraphConfig(
+        name="test",
+        nodes=[{"id": node_id, "type": node_type, **extra} for node_id, node_type, extra in nodes],
+        edges=[{"source": s, "target": t, **({"condition": c} if c else {})} for s, t, c in edges],
+        **kwargs,
+    )
+
+
+class LLMCalls(list):
+    """记录 LLM 节点收到的内容和同时进行的最大调用数"""
+
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.max_active = 0
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = LLMCalls()
+
+    async def generate_summary(content, **kwargs):
+        calls.append(content)
+        calls.active += 1
+        calls.max_active = max(calls.max_active, calls.active)
+        # 先启动的节点后完成
+        await asyncio.sleep(0.05 if content.startswith("a") else 0.01)
+        calls.active -= 1
+        return True, f"summary({content})", {"llm_calls": 1}
+
+    monkeypatch.setattr(engine_module.llm_service, "generate_summary", generate_summary)
+    return calls
+
+
+async def test_fan_out_runs_branches_concurrently_and_merge_waits(llm_calls):
+    graph = _graph(
+        [
+            ("start", "start", {}),
+            ("llm_a", "llm", {"input_map": {"content": "text_a"}}),
+            ("llm_b", "llm", {"input_map": {"content": "text_b"}}),
+            ("merge", "merge", {}),
+            ("final", "llm", {"input_map": {"content": "combined"}, "output_key": "summary"}),
+            ("end", "end", {}),
+        ],
+        [
+            ("start", "llm_a", None), ("start", "llm_b", None),
+            ("llm_a", "merge", None), ("llm_b", "merge", None),
+            ("merge", "final", None), ("final", "end", None),
+        ],
+    )
+    context = {"text_a": "a-text", "text_b": "b-text", "combined": "all"}
+    result = await WorkflowEngine()._run_graph(graph, context)
+
+    # 两个分支各自写入以节点 id 为键的输出
+    assert result["llm_a"] == "summary(a-text)"
+    assert result["llm_b"] == "summary(b-text)"
+    assert result["summary"] == "summary(all)"
+    # merge 等待两个分支都完成后才执行 final
+    assert llm_calls[-1] == "all"
+    assert llm_calls.max_active == 2
+    assert set(result["node_timings"]) == {"start", "llm_a", "llm_b", "merge", "final", "end"}
+
+
+async def test_summary_comes_from_node_feeding_end(llm_calls):
+    graph = _graph(
+        [
+            ("start", "start", {}),
+            ("draft", "llm", {"input_map": {"content": "text"}}),
+            ("side", "llm", {"input_map": {"content": "slow_text"}}),
+            ("polish", "llm", {"input_map": {"content": "draft"}}),
+            ("end", "end", {}),
+        ],
+        [
+            ("start", "draft", None), ("start", "side", None),
+            ("draft", "polish", None), ("polish", "end", None),
+        ],
+    )
+    # side 最后完成，但不通向 end，不影响 summary
+    result = await WorkflowEngine()._run_graph(graph, {"text": "b", "slow_text": "a-slow"})
+    assert result["summary"] == "summary(summary(b))"
+    assert result["side"] == "summary(a-slow)"
+
+
+async def test_condition_selects_one_branch_and_skips_the_other(llm_calls):
+    graph = _graph(
+        [
+            ("start", "start", {}),
+            ("branch", "branch", {}),
+            ("long", "llm", {"input_map": {"content": "text"}}),
+            ("short", "llm", {"input_map": {"content": "text"}}),
+            ("merge", "merge", {}),
+            ("end", "end", {}),
+        ],
+        [
+            ("start", "branch", None),
+            ("branch", "long", "len(ctx['text']) > 3"), ("branch", "short", None),
+            ("long", "merge", None), ("short", "merge", None), ("merge", "end", None),
+        ],
+    )
+    result = await WorkflowEngine()._run_graph(graph, {"text": "b"})
+    assert "long" not in result
+    assert result["summary"] == "summary(b)"
+    assert "merge" in result["node_timings"]
+
+
+async def test_tool_without_input_map_gets_context_snapshot(monkeypatch, llm_calls):
+    seen = {}
+
+    async def process_with_tool(tool_name, payload):
+        await asyncio.sleep(0.02)
+        seen["keys"] = set(payload)
+        return {"ok": True}
+
+    monkeypatch.setattr(engine_module.tool_registry, "process_with_tool", process_with_tool)
+    graph = _graph(
+        [
+            ("start", "start", {}),
+            ("tool", "tool", {"tool_name": "text_processor"}),
+            ("llm_b", "llm", {"input_map": {"content": "text"}}),
+            ("end", "end", {}),
+        ],
+        [("start", "tool", None), ("start", "llm_b", None), ("tool", "end", None), ("llm_b", "end", None)],
+    )
+    result = await WorkflowEngine()._run_graph(graph, {"text": "b"})
+    assert result["tool"] == {"ok": True}
+    # 工具开始执行后才完成的 LLM 节点输出不会出现在工具收到的输入中
+    assert "llm_b" not in seen["keys"]
+    assert "llm_b" in result
+
+
+async def test_cycle_is_rejected():
+    graph = _graph(
+        [("start", "start", {}), ("a", "merge", {}), ("b", "merge", {}), ("end", "end", {})],
+        [("start", "a", None), ("a", "b", None), ("b", "a", None), ("b", "end", None)],
+    )
+    with pytest.raises(ValueError):
+        await WorkflowEngine()._run_graph(graph, {})
+
+
+async def test_previous_summary_only_reaches_final_llm_node(monkeypatch):
+    received = {}
+
+    async def generate_summary(content, previous_summary=None, **kwargs):
+        received[content] = previous_summary
+        return True, f"summary({content})", {"llm_calls": 1}
+
+    monkeypatch.setattr(engine_module.llm_service, "generate_summary", generate_summary)
+    graph = _graph(
+        [
+            ("start", "start", {}),
+            ("draft", "llm", {"input_map": {"content": "text"}}),
+            ("polish", "llm", {"input_map": {"content": "draft"}}),
+            ("end", "end", {}),
+        ],
+        [("start", "draft", None), ("draft", "polish", None), ("polish", "end", None)],
+    )
+    await WorkflowEngine()._run_graph(graph, {"text": "new", "previous_summary": "old"})
+    # 中间节点只处理新增内容，上次的总结交给生成最终总结的节点，且不拼进内容
+    assert received == {"new": None, "summary(new)": "old"}
+
+
+async def test_status_updates_do_not_block_the_event_loop(monkeypatch):
+    def slow_update(db, wf_id, status, error_message=None):
+        time.sleep(0.1)
+
+    monkeypatch.setattr(engine_module, "update_workflow_status", slow_update)
+    monkeypatch.setattr(engine_module.WorkflowStorage, "load_workflow_config", lambda *args: None)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        ok, msg, _ = await WorkflowEngine().execute_workflow("proj", "2025-01-01", "wf_20250101_000000")
+    finally:
+        task.cancel()
+    assert not ok and "工作流配置不存在" in msg
+    # 两次状态更新共 0.2 秒，期间其他协程照常运行
+    assert ticks >= 10
@@ -0,0 +1,25 @@
+import threading
+
+from server.config import settings
+from server.WorkflowManager.WorkflowStorage import WorkflowStorage
+
+
+def test_concurrent_coverage_saves_keep_every_scope(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "USRDATA_DIR", tmp_path)
+    storage = WorkflowStorage()
+    scopes = [f"scope-{i}" for i in range(8)]
+
+    def save(scope):
+        for _ in range(5):
+            assert storage.save_summary_coverage("proj", "2025-01-01", scope, "wf_1", scope, [])
+
+    threads = [threading.Thread(target=save, args=(scope,)) for scope in scopes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for scope in scopes:
+        assert storage.load_summary_coverage("proj", "2025-01-01", scope)["summary"] == scope
+    outputs_dir = storage.get_summary_coverage_path("proj", "2025-01-01").parent
+    assert [p.name for p in outputs_dir.iterdir()] == ["summary_coverage.json"]